@@ -4,6 +4,9 @@ from sqlalchemy.orm import Session
 from app import crud, models, schemas
 from app.api import deps
 from app.api.api_v1.endpoints.utils import retrieve_ue_state
+from app.tools.topology import rebuild_topology
+from app.tools.path_timeline import refresh_timelines
+from app.tools.ue_movement_utils.common import ue_state
 from .utils import ReportLogging
 
 router = APIRouter()
@@ -57,6 +60,8 @@ def create_Cell(
         raise HTTPException(status_code=409, detail="ERROR: This gNB_id you specified doesn't exist. Please create a new gNB with this gNB_id or use an existing gNB")
     elif not Cell:
         Cell = crud.cell.create_with_owner(db=db, obj_in=item_in, owner_id=current_user.id)
+        rebuild_topology(db, current_user.id)
+        refresh_timelines(db, current_user.id)
         return Cell
 
 @router.put("/{cell_id}", response_model=schemas.Cell)
@@ -85,15 +90,33 @@ def update_Cell(
     
     #check if the requested cell_id (hex) exists in db
     if item_in.cell_id != cell_id:
-        cells = crud.cell.get_multi_by_owner(db=db, owner_id=current_user.id, skip=0, limit=100)
-        for cell_in in cells:
-            if item_in.cell_id == cell_in.cell_id:
-                raise HTTPException(status_code=409, detail=f"Cell with id {item_in.cell_id} already exists")
+        if crud.cell.get_Cell_id(db=db, id=item_in.cell_id):
+            raise HTTPException(status_code=409, detail=f"Cell with id {item_in.cell_id} already exists")
         
     Cell = crud.cell.update(db=db, db_obj=Cell, obj_in=item_in)
+    rebuild_topology(db, Cell.owner_id)
+    refresh_timelines(db, Cell.owner_id)
     return Cell
 
 
+@router.get("/occupancy", response_model=List[schemas.CellOccupancy])
+def read_Cells_occupancy(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Get the number of UEs served by each cell.
+    """
+    Cells = crud.cell.get_multi_by_owner(
+        db=db, owner_id=current_user.id, skip=0, limit=None
+    )
+    occupancies = ue_state.occupancies()
+    return [
+        {"id": Cell.id, "cell_id": Cell.cell_id, "ues": occupancies.get(Cell.id, 0)}
+        for Cell in Cells
+    ]
+
+
 @router.get("/{cell_id}", response_model=schemas.Cell)
 def read_Cell(
     *,
@@ -111,6 +134,23 @@ def read_Cell(
         raise HTTPException(status_code=400, detail="Not enough permissions")
     return Cell
 
+@router.get("/{cell_id}/occupancy", response_model=schemas.CellOccupancy)
+def read_Cell_occupancy(
+    *,
+    db: Session = Depends(deps.get_db),
+    cell_id: str = Path(..., description="The cell id of the cell you want to retrieve the number of UEs"),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Get the number of UEs served by a cell.
+    """
+    Cell = crud.cell.get_Cell_id(db=db, id=cell_id)
+    if not Cell:
+        raise HTTPException(status_code=404, detail="Cell not found")
+    if not crud.user.is_superuser(current_user) and (Cell.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    return {"id": Cell.id, "cell_id": Cell.cell_id, "ues": ue_state.occupancy(Cell.id)}
+
 ### Get Cells of specifc gNB
 
 @router.get("/by_gNB/{gNB_id}", response_model=List[schemas.Cell])
@@ -172,10 +212,12 @@ def delete_Cell(
     if not crud.user.is_superuser(current_user) and (Cell.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     
+    owner_id = Cell.owner_id
     try:
         Cell = crud.cell.remove_by_cell_id(db=db, cell_id=cell_id)
     except:
         raise HTTPException(status_code=409, detail="Foreign key violation! Cell id is still referenced from another table")
     
-    
+    rebuild_topology(db, owner_id)
+    refresh_timelines(db, owner_id)
     return Cell
@@ -8,6 +8,7 @@ from app import crud, models, schemas
 from app.api import deps
 from app.api.api_v1.endpoints.utils import retrieve_ue_state
 from app.api.api_v1.endpoints.paths import get_random_point
+from app.tools.occupancy import cell_occupancy
 from .utils import ReportLogging
 
 router = APIRouter()
@@ -79,6 +80,7 @@ def create_UE(
     json_data['path_id'] = 0
 
     UE = crud.ue.create_with_owner(db=db, obj_in=json_data, owner_id=current_user.id)
+    cell_occupancy.attach(UE.supi, None)
     json_data.update({"path_id" : 0})
 
     return json_data
@@ -179,6 +181,7 @@ def delete_UE(
             json_UE.update({"gNB_id" : None})
 
         crud.ue.remove_supi(db=db, supi=supi)
+        cell_occupancy.detach(supi)
         return json_UE
 
 ### Get list of UEs of specific gNB
@@ -288,7 +291,7 @@ def assign_predefined_path(
             raise HTTPException(
                 status_code=409, detail="ERROR: This path_id you specified doesn't exist. Please create a new path with this path_id or use an existing path")
     elif item_in.path == 0:
-        crud.ue.update(db=db, db_obj=UE, obj_in={'path_id' : 0})
+        crud.ue.update(db=db, db_obj=UE, obj_in={'path_id' : 0, 'path_index' : None})
         return item_in
     
     #Assign the coordinates on path change
@@ -298,6 +301,7 @@ def assign_predefined_path(
         random_point = get_random_point(db, item_in.path)
         json_data['latitude'] = random_point.get('latitude')
         json_data['longitude'] = random_point.get('longitude')
+        json_data['path_index'] = random_point.get('path_index')
         crud.ue.update(db=db, db_obj=UE, obj_in=json_data)
 
     return item_in
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.tools.topology import rebuild_topology
 from .utils import ReportLogging
 
 router = APIRouter()
@@ -46,6 +47,7 @@ def create_gNB(
         raise HTTPException(status_code=409, detail="ERROR: gNB with this id already exists")
     elif not gNB:
         gNB = crud.gnb.create_with_owner(db=db, obj_in=item_in, owner_id=current_user.id)
+        rebuild_topology(db, current_user.id, cells_changed=False)
         return gNB
 
 
@@ -74,6 +76,7 @@ def update_gNB(
                 raise HTTPException(status_code=409, detail=f"gNB with id {item_in.gNB_id} already exists")
 
     gNB = crud.gnb.update(db=db, db_obj=gNB, obj_in=item_in)
+    rebuild_topology(db, gNB.owner_id, cells_changed=False)
     return gNB
 
 
@@ -149,9 +152,11 @@ def delete_gNB(
     if not crud.user.is_superuser(current_user) and (gNB.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     
+    owner_id = gNB.owner_id
     try:
         gNB = crud.gnb.remove_by_gNB_id(db=db, id=gNB_id)
     except:
         raise HTTPException(status_code=409, detail="Foreign key violation! gNB id is still referenced from another table")
 
+    rebuild_topology(db, owner_id, cells_changed=False)
     return gNB
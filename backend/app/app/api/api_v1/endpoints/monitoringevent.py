@@ -11,6 +11,7 @@ from app import tools
 from app.db.session import client
 from app.api.api_v1.endpoints.utils import add_notifications
 from app.tools.ue_movement_utils.common import retrieve_ue_state, retrieve_ue
+from app.tools.subscription_registry import subscription_registry
 from .utils import ReportLogging
 
 router = APIRouter()
@@ -38,6 +39,10 @@ def read_active_subscriptions(
             crud_mongo.delete_by_item(db_mongo, db_collection, "externalId", sub.get("externalId"))
             retrieved_docs.remove(sub)
             
+    #The expired documents are deleted by externalId, so reload the registry
+    if len(temp_json_subs) != len(retrieved_docs):
+        subscription_registry.load(db_mongo)
+
     temp_json_subs.clear()
 
     if retrieved_docs:
@@ -117,6 +122,7 @@ def create_subscription(
         
         #Update the subscription with the new resource (link) and return the response (+response header)
         crud_mongo.update_new_field(db_mongo, db_collection, inserted_doc.inserted_id, {"link" : link})
+        subscription_registry.refresh(db_mongo, db_collection, inserted_doc.inserted_id)
 
         #Retrieve the updated document | UpdateResult is not a dict
         updated_doc = crud_mongo.read_uuid(db_mongo, db_collection, inserted_doc.inserted_id)
@@ -153,6 +159,7 @@ def create_subscription(
         
         #Update the subscription with the new resource (link) and return the response (+response header)
         crud_mongo.update_new_field(db_mongo, db_collection, inserted_doc.inserted_id, {"link" : link})
+        subscription_registry.refresh(db_mongo, db_collection, inserted_doc.inserted_id)
 
         #Retrieve the updated document | UpdateResult is not a dict
         updated_doc = crud_mongo.read_uuid(db_mongo, db_collection, inserted_doc.inserted_id)
@@ -197,6 +204,7 @@ def update_subscription(
         #Update the document
         json_data = jsonable_encoder(item_in)
         crud_mongo.update_new_field(db_mongo, db_collection, subscriptionId, json_data)
+        subscription_registry.refresh(db_mongo, db_collection, subscriptionId)
         
         #Retrieve the updated document | UpdateResult is not a dict
         updated_doc = crud_mongo.read_uuid(db_mongo, db_collection, subscriptionId)
@@ -206,7 +214,7 @@ def update_subscription(
         add_notifications(http_request, http_response, False)
         return http_response
     else:
-        crud_mongo.delete_by_uuid(db_mongo, db_collection, subscriptionId)
+        subscription_registry.delete(db_mongo, db_collection, subscriptionId)
         raise HTTPException(status_code=403, detail="Subscription has expired")
     
 
@@ -244,7 +252,7 @@ def read_subscription(
         add_notifications(http_request, http_response, False)
         return http_response
     else:
-        crud_mongo.delete_by_uuid(db_mongo, db_collection, subscriptionId)
+        subscription_registry.delete(db_mongo, db_collection, subscriptionId)
         raise HTTPException(status_code=403, detail="Subscription has expired")
 
 @router.delete("/{scsAsId}/subscriptions/{subscriptionId}", response_model=schemas.MonitoringEventSubscription)
@@ -272,7 +280,7 @@ def delete_subscription(
     if not user.is_superuser(current_user) and (retrieved_doc['owner_id'] != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
 
-    crud_mongo.delete_by_uuid(db_mongo, db_collection, subscriptionId)
+    subscription_registry.delete(db_mongo, db_collection, subscriptionId)
     retrieved_doc.pop("owner_id")
 
     http_response = JSONResponse(content=retrieved_doc, status_code=200)
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.tools.path_timeline import get_timeline, invalidate_timeline
 
 router = APIRouter()
 
@@ -17,7 +18,8 @@ def get_random_point(db: Session, path_id: int):
     #Get the random index (this index should be within the range of points' list)
     random_index = random.randrange(0, len(points_json))
 
-    return points_json[random_index]
+    #The index is stored with the coordinates, the movement resumes from it
+    return dict(points_json[random_index], path_index=random_index)
 
 @router.get("", response_model=List[schemas.Paths])
 def read_paths(
@@ -68,6 +70,7 @@ def create_path(
     
     path = crud.path.create_with_owner(db=db, obj_in=path_in, owner_id=current_user.id)
     crud.points.create(db=db, obj_in=path_in, path_id=path.id) 
+    get_timeline(db=db, path_id=path.id, owner_id=current_user.id)
     return path
 
 
@@ -88,6 +91,7 @@ def update_path(
     if not crud.user.is_superuser(current_user) and (path.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     path = crud.path.update(db=db, db_obj=path, obj_in=path_in)
+    invalidate_timeline(path.id)
 
     item_json = jsonable_encoder(path)
     item_json["start_point"] = {}
@@ -152,6 +156,7 @@ def delete_path(
 
     crud.points.delete_points(db=db, path_id=id)    
     path = crud.path.remove(db=db, id=id)
+    invalidate_timeline(id)
 
     UEs = crud.ue.get_multi_by_owner(db=db, owner_id=current_user.id, skip=0, limit=100)
 
@@ -9,6 +9,7 @@ from app import models, schemas
 from app.api import deps
 from app.crud import crud_mongo, user, ue
 from app.db.session import client
+from app.tools.subscription_registry import subscription_registry
 from .utils import add_notifications
 from .qosInformation import qos_reference_match
 from .utils import ReportLogging
@@ -123,6 +124,7 @@ def create_subscription(
 
     #Update the subscription with the new resource (link) and return the response (+response header)
     crud_mongo.update_new_field(db_mongo, db_collection, inserted_doc.inserted_id, {"link" : link})
+    subscription_registry.refresh(db_mongo, db_collection, inserted_doc.inserted_id)
     
     #Retrieve the updated document | UpdateResult is not a dict
     updated_doc = crud_mongo.read_uuid(db_mongo, db_collection, inserted_doc.inserted_id)
@@ -194,6 +196,7 @@ def update_subscription(
     #Update the document
     json_data = jsonable_encoder(item_in)
     crud_mongo.update_new_field(db_mongo, db_collection, subscriptionId, json_data)
+    subscription_registry.refresh(db_mongo, db_collection, subscriptionId)
 
     #Retrieve the updated document | UpdateResult is not a dict
     updated_doc = crud_mongo.read_uuid(db_mongo, db_collection, subscriptionId)
@@ -228,7 +231,7 @@ def delete_subscription(
     if not user.is_superuser(current_user) and (retrieved_doc['owner_id'] != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
 
-    crud_mongo.delete_by_uuid(db_mongo, db_collection, subscriptionId)
+    subscription_registry.delete(db_mongo, db_collection, subscriptionId)
     http_response = JSONResponse(content=retrieved_doc, status_code=200)
     add_notifications(http_request, http_response, False)
     return http_response
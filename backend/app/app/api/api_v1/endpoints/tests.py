@@ -46,7 +46,7 @@ def read_UE_distances(*,
         raise HTTPException(status_code=404, detail="UE not found")
     if not crud.user.is_superuser(current_user) and (UE.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    return retrieve_ue_distances(supi)
+    return retrieve_ue_distances(db, supi)
 
 
 @router.get("/{supi}/path_losses")
@@ -61,7 +61,7 @@ def read_UE_losses(*,
         raise HTTPException(status_code=404, detail="UE not found")
     if not crud.user.is_superuser(current_user) and (UE.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    return retrieve_ue_path_losses(supi)
+    return retrieve_ue_path_losses(db, supi)
 
 
 @router.get("/{supi}/rsrps")
@@ -76,4 +76,4 @@ def read_UE_rsrps(*,
         raise HTTPException(status_code=404, detail="UE not found")
     if not crud.user.is_superuser(current_user) and (UE.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    return retrieve_ue_rsrps(supi)
\ No newline at end of file
+    return retrieve_ue_rsrps(db, supi)
\ No newline at end of file
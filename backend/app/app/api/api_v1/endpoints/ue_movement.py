@@ -1,11 +1,36 @@
+import logging
+
 from fastapi import APIRouter, Path, Depends, HTTPException
+from sqlalchemy.orm import Session
 from typing import Any
-from app import models
+from app import crud, models
 from app.api import deps
-from app.schemas import Msg
-from app.tools.ue_movement_utils.common import threads, ues, retrieve_ue_state
+from app.core.config import settings
+from app.schemas import (
+    Msg,
+    MovementBulkStart,
+    MovementBulkStop,
+    MovementReplay,
+    MovementStart,
+)
+from app.tools.notifications import dispatcher
+from app.tools.path_timeline import get_timelines
+from app.tools.ue_movement_utils.common import (
+    threads,
+    ue_state,
+    retrieve_ue_state,
+    retrieve_ues_json,
+)
 from app.tools.ue_movement_utils import BackgroundTasks
+from app.tools.ue_movement_utils.engine import engine
+from app.tools.ue_movement_utils.replay import TraceReplay
+from app.tools.ue_movement_utils.trace import list_traces, open_trace
+
 
+# Seconds to wait for a loop of another worker to stop
+STOP_TIMEOUT = 10
+# Seconds to wait for a loop of this worker to stop, it stops on its next tick
+JOIN_TIMEOUT = 1.0
 
 # API
 router = APIRouter()
@@ -14,23 +39,27 @@ router = APIRouter()
 @router.post("/start-loop", status_code=200)
 def initiate_movement(
     *,
-    msg: Msg,
+    msg: MovementStart,
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Start the loop.
+
+    The optional speedup runs the simulation faster than real time (0 means as fast as possible).
     """
-    if msg.supi in threads:
-        raise HTTPException(
-            status_code=409,
-            detail=f"There is a thread already running for this supi:{msg.supi}",
-        )
     t = BackgroundTasks(
         args=(
             current_user,
             msg.supi,
-        )
+        ),
+        speedup=msg.speedup,
     )
+    # Claimed in the state shared by the workers, a UE only moves in one of them
+    if not ue_state.claim(f"{msg.supi}", current_user.id, lease=t.lease):
+        raise HTTPException(
+            status_code=409,
+            detail=f"There is a thread already running for this supi:{msg.supi}",
+        )
     threads[f"{msg.supi}"] = {}
     threads[f"{msg.supi}"][f"{current_user.id}"] = t
     t.start()
@@ -47,17 +76,121 @@ def terminate_movement(
     Stop the loop.
     """
     try:
-        threads[f"{msg.supi}"][f"{current_user.id}"].stop()
-        threads[f"{msg.supi}"][f"{current_user.id}"].join()
-        threads.pop(f"{msg.supi}")
-        return {"msg": "Loop ended"}
-    except KeyError as ke:
-        print("Key Not Found in Threads Dictionary:", ke)
+        task = threads[f"{msg.supi}"][f"{current_user.id}"]
+    except KeyError:
+        # The loop may run in another worker, it stops on its next tick
+        if ue_state.stop(f"{msg.supi}", current_user.id, timeout=STOP_TIMEOUT):
+            return {"msg": "Loop ended"}
+        logging.warning(f"No loop of UE {msg.supi} is running for user {current_user.id}")
         raise HTTPException(
             status_code=409,
             detail="There is no thread running for this user! Please initiate a new thread",
         )
 
+    # The loop ends (and is removed from threads) on its next tick, which is a
+    # whole tick interval away at a low speed-up: it is not waited for longer
+    task.stop()
+    if task.join(timeout=JOIN_TIMEOUT):
+        return {"msg": "Loop ended"}
+    return {"msg": "Loop stopping"}
+
+
+@router.post("/start-all", status_code=200)
+def initiate_movements(
+    *,
+    db: Session = Depends(deps.get_db),
+    msg: MovementBulkStart,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Start the loops of many UEs: the given supis, or every simulated UE of the user that has a path.
+
+    UEs and paths are checked with a few queries for all of them and the serving cells of every path computed once; the UEs that cannot move are returned in skipped.
+    Every loop then loads its UE in its own session, the objects of the request are not shared with it.
+    """
+    if msg.supis is None:
+        UEs = crud.ue.get_multi_by_owner(
+            db=db, owner_id=current_user.id, skip=0, limit=None
+        )
+        UEs = [UE for UE in UEs if UE.is_simulated and UE.path_id]
+        skipped = {}
+    else:
+        UEs = crud.ue.get_supis(db=db, supis=msg.supis)
+        found = {UE.supi for UE in UEs}
+        skipped = {supi: "UE not found" for supi in msg.supis if supi not in found}
+
+    paths = {
+        path.id: path
+        for path in crud.path.get_multi_by_ids(
+            db=db, ids=list({UE.path_id for UE in UEs if UE.path_id})
+        )
+    }
+
+    movable = []
+    for UE in UEs:
+        path = paths.get(UE.path_id)
+        if UE.owner_id != current_user.id:
+            skipped[UE.supi] = "Not enough permissions"
+        elif not UE.is_simulated:
+            skipped[UE.supi] = "Trying to simulate a real UE"
+        elif not path:
+            skipped[UE.supi] = "Path not found"
+        elif path.owner_id != current_user.id:
+            skipped[UE.supi] = "Not enough permissions"
+        else:
+            movable.append((UE, path))
+
+    # Serving cells of every path, computed once before the loops start
+    get_timelines(db, {path.id for UE, path in movable}, current_user.id)
+
+    started = []
+    for UE, path in movable:
+        t = BackgroundTasks(
+            args=(
+                current_user,
+                UE.supi,
+            ),
+            speedup=msg.speedup,
+        )
+        if not ue_state.claim(f"{UE.supi}", current_user.id, lease=t.lease):
+            skipped[UE.supi] = "There is a thread already running for this supi"
+            continue
+        threads[f"{UE.supi}"] = {}
+        threads[f"{UE.supi}"][f"{current_user.id}"] = t
+        t.start()
+        started.append(UE.supi)
+
+    return {"started": started, "skipped": skipped}
+
+
+@router.post("/stop-all", status_code=200)
+def terminate_movements(
+    *,
+    msg: MovementBulkStop,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Stop the loops of many UEs: the given supis, or every UE the user is moving.
+
+    The loops are asked to stop and end on their next tick, the request does not wait for them.
+    """
+    supis = msg.supis if msg.supis is not None else ue_state.running(current_user.id)
+
+    stopping = []
+    not_running = []
+    for supi in supis:
+        t = threads.get(f"{supi}", {}).get(f"{current_user.id}")
+        if t is not None and t.is_alive():
+            t.stop()
+            stopping.append(supi)
+        elif ue_state.stop(f"{supi}", current_user.id, timeout=0):
+            # Running in another worker
+            stopping.append(supi)
+        else:
+            not_running.append(supi)
+
+    return {"stopping": stopping, "not_running": not_running}
+
 
 @router.get("/state-loop/{supi}", status_code=200)
 def state_movement(
@@ -78,4 +211,66 @@ def state_ues(
     """
     Get the state
     """
-    return ues
+    return retrieve_ues_json()
+
+
+@router.get("/metrics", status_code=200)
+def engine_metrics(
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Tick health of the simulation engine of this worker.
+
+    lateness_ms is how late the ticks start after their deadline and duration_ms how long they take
+    (last 10000 ticks); overruns are ticks longer than their interval, skipped ticks found the previous
+    one still running and missed deadlines had already passed, i.e. the emulator is behind real time.
+    notifications are the callbacks queued, sent, failed, rejected (circuit open) or dropped (queue full),
+    with the circuit breaker state, latency and read timeout of every destination.
+    """
+    return dict(engine.metrics(), notifications=dispatcher.metrics())
+
+
+@router.get("/callbacks", status_code=200)
+def callback_delivery(
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Delivery state of the callbacks that failed: retries pending, subscriptions failing and dead letters.
+
+    Superusers see every subscription, the other users their own.
+    """
+    owner_id = None if crud.user.is_superuser(current_user) else current_user.id
+    return dispatcher.retry_queue.status(owner_id)
+
+
+@router.get("/traces", status_code=200)
+def traces(
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    List the recorded traces (SIMULATION_TRACE_DIR)
+
+    Superusers see every trace, the other users the ones recording their UEs.
+    """
+    owner_id = None if crud.user.is_superuser(current_user) else current_user.id
+    return {"traces": list_traces(settings.SIMULATION_TRACE_DIR, owner_id)}
+
+
+@router.post("/replay", status_code=200)
+def replay_trace(
+    *,
+    msg: MovementReplay,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Replay the events of a recorded trace through the subscriptions of the user.
+
+    Positions, cells and QoS statuses come from the trace, nothing is recomputed.
+    The users other than superusers only replay the records of their UEs.
+    """
+    owner_id = None if crud.user.is_superuser(current_user) else current_user.id
+    if msg.trace not in list_traces(settings.SIMULATION_TRACE_DIR, owner_id):
+        raise HTTPException(status_code=404, detail=f"Trace {msg.trace} not found")
+    trace = open_trace(settings.SIMULATION_TRACE_DIR, msg.trace)
+    TraceReplay(trace, current_user, speedup=msg.speedup).start()
+    return {"msg": "Replay started", "records": len(trace.records)}
@@ -12,6 +12,9 @@ from app.schemas import monitoringevent, UserPlaneNotificationData
 from pydantic import BaseModel
 from app.api.api_v1.endpoints.paths import get_random_point
 from app.tools.ue_movement_utils.common import retrieve_ue_state
+from app.tools.topology import rebuild_topology, topologies
+from app.tools.path_timeline import timelines
+from app.tools.occupancy import cell_occupancy
 from fastapi.routing import APIRoute
 from json import JSONDecodeError
 from app.core.config import settings
@@ -157,6 +160,12 @@ def create_scenario(
         else:
             cell = crud.cell.create_with_owner(db=db, obj_in=cell_in, owner_id=current_user.id)
 
+    #The tables were truncated, so the topology of every owner and the path timelines are stale
+    topologies.clear()
+    timelines.clear()
+    rebuild_topology(db, current_user.id)
+    cell_occupancy.invalidate()
+
     for ue_in in ues:
         ue = crud.ue.get_supi(db=db, supi=ue_in.supi)
         if ue:
@@ -194,6 +203,7 @@ def create_scenario(
                         random_point = get_random_point(db, path.id)
                         json_data['latitude'] = random_point.get('latitude')
                         json_data['longitude'] = random_point.get('longitude')
+                        json_data['path_index'] = random_point.get('path_index')
                     
                     crud.ue.update(db=db, db_obj=UE, obj_in=json_data)
     
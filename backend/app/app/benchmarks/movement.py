@@ -0,0 +1,555 @@
+"""Scalability benchmark of the UE movement simulator.
+
+Builds a synthetic scenario (N UEs, M cells, P paths of K points each),
+moves every UE through the real simulation engine for a while and reports
+tick latency, the lateness of the ticks against their deadlines (with the
+engine's overrun / missed / skipped counts), the drift of the simulated time
+of the UEs behind the wall clock, CPU and memory per UE and callbacks per
+second as JSON, to be compared across commits:
+
+    python -m app.benchmarks.movement --ues 500 --cells 49 --paths 20 \\
+        --points 400 --duration 60 --output results.json
+
+Postgres, Mongo and the NetApp are replaced by local stand-ins: a SQLite
+file, an in-memory collection store and an HTTP sink on localhost that
+answers every callback. The numbers are therefore those of the simulator
+itself, not of the services around it.
+"""
+
+import argparse
+import copy
+import json
+import logging
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List
+
+import numpy as np
+from bson import ObjectId
+from sqlalchemy import create_engine
+
+from app import models
+from app.db.base import Base
+from app.db.session import SessionLocal
+from app.tools.notifications import dispatcher
+from app.tools.subscription_registry import subscription_registry
+from app.tools.ue_movement_utils import sim_ue
+from app.tools.ue_movement_utils.common import threads, ue_state
+from app.tools.ue_movement_utils.engine import TickStats, engine
+
+# Centre of the synthetic scenario
+ORIGIN = (37.998, 23.819)
+# Metres between two neighbouring cells of the grid
+CELL_SPACING = 250.0
+METRES_PER_DEGREE = 111_320.0
+FAR_FUTURE = "2099-12-31T23:59:59"
+
+
+# Local stand-ins
+class MemoryCollection:
+    """The few pymongo collection methods the simulator uses, on a dict.
+
+    Filters only support equality and comparisons ($gt, $gte, $lt, $lte) on
+    top level fields.
+    """
+
+    OPERATORS = {
+        "$gt": lambda value, operand: value > operand,
+        "$gte": lambda value, operand: value >= operand,
+        "$lt": lambda value, operand: value < operand,
+        "$lte": lambda value, operand: value <= operand,
+    }
+
+    def __init__(self):
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _matches(cls, doc: dict, filter: dict) -> bool:
+        for key, condition in (filter or {}).items():
+            value = doc.get(key)
+            if isinstance(condition, dict) and set(condition) <= set(cls.OPERATORS):
+                if value is None or not all(
+                    cls.OPERATORS[op](value, operand)
+                    for op, operand in condition.items()
+                ):
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def find(self, filter: dict = None, projection: dict = None) -> List[dict]:
+        with self._lock:
+            return [
+                copy.deepcopy(doc)
+                for doc in self._docs.values()
+                if self._matches(doc, filter)
+            ]
+
+    def find_one(self, filter: dict = None, projection: dict = None):
+        found = self.find(filter)
+        return found[0] if found else None
+
+    def insert_one(self, doc: dict):
+        doc.setdefault("_id", ObjectId())
+        with self._lock:
+            self._docs[doc["_id"]] = copy.deepcopy(doc)
+
+    def replace_one(self, filter: dict, doc: dict):
+        with self._lock:
+            for key, current in self._docs.items():
+                if self._matches(current, filter):
+                    self._docs[key] = dict(copy.deepcopy(doc), _id=key)
+                    return
+
+    def update_one(self, filter: dict, update: dict):
+        with self._lock:
+            for current in self._docs.values():
+                if self._matches(current, filter):
+                    current.update(copy.deepcopy(update.get("$set", {})))
+                    return
+
+    def find_one_and_update(self, filter: dict, update: dict, return_document=False):
+        with self._lock:
+            for current in self._docs.values():
+                if self._matches(current, filter):
+                    before = copy.deepcopy(current)
+                    current.update(copy.deepcopy(update.get("$set", {})))
+                    for key, value in update.get("$inc", {}).items():
+                        current[key] = current.get(key, 0) + value
+                    # ReturnDocument.AFTER is True
+                    return copy.deepcopy(current) if return_document else before
+        return None
+
+    def delete_one(self, filter: dict):
+        with self._lock:
+            for key, current in list(self._docs.items()):
+                if self._matches(current, filter):
+                    del self._docs[key]
+                    return
+
+
+class MemoryDatabase(dict):
+    def __missing__(self, name: str) -> MemoryCollection:
+        collection = self[name] = MemoryCollection()
+        return collection
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        return self[name]
+
+
+class MemoryClient:
+    def __init__(self):
+        self.fastapi = MemoryDatabase()
+
+
+class CallbackSink:
+    """HTTP server on localhost that acknowledges and counts the callbacks"""
+
+    def __init__(self):
+        sink = self
+        self.count = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                body = b'{"ack": "TRUE"}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with sink._lock:
+                    sink.count += 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}/callback"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@contextmanager
+def local_backends(directory: str):
+    """Point the simulator to a SQLite file and an in-memory Mongo"""
+    engine = create_engine(
+        f"sqlite:///{os.path.join(directory, 'benchmark.db')}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(engine)
+    mongo = MemoryClient()
+
+    bind, client = SessionLocal.kw.get("bind"), sim_ue.client
+    SessionLocal.configure(bind=engine)
+    sim_ue.client = mongo
+    try:
+        yield mongo.fastapi
+    finally:
+        SessionLocal.configure(bind=bind)
+        sim_ue.client = client
+        engine.dispose()
+
+
+# Scenario
+def _offset(metres_north: float, metres_east: float):
+    lat = ORIGIN[0] + metres_north / METRES_PER_DEGREE
+    lon = ORIGIN[1] + metres_east / (
+        METRES_PER_DEGREE * math.cos(math.radians(ORIGIN[0]))
+    )
+    return lat, lon
+
+
+def build_scenario(
+    db_mongo, ues: int, cells: int, paths: int, points: int, sink_url: str, qos: bool
+) -> tuple:
+    """Cells on a square grid, circular paths across it, the UEs spread on the paths"""
+    rng = random.Random(0)
+    db = SessionLocal()
+    try:
+        user = models.User(
+            email="benchmark@example.com", hashed_password="-", is_superuser=True
+        )
+        db.add(user)
+        db.flush()
+        gnb = models.gNB(gNB_id="AAAAA1", name="gNB1", owner_id=user.id)
+        db.add(gnb)
+        db.flush()
+
+        side = max(1, math.ceil(math.sqrt(cells)))
+        extent = side * CELL_SPACING
+        for i in range(cells):
+            lat, lon = _offset(
+                (i // side + 0.5) * CELL_SPACING - extent / 2,
+                (i % side + 0.5) * CELL_SPACING - extent / 2,
+            )
+            db.add(
+                models.Cell(
+                    cell_id=f"AAAAA1{i:03X}",
+                    name=f"cell{i}",
+                    latitude=lat,
+                    longitude=lon,
+                    radius=CELL_SPACING * 0.6,
+                    owner_id=user.id,
+                    gNB_id=gnb.id,
+                )
+            )
+
+        path_ids = []
+        for p in range(paths):
+            radius = rng.uniform(0.2, 0.5) * extent
+            centre = (rng.uniform(-0.2, 0.2) * extent, rng.uniform(-0.2, 0.2) * extent)
+            circle = [
+                _offset(
+                    centre[0] + radius * math.sin(2 * math.pi * k / points),
+                    centre[1] + radius * math.cos(2 * math.pi * k / points),
+                )
+                for k in range(points)
+            ]
+            path = models.Path(
+                description=f"path{p}",
+                start_lat=circle[0][0],
+                start_long=circle[0][1],
+                end_lat=circle[-1][0],
+                end_long=circle[-1][1],
+                owner_id=user.id,
+            )
+            db.add(path)
+            db.flush()
+            db.add_all(
+                models.Points(latitude=lat, longitude=lon, path_id=path.id)
+                for lat, lon in circle
+            )
+            path_ids.append((path.id, circle))
+
+        supis = []
+        for u in range(ues):
+            path_id, circle = path_ids[u % len(path_ids)]
+            index = rng.randrange(points)
+            supi = f"2020100{u:08d}"
+            external_id = f"{u}@benchmark.com"
+            ipv4 = f"10.{u // 65536 % 256}.{u // 256 % 256}.{u % 256}"
+            db.add(
+                models.UE(
+                    supi=supi,
+                    name=f"UE{u}",
+                    external_identifier=external_id,
+                    ip_address_v4=ipv4,
+                    speed="HIGH",
+                    latitude=circle[index][0],
+                    longitude=circle[index][1],
+                    path_id=path_id,
+                    path_index=index,
+                    is_simulated=True,
+                    owner_id=user.id,
+                )
+            )
+            supis.append(supi)
+
+            db_mongo.MonitoringEvent.insert_one(
+                {
+                    "externalId": external_id,
+                    "monitoringType": "LOCATION_REPORTING",
+                    "notificationDestination": sink_url,
+                    "link": f"{sink_url}/{u}",
+                    "maximumNumberOfReports": 10**9,
+                    "monitorExpireTime": FAR_FUTURE,
+                    "owner_id": user.id,
+                }
+            )
+            if qos:
+                db_mongo.QoSMonitoring.insert_one(
+                    {
+                        "ipv4Addr": ipv4,
+                        "qosReference": 1,  # GBR
+                        "notificationDestination": sink_url,
+                        "link": f"{sink_url}/qos/{u}",
+                        "qosMonInfo": {"repFreqs": ["EVENT_TRIGGERED"], "repPeriod": 1},
+                        "owner_id": user.id,
+                    }
+                )
+
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+    finally:
+        db.close()
+    return user, supis
+
+
+# Measurements
+class TimedTask(sim_ue.BackgroundTasks):
+    """A simulated UE that records how long its ticks take and how far it drifts.
+
+    How late the ticks start is measured by the engine against their
+    deadlines, see TickStats. The drift is how far the simulated time of the
+    UE fell behind the wall clock (at its speed-up) since reset(): lateness
+    that carried over from tick to tick instead of being caught up.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+        self._mark = None
+
+    def tick(self):
+        start = time.perf_counter()
+        ready = self._ready
+        super().tick()
+        # The first tick loads the UE and its path, it is not a movement step
+        if ready:
+            self.latencies.append(time.perf_counter() - start)
+
+    def reset(self):
+        self.latencies = []
+        self._mark = (time.perf_counter(), self.clock.monotonic())
+
+    def drift(self) -> float:
+        """Wall seconds behind schedule (within one tick interval), None at speed-up 0"""
+        if self._mark is None or self.clock.speedup <= 0:
+            return None
+        wall, simulated = self._mark
+        elapsed = (self.clock.monotonic() - simulated) / self.clock.speedup
+        return (time.perf_counter() - wall) - elapsed
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak instead of current, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentiles(values: Iterable[float], scale: float = 1000.0) -> dict:
+    values = np.asarray(list(values), dtype=np.float64) * scale
+    if not values.size:
+        return {"count": 0}
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(
+    ues: int = 100,
+    cells: int = 25,
+    paths: int = 10,
+    points: int = 200,
+    duration: float = 30.0,
+    speedup: float = 1.0,
+    qos: bool = True,
+    coalesce_window: float = None,
+    warmup_timeout: float = 60.0,
+) -> dict:
+    if coalesce_window is not None:
+        dispatcher.coalesce_window = coalesce_window
+    parameters = dict(
+        ues=ues,
+        cells=cells,
+        paths=paths,
+        points=points,
+        duration=duration,
+        speedup=speedup,
+        qos=qos,
+        coalesce_window=dispatcher.coalesce_window,
+    )
+    with tempfile.TemporaryDirectory() as directory, local_backends(
+        directory
+    ) as db_mongo, CallbackSink() as sink:
+        user, supis = build_scenario(
+            db_mongo, ues, cells, paths, points, sink.url, qos
+        )
+        subscription_registry.load(db_mongo)
+
+        rss_before = rss_bytes()
+        tasks = []
+        for supi in supis:
+            t = TimedTask(args=(user, supi), speedup=speedup)
+            if not ue_state.claim(supi, user.id, lease=t.lease):
+                continue
+            threads[supi] = {f"{user.id}": t}
+            t.start()
+            tasks.append(t)
+
+        # Every UE loaded its path and published its state
+        deadline = time.monotonic() + warmup_timeout
+        while time.monotonic() < deadline and not all(
+            t._ready or not t.is_alive() for t in tasks
+        ):
+            time.sleep(0.05)
+        rss_after = rss_bytes()
+        ready = [t for t in tasks if t._ready and t.is_alive()]
+
+        for t in tasks:
+            t.reset()
+        # Every tick of the measurement, the ones of the warm-up left out
+        previous, engine.stats = engine.stats, TickStats(window=None)
+        callbacks = sink.count
+        notifications = dispatcher.metrics()["sent"]
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        time.sleep(duration)
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        drifts = [t.drift() for t in ready]
+        callbacks = sink.count - callbacks
+        notifications = dispatcher.metrics()["sent"] - notifications
+        stats, engine.stats = engine.stats, previous
+
+        for t in tasks:
+            t.stop()
+        for t in tasks:
+            t.join(timeout=30)
+        subscription_registry.load(MemoryDatabase())
+
+    latencies = [latency for t in ready for latency in t.latencies]
+    health = stats.as_dict()
+    moving = max(len(ready), 1)
+    return {
+        "benchmark": "movement",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "parameters": parameters,
+        "results": {
+            "ues_moving": len(ready),
+            "ticks": len(latencies),
+            "ticks_per_s": len(latencies) / wall,
+            "tick_latency_ms": percentiles(latencies),
+            # Start of the rounds against their deadlines, from the engine
+            "tick_lateness_ms": percentiles(stats.lateness()),
+            # Per UE over the measurement, nothing to drift from at speed-up 0
+            "tick_drift_ms": percentiles(d for d in drifts if d is not None),
+            "overruns": health["overruns"],
+            "missed": health["missed"],
+            "skipped": health["skipped"],
+            "cpu_per_ue": cpu / wall / moving,
+            "cpu_ms_per_tick": 1000 * cpu / max(len(latencies), 1),
+            "memory_per_ue_kb": (rss_after - rss_before) / 1024 / moving,
+            # HTTP requests received by the sink (a coalesced one carries many reports)
+            "callbacks": callbacks,
+            "callbacks_per_s": callbacks / wall,
+            "notifications_sent": notifications,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ues", type=int, default=100)
+    parser.add_argument("--cells", type=int, default=25)
+    parser.add_argument("--paths", type=int, default=10)
+    parser.add_argument("--points", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds measured")
+    parser.add_argument(
+        "--speedup", type=float, default=1.0, help="1 is real time, 0 as fast as possible"
+    )
+    parser.add_argument("--no-qos", dest="qos", action="store_false")
+    parser.add_argument(
+        "--coalesce-window",
+        type=float,
+        help="seconds, default NOTIFICATION_COALESCE_WINDOW",
+    )
+    parser.add_argument("--output", help="JSON file, stdout by default")
+    args = parser.parse_args(argv)
+
+    # The simulator logs every handover and callback
+    logging.disable(logging.CRITICAL)
+    results = run(
+        ues=args.ues,
+        cells=args.cells,
+        paths=args.paths,
+        points=args.points,
+        duration=args.duration,
+        speedup=args.speedup,
+        qos=args.qos,
+        coalesce_window=args.coalesce_window,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -84,6 +84,44 @@ class Settings(BaseSettings):
 
     REPORT_PATH: str
 
+    # UE movement simulation engine
+    SIMULATION_TICK_INTERVAL: float = 1.0
+    SIMULATION_WORKERS: int = 32
+    # Default speed-up of a run: 1 is real time, 0 is as fast as possible
+    SIMULATION_SPEEDUP: float = 1.0
+    # Seconds between two writes of the moving UEs' positions to the database, 0 disables them
+    SIMULATION_CHECKPOINT_INTERVAL: float = 10.0
+    # Directory of the binary traces of the runs (see trace.py), unset disables recording
+    SIMULATION_TRACE_DIR: Optional[str] = None
+    # Size of a trace before the next one is started, and traces of a worker kept (0 keeps all)
+    SIMULATION_TRACE_MAX_BYTES: int = 256 * 1024 * 1024
+    SIMULATION_TRACE_KEEP: int = 8
+    # Threads sending the callbacks to the NetApps, simultaneous callbacks to one NetApp
+    # and callbacks waiting to be sent before new ones are dropped
+    NOTIFICATION_WORKERS: int = 16
+    NOTIFICATION_CONNECTIONS_PER_DESTINATION: int = 4
+    NOTIFICATION_QUEUE_SIZE: int = 10000
+    # Seconds during which the monitoring event reports of a subscription to the same
+    # notificationDestination are batched into one notification (e.g. 0.05 - 0.5), 0 sends
+    # every report on its own
+    NOTIFICATION_COALESCE_WINDOW: float = 0.0
+    # Failed callbacks are retried after 1, 2, 4... seconds (at most the max delay); the
+    # subscription is given up after CALLBACK_RETRY_BUDGET failed retries in a row
+    CALLBACK_RETRY_BUDGET: int = 8
+    CALLBACK_RETRY_BASE_DELAY: float = 1.0
+    CALLBACK_RETRY_MAX_DELAY: float = 60.0
+    # Failed callbacks in a row after which a NetApp is not called for the cooldown (seconds)
+    CALLBACK_BREAKER_FAILURES: int = 5
+    CALLBACK_BREAKER_COOLDOWN: float = 30.0
+    # Where the state of the moving UEs is kept: "memory" (single worker) or
+    # "mongo" (shared by all the API workers)
+    UE_STATE_BACKEND: str = "memory"
+    # Seconds without a tick after which a shared simulation is seen as stopped
+    UE_STATE_LEASE: float = 30.0
+    # Seconds between two writes of the shared state (states of the moving UEs, cell
+    # occupancy) and between two checks for subscriptions changed by the other workers
+    UE_STATE_FLUSH_INTERVAL: float = 0.5
+
     class Config:
         case_sensitive = True
 
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
@@ -21,7 +21,7 @@ class CRUD_Cell(CRUDBase[Cell, CellCreate, CellUpdate]):
         return db_obj
 
     def get_multi_by_owner(
-        self, db: Session, *, owner_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, owner_id: int, skip: int = 0, limit: Optional[int] = 100
     ) -> List[Cell]:
         return (
             db.query(self.model)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 
@@ -19,7 +19,7 @@ class CRUD_UE(CRUDBase[UE, UECreate, UEUpdate]):
         return db_obj
 
     def get_multi_by_owner(
-        self, db: Session, *, owner_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, owner_id: int, skip: int = 0, limit: Optional[int] = 100
     ) -> List[UE]:
         return (
             db.query(self.model)
@@ -29,6 +29,9 @@ class CRUD_UE(CRUDBase[UE, UECreate, UEUpdate]):
             .all()
         )
 
+    def get_supis(self, db: Session, *, supis: List[str]) -> List[UE]:
+        return db.query(self.model).filter(UE.supi.in_(supis)).all()
+
     def get_supi(self, db: Session, supi: str) -> UE:
         return db.query(self.model).filter(self.model.supi == supi).first()
 
@@ -78,10 +81,11 @@ class CRUD_UE(CRUDBase[UE, UECreate, UEUpdate]):
         )
 
     def update_coordinates(
-        self, db: Session, *, lat: float, long: float, db_obj: UE
+        self, db: Session, *, lat: float, long: float, db_obj: UE, path_index: Optional[int] = None
     ) -> UE:
         setattr(db_obj, 'latitude', lat)
         setattr(db_obj, 'longitude', long)
+        setattr(db_obj, 'path_index', path_index)
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
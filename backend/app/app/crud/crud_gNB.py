@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
@@ -24,7 +24,7 @@ class CRUD_gNB(CRUDBase[gNB, gNBCreate, gNBUpdate]):
 ### Get gNB of specific User
 
     def get_multi_by_owner(
-        self, db: Session, *, owner_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, owner_id: int, skip: int = 0, limit: Optional[int] = 100
     ) -> List[gNB]:
         return (
             db.query(self.model)
@@ -1,4 +1,5 @@
 from bson import ObjectId
+from pymongo import ReturnDocument
 from pymongo.database import Database
 
 # collection
@@ -30,6 +31,14 @@ def update(db: Database, collection_name, uuId, json_data):
 def update_new_field(db: Database, collection_name, uuId, json_data):
     return db[collection_name].update_one({'_id': ObjectId(uuId)} , { '$set' : json_data})
 
+##Increment a numeric field, returns the document after the update (MonitoringEvent reports)
+def increment(db: Database, collection_name, uuId, key: str, value: int = 1, minimum: int = None):
+    # With a minimum, the document is only updated (and returned) if its value is at least that
+    query = {'_id': ObjectId(uuId)}
+    if minimum is not None:
+        query[key] = {'$gte': minimum}
+    return db[collection_name].find_one_and_update(query, {'$inc': {key: value}}, return_document=ReturnDocument.AFTER)
+
 # POST
 def create(db: Database, collection_name, json_data):
     return db[collection_name].insert_one(json_data)
@@ -37,6 +37,9 @@ class CRUD_Path(CRUDBase[Path, PathCreate, PathUpdate]):
             .all()
         )
 
+    def get_multi_by_ids(self, db: Session, *, ids: List[int]) -> List[Path]:
+        return db.query(self.model).filter(Path.id.in_(ids)).all()
+
     def get_description(self, db: Session, description: str) -> Path:
         return db.query(self.model).filter(Path.description == description).first()
 
@@ -65,6 +68,16 @@ class CRUD_Points(CRUDBase[Points, PathCreate, PathUpdate]):
             .all()
         )
 
+    def get_points_by_paths(
+        self, db: Session, *, path_ids: List[int]
+    ) -> List[Points]:
+        return (
+            db.query(self.model)
+            .filter(Points.path_id.in_(path_ids))
+            .order_by(asc(Points.path_id), asc(Points.id))
+            .all()
+        )
+
     def delete_points(self, db: Session, path_id: int):
         objs = db.query(self.model).filter(self.model.path_id == path_id).all()
         for obj in objs:
@@ -1,3 +1,4 @@
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 
 from app import crud, schemas
@@ -11,11 +12,41 @@ from fastapi.encoders import jsonable_encoder
 # for more details: https://github.com/tiangolo/full-stack-fastapi-postgresql/issues/28
 
 
+# Columns added to tables of earlier releases: create_all() only creates the
+# missing tables, so these are added to the existing ones by add_new_columns()
+NEW_COLUMNS = [
+    ("cell", "frequency"),
+    ("cell", "tx_power"),
+    ("ue", "path_index"),
+]
+
+
+def add_new_columns(bind) -> None:
+    existing = inspect(bind)
+    tables = set(existing.get_table_names())
+    for table_name, column_name in NEW_COLUMNS:
+        if table_name not in tables:
+            continue
+        if column_name in {column["name"] for column in existing.get_columns(table_name)}:
+            continue
+        table = Base.metadata.tables[table_name]
+        column = table.c[column_name]
+        column_type = column.type.compile(dialect=bind.dialect)
+        with bind.begin() as connection:
+            connection.execute(
+                text(f'ALTER TABLE "{table_name}" ADD COLUMN "{column_name}" {column_type}')
+            )
+        for index in table.indexes:
+            if column in index.columns.values():
+                index.create(bind=bind, checkfirst=True)
+
+
 def init_db(db: Session) -> None:
     # Tables should be created with Alembic migrations
     # But if you don't want to use migrations, create
     # the tables un-commenting the next line
     Base.metadata.create_all(bind=engine)
+    add_new_columns(engine)
 
     user = crud.user.get_by_email(db, email=settings.FIRST_SUPERUSER)
     if not user:
@@ -21,6 +21,9 @@ class Cell(Base):
     latitude = Column(Float, index=True)
     longitude = Column(Float, index=True)
     radius = Column(Float, index=True)
+    # carrier frequency in GHz and transmit power in dBm
+    frequency = Column(Float, index=True)
+    tx_power = Column(Float, index=True)
 
     #Foreign Keys
     owner_id = Column(Integer, ForeignKey("user.id"))
@@ -31,6 +31,8 @@ class UE(Base):
     latitude = Column(Float, index=True)
     longitude = Column(Float, index=True)
     path_id = Column(Integer, index=True)
+    #index of the point of the path the UE is at (or just passed)
+    path_index = Column(Integer)
     is_simulated = Column(Boolean, default=True, index=True)
 
     #Foreign Keys
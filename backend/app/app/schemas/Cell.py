@@ -12,6 +12,8 @@ class CellBase(BaseModel):
     latitude: confloat(ge=-90, le=90)
     longitude: confloat(ge=-180, le=180)
     radius: float
+    frequency: confloat(gt=0) = 2.6475  # carrier frequency in GHz
+    tx_power: float = 30  # transmit power in dBm
     
     
 # Properties to receive on item creation
@@ -29,6 +31,8 @@ class CellInDBBase(CellBase):
     name: Optional[str]
     owner_id: Optional[int]
     gNB_id: Optional[int]
+    frequency: Optional[float]
+    tx_power: Optional[float]
 
     class Config:
         orm_mode = True
@@ -42,3 +46,10 @@ class Cell(CellInDBBase):
 # Properties properties stored in DB
 class CellInDB(CellInDBBase):
     pass
+
+
+# Number of UEs served by a cell
+class CellOccupancy(BaseModel):
+    id: int
+    cell_id: str
+    ues: int
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Union
 from enum import Enum
 from pydantic import BaseModel, constr, confloat, IPvAnyAddress
 from pydantic.fields import Field
@@ -19,7 +19,7 @@ class UEBase(BaseModel):
     mcc: Optional[int] = Field(default=202, description="Mobile Country Code (MCC) part of the Public Land Mobile Network (PLMN), comprising 3 digits, as defined in clause 9.3.3.5 of 3GPP TS 38.413")
     mnc: Optional[int] = Field(default=1, description="Mobile Network Code (MNC) part of the Public Land Mobile Network (PLMN), comprising 2 or 3 digits, as defined in clause 9.3.3.5 of 3GPP TS 38.413")
     external_identifier: Optional[str] = Field("123456789@domain.com", description="Globally unique identifier containing a Domain Identifier and a Local Identifier. \<Local Identifier\>@\<Domain Identifier\>")
-    speed: Optional[Speed] = Field(description="This value describes UE's speed. Possible values are \"STATIONARY\" (e.g, IoT device), \"LOW(e.g, pedestrian)\" and \"HIGH (e.g., vehicle)\"")
+    speed: Optional[Union[Speed, confloat(ge=0)]] = Field(description="This value describes UE's speed. Possible values are \"STATIONARY\" (e.g, IoT device), \"LOW(e.g, pedestrian)\", \"HIGH (e.g., vehicle)\" or a speed in m/s")
     is_simulated: Optional[bool] = Field(default=True, description="Flag identifying simulated US's from real ones")
 
 class UECreate(UEBase):
@@ -1,9 +1,9 @@
 from .path import Path, PathCreate, PathUpdate, PathInDB, PathInDBBase, Paths
-from .msg import Msg
+from .msg import Msg, MovementBulkStart, MovementBulkStop, MovementReplay, MovementStart
 from .token import Token, TokenPayload
 from .user import User, UserCreate, UserInDB, UserUpdate
 from .gNB import gNB, gNBCreate, gNBInDB, gNBUpdate
-from .Cell import Cell, CellCreate, CellInDB, CellUpdate
+from .Cell import Cell, CellCreate, CellInDB, CellOccupancy, CellUpdate
 from .UE import UE, UECreate, UEUpdate, Speed, ue_path, UEhex
 from .monitoringevent import MonitoringEventSubscriptionCreate, MonitoringEventSubscription, MonitoringEventReport, MonitoringEventReportReceived, MonitoringNotification
 from .qosMonitoring import AsSessionWithQoSSubscriptionCreate, AsSessionWithQoSSubscription, UserPlaneNotificationData
@@ -1,5 +1,30 @@
-from pydantic import BaseModel, constr
+from typing import List, Optional
+
+from pydantic import BaseModel, confloat, constr
 
 
 class Msg(BaseModel):
-    supi: constr(regex=r'^[0-9]{15,16}$')
\ No newline at end of file
+    supi: constr(regex=r'^[0-9]{15,16}$')
+
+
+class MovementStart(Msg):
+    # 1 is real time, 0 is as fast as possible (default SIMULATION_SPEEDUP)
+    speedup: Optional[confloat(ge=0)] = None
+
+
+class MovementBulkStart(BaseModel):
+    # None starts every simulated UE of the user that has a path
+    supis: Optional[List[constr(regex=r'^[0-9]{15,16}$')]] = None
+    speedup: Optional[confloat(ge=0)] = None
+
+
+class MovementBulkStop(BaseModel):
+    # None stops every UE of the user that is moving
+    supis: Optional[List[constr(regex=r'^[0-9]{15,16}$')]] = None
+
+
+class MovementReplay(BaseModel):
+    # Name of a trace of SIMULATION_TRACE_DIR, as listed by /traces
+    trace: constr(regex=r'^[A-Za-z0-9_.-]+$')
+    # 1 replays at the recorded pace, 0 sends the events back to back
+    speedup: confloat(ge=0) = 1.0
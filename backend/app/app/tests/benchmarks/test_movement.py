@@ -0,0 +1,56 @@
+import json
+import logging
+
+from app.benchmarks.movement import MemoryDatabase, main, percentiles
+
+
+def test_memory_collection_behaves_like_the_mongo_one():
+    db = MemoryDatabase()
+    db.MonitoringEvent.insert_one({"externalId": "1@domain.com", "reports": 2})
+    doc = db.MonitoringEvent.find_one({"externalId": "1@domain.com"})
+
+    db["MonitoringEvent"].replace_one({"_id": doc["_id"]}, {"reports": 1})
+    assert db.MonitoringEvent.find() == [{"_id": doc["_id"], "reports": 1}]
+
+    updated = db.MonitoringEvent.find_one_and_update(
+        {"_id": doc["_id"]}, {"$inc": {"reports": -1}}, return_document=True
+    )
+    assert updated["reports"] == 0
+
+    db.MonitoringEvent.delete_one({"_id": doc["_id"]})
+    assert db.MonitoringEvent.find_one({"_id": doc["_id"]}) is None
+
+
+def test_percentiles_in_milliseconds():
+    summary = percentiles([0.001 * i for i in range(1, 101)])
+    assert summary["count"] == 100
+    assert summary["max"] == 100.0
+    assert abs(summary["p50"] - 50.5) < 1e-9
+    assert percentiles([]) == {"count": 0}
+
+
+def test_main_moves_a_few_ues(tmp_path):
+    output = tmp_path / "results.json"
+    try:
+        main(
+            [
+                "--ues", "3",
+                "--cells", "4",
+                "--paths", "2",
+                "--points", "20",
+                "--duration", "0.5",
+                "--speedup", "0",
+                "--output", str(output),
+            ]
+        )
+    finally:
+        logging.disable(logging.NOTSET)
+
+    results = json.loads(output.read_text())["results"]
+    assert results["ues_moving"] == 3
+    assert results["ticks"] > 0
+    assert results["tick_lateness_ms"]["count"] > 0
+    # As fast as possible, there is no schedule to drift from
+    assert results["tick_drift_ms"] == {"count": 0}
+    assert results["overruns"] >= 0 and results["missed"] >= 0
+    assert results["callbacks"] > 0
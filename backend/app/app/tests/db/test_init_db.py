@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.init_db import NEW_COLUMNS, add_new_columns
+
+
+def test_new_columns_are_added_to_existing_tables():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        # Tables created by an earlier release
+        connection.execute(text('CREATE TABLE cell (id INTEGER PRIMARY KEY, name VARCHAR)'))
+        connection.execute(text("INSERT INTO cell (id, name) VALUES (1, 'cell1')"))
+        connection.execute(text('CREATE TABLE ue (id INTEGER PRIMARY KEY, supi VARCHAR)'))
+        connection.execute(text("INSERT INTO ue (id, supi) VALUES (1, '202010000000001')"))
+
+    add_new_columns(engine)
+    # Nothing left to add the second time
+    add_new_columns(engine)
+
+    existing = inspect(engine)
+    for table_name, column_name in NEW_COLUMNS:
+        assert column_name in {c["name"] for c in existing.get_columns(table_name)}
+    assert "ix_cell_frequency" in {i["name"] for i in existing.get_indexes("cell")}
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT frequency FROM cell")).scalar() is None
+        # UEs of earlier releases resume from the nearest point of their path
+        assert connection.execute(text("SELECT path_index FROM ue")).scalar() is None
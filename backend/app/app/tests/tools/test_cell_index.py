@@ -0,0 +1,31 @@
+import random
+
+from app.tools.cell_index import CellIndex
+from app.tools.distance import check_distance
+
+
+def test_serving_matches_linear_scan():
+    rng = random.Random(7)
+    cells = [
+        {
+            "id": i,
+            "latitude": 37.9 + rng.random() * 0.1,
+            "longitude": 23.7 + rng.random() * 0.1,
+            "radius": rng.choice([100, 300, 600, 2000]),
+        }
+        for i in range(1, 300)
+    ]
+    points = [(37.9 + rng.random() * 0.1, 23.7 + rng.random() * 0.1) for _ in range(500)]
+
+    index = CellIndex(cells)
+    serving = index.serving([lat for lat, _ in points], [lon for _, lon in points])
+
+    for position, (lat, lon) in zip(serving, points):
+        cell_now, _ = check_distance(lat, lon, cells)
+        assert (cells[position] if position >= 0 else None) is cell_now
+
+
+def test_point_outside_every_cell():
+    index = CellIndex([{"id": 1, "latitude": 37.99, "longitude": 23.81, "radius": 100}])
+    assert index.serving_cell(38.5, 24.5) is None
+    assert CellIndex([]).serving_cell(37.99, 23.81) is None
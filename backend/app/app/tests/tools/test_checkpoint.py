@@ -0,0 +1,39 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base, UE
+from app.tools.ue_movement_utils.checkpoint import Checkpointer
+from app.tools.ue_movement_utils.live_ue import LiveUE, LiveUEMap
+
+
+def test_checkpoint_flushes_moved_ues_in_bulk():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[UE.__table__])
+    Session = sessionmaker(bind=engine)
+
+    db = Session()
+    db.add_all(
+        [
+            UE(supi="202010000000001", latitude=0, longitude=0, is_simulated=True),
+            UE(supi="202010000000002", latitude=0, longitude=0, is_simulated=True),
+        ]
+    )
+    db.commit()
+
+    ues = LiveUEMap()
+    moving = LiveUE(supi="202010000000001", is_simulated=True, path_index=3)
+    moving.move(37.99, 23.81)
+    ues["202010000000001"] = moving
+    checkpointer = Checkpointer(ues, interval=0, session_factory=Session)
+
+    assert checkpointer.flush() == 1
+    # Nothing moved since the previous flush
+    assert checkpointer.flush() == 0
+
+    row = db.query(UE).filter(UE.supi == "202010000000001").one()
+    db.refresh(row)
+    assert (row.latitude, row.longitude, row.path_index) == (37.99, 23.81, 3)
+    assert db.query(UE).filter(UE.supi == "202010000000002").one().latitude == 0
+
+    checkpointer.remove("202010000000001")
+    assert "202010000000001" not in ues
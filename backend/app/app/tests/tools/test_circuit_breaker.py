@@ -0,0 +1,85 @@
+import time
+
+import requests
+
+from app.tools.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.tools.notifications import Notification, NotificationDispatcher
+
+
+def test_circuit_opens_fails_fast_and_recovers_through_one_probe():
+    breaker = CircuitBreaker(failures=3, cooldown=0.05)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.success(0.01)
+    assert breaker.state == CLOSED and breaker.allow()
+    assert breaker.as_dict()["rejected"] == 2
+
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+
+def test_timeout_follows_the_latency():
+    breaker = CircuitBreaker(min_timeout=0.5, max_timeout=27, warmup=3)
+    assert breaker.timeout() == 27
+    for _ in range(20):
+        breaker.success(0.2)
+    assert breaker.timeout() == 0.5
+    for _ in range(20):
+        breaker.success(2.0)
+    assert 2.0 < breaker.timeout() < 27
+    timeout = breaker.timeout()
+    breaker.failure(timed_out=True)
+    assert breaker.timeout() == min(2 * timeout, 27)
+
+
+def test_open_destination_fails_fast():
+    dispatcher = NotificationDispatcher(workers=1, breaker_failures=1, breaker_cooldown=60)
+    errors = []
+    url = "http://127.0.0.1:9/callback"
+    destination = dispatcher._destination(url)
+    destination.breaker.failure()
+
+    start = time.monotonic()
+    dispatcher._outstanding = 1
+    dispatcher._deliver(destination, Notification(url, "{}", on_error=errors.append))
+    assert time.monotonic() - start < 0.05
+    assert type(errors[0]).__name__ == "CircuitOpenError"
+    metrics = dispatcher.metrics()
+    assert metrics["rejected"] == 1
+    assert metrics["destinations"]["http://127.0.0.1:9"]["state"] == OPEN
+
+
+
+def test_server_errors_are_not_delivered():
+    dispatcher = NotificationDispatcher(workers=1, breaker_failures=5)
+    url = "http://127.0.0.1:9/callback"
+    destination = dispatcher._destination(url)
+    response = requests.Response()
+    response.status_code = 503
+    destination.session.post = lambda *args, **kwargs: response
+
+    responses, errors = [], []
+    dispatcher._outstanding = 1
+    dispatcher._deliver(
+        destination,
+        Notification(url, "{}", on_response=responses.append, on_error=errors.append),
+    )
+    assert not responses
+    assert errors[0].response is response
+    assert dispatcher.metrics()["failed"] == 1
+    assert dispatcher.metrics()["sent"] == 0
@@ -0,0 +1,51 @@
+import time
+
+from app.tools.check_subscription import check_expiration_time
+from app.tools.clock import SimulationClock
+from app.tools.timer import RepeatedTimer, SequencialTimer, TimerScheduler
+
+
+def test_clock_only_moves_on_steps():
+    clock = SimulationClock(speedup=0, step=1.0, start=0)
+    assert clock.interval == 0
+    assert SimulationClock(speedup=4, step=1.0).interval == 0.25
+
+    timer = SequencialTimer(logger=None, clock=clock)
+    timer.start()
+    for _ in range(90):
+        clock.advance()
+    assert timer.status() == 90
+
+
+def test_repeated_timers_follow_the_simulation_clock():
+    clock = SimulationClock(speedup=0, step=1.0, start=0)
+    timers = TimerScheduler(clock, thread=False)
+    calls = []
+    rt = RepeatedTimer(10, calls.append, "report", scheduler=timers)
+
+    for _ in range(35):
+        clock.advance()
+        timers.run_pending()
+    assert calls == ["report"] * 3
+    assert timers._thread is None
+
+    rt.stop()
+    for _ in range(20):
+        clock.advance()
+        timers.run_pending()
+    assert len(calls) == 3
+
+    # Restarted, due a full period later
+    rt.start()
+    for _ in range(10):
+        clock.advance()
+        timers.run_pending()
+    assert len(calls) == 4
+
+
+def test_expiration_uses_the_simulation_clock():
+    clock = SimulationClock(step=3600.0, start=time.mktime((2030, 1, 1, 10, 0, 0, 0, 0, -1)))
+    assert check_expiration_time("2030-01-01T11:00:00", now=clock.localtime())
+    clock.advance()
+    clock.advance()
+    assert not check_expiration_time("2030-01-01T11:00:00", now=clock.localtime())
@@ -0,0 +1,151 @@
+import threading
+import time
+
+from app.tools.ue_movement_utils.engine import SimulationEngine, TickStats
+
+
+class SlowTask:
+    def __init__(self, work: float, ticks: int):
+        self.work = work
+        self.ticks = []
+        self._left = ticks
+        self.done = threading.Event()
+
+    def is_alive(self) -> bool:
+        return self._left > 0
+
+    def tick(self):
+        self.ticks.append(time.monotonic())
+        time.sleep(self.work)
+        self._left -= 1
+        if self._left == 0:
+            self.done.set()
+
+
+class CountingTask:
+    def __init__(self, ticks: int):
+        self.threads = set()
+        self.count = 0
+        self._left = ticks
+        self.done = threading.Event()
+
+    def is_alive(self) -> bool:
+        return self._left > 0
+
+    def tick(self):
+        self.threads.add(threading.current_thread().name)
+        self.count += 1
+        self._left -= 1
+        if self._left == 0:
+            self.done.set()
+
+
+def test_many_tasks_share_a_bounded_pool():
+    engine = SimulationEngine(workers=2)
+    tasks = [CountingTask(ticks=3) for _ in range(50)]
+    for task in tasks:
+        engine.register(task, interval=0.01)
+    for task in tasks:
+        assert task.done.wait(5)
+
+    # No thread per UE, the ticks run on the workers of the engine
+    threads = set().union(*(task.threads for task in tasks))
+    assert len(threads) <= 2
+    assert all(name.startswith("ue-sim") for name in threads)
+    assert all(task.count == 3 for task in tasks)
+
+
+def test_finished_tasks_leave_the_engine():
+    engine = SimulationEngine(workers=2)
+    task = CountingTask(ticks=2)
+    engine.register(task, interval=0.01)
+    assert task.done.wait(5)
+    time.sleep(0.05)
+    assert engine.running_tasks() == 0
+    assert task.count == 2
+
+
+def test_zero_interval_ticks_back_to_back():
+    engine = SimulationEngine(workers=2)
+    task = CountingTask(ticks=200)
+    start = time.monotonic()
+    engine.register(task, interval=0)
+    assert task.done.wait(5)
+    # Not paced by the default interval of the engine
+    assert time.monotonic() - start < 1
+
+
+def test_a_blocked_task_does_not_delay_the_others():
+    engine = SimulationEngine(workers=4)
+    blocked = SlowTask(work=0.5, ticks=1)
+    others = [CountingTask(ticks=5) for _ in range(5)]
+    engine.register(blocked, interval=0.02)
+    for task in others:
+        engine.register(task, interval=0.02)
+    for task in others:
+        assert task.done.wait(0.4)
+    assert blocked.done.wait(5)
+
+
+class BatchedTask(CountingTask):
+    rounds = []
+
+    @staticmethod
+    def prepare_round(tasks):
+        BatchedTask.rounds.append(len(tasks))
+
+
+def test_tasks_with_the_same_interval_share_their_rounds():
+    engine = SimulationEngine(workers=2)
+    tasks = [BatchedTask(ticks=3) for _ in range(4)]
+    for task in tasks:
+        engine.register(task, interval=0.05)
+        time.sleep(0.005)
+    for task in tasks:
+        assert task.done.wait(5)
+
+    # Registered at different times, ticked together (the registrations may
+    # straddle the start of a round, then the first one is a round apart)
+    assert sum(BatchedTask.rounds) == 12
+    assert BatchedTask.rounds.count(4) >= 2
+
+
+def test_ticks_keep_their_cadence_despite_the_work():
+    engine = SimulationEngine(workers=2)
+    task = SlowTask(work=0.03, ticks=6)
+    engine.register(task, interval=0.05)
+    assert task.done.wait(5)
+
+    # Deadlines do not move with the work done: 5 intervals, not 5 * (interval + work)
+    elapsed = task.ticks[-1] - task.ticks[0]
+    assert 0.2 <= elapsed < 0.3
+    metrics = engine.metrics()
+    assert metrics["ticks"] == 6
+    assert metrics["overruns"] == 0
+    assert metrics["lateness_ms"]["max"] < 50
+
+
+def test_overruns_are_counted_and_missed_deadlines_dropped():
+    engine = SimulationEngine(workers=2)
+    task = SlowTask(work=0.12, ticks=3)
+    engine.register(task, interval=0.05)
+    assert task.done.wait(5)
+
+    metrics = engine.metrics()
+    assert metrics["overruns"] == 3
+    assert metrics["skipped"] > 0
+    # No burst of ticks to catch up once the slow tick ends
+    gaps = [b - a for a, b in zip(task.ticks, task.ticks[1:])]
+    assert min(gaps) >= 0.12
+
+
+def test_tick_stats_percentiles():
+    stats = TickStats(window=3)
+    for lateness in (0.001, 0.002, 0.003, 0.004):
+        stats.tick(lateness, 0.0, 1.0)
+    stats.miss(2)
+    summary = stats.as_dict()
+    assert summary["ticks"] == 4 and summary["missed"] == 2
+    # Only the last 3 ticks are kept
+    assert summary["lateness_ms"]["p50"] == 3.0
+    assert summary["lateness_ms"]["max"] == 4.0
@@ -0,0 +1,27 @@
+from app.tools.ue_movement_utils.events import EventType, cell_events, qos_events
+
+cell_a = {"id": 1, "cell_id": "AAAAA1001"}
+cell_b = {"id": 2, "cell_id": "AAAAA1002"}
+supi = "202010000000001"
+
+
+def event_types(events):
+    return [event.type for event in events]
+
+
+def test_cell_events():
+    assert cell_events(supi, cell_a, dict(cell_a)) == []
+    assert cell_events(supi, None, None) == []
+    assert event_types(cell_events(supi, None, cell_a)) == [EventType.COVERAGE_REGAINED]
+    assert event_types(cell_events(supi, cell_a, None)) == [EventType.COVERAGE_LOST]
+
+    (event,) = cell_events(supi, cell_a, cell_b)
+    assert event.type == EventType.CELL_CHANGED
+    assert (event.previous, event.current) == (cell_a, cell_b)
+
+
+def test_qos_events():
+    assert qos_events(supi, "QOS_GUARANTEED", "QOS_GUARANTEED") == []
+    assert qos_events(supi, "QOS_GUARANTEED", None) == []
+    (event,) = qos_events(supi, None, "QOS_NOT_GUARANTEED")
+    assert event.type == EventType.QOS_STATUS_CHANGED
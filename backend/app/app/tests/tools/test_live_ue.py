@@ -0,0 +1,40 @@
+import json
+from types import SimpleNamespace
+
+from app.tools.ue_movement_utils.live_ue import LiveUE
+
+
+def _ue(**fields):
+    ue = dict(
+        id=1,
+        supi="202010000000001",
+        name="UE1",
+        description="Smartphone",
+        ip_address_v4="10.0.0.1",
+        external_identifier="10001@domain.com",
+        speed="LOW",
+        latitude=37.99,
+        longitude=23.81,
+        Cell_id=1,
+        owner_id=1,
+    )
+    ue.update(fields)
+    return SimpleNamespace(**ue)
+
+
+def test_live_ue_reads_like_the_dict():
+    cell = {"id": 1, "cell_id": "AAAAA1001"}
+    live = LiveUE.from_ue(_ue(), cell, "AAAAA1")
+
+    assert not hasattr(live, "__dict__")
+    assert live["Cell_id"] == 1
+    assert live.get("cell_id_hex") == "AAAAA1001"
+    assert live.get("description") is None
+    assert live.get("missing", "default") == "default"
+
+    live.move(38.0, 23.82)
+    live.attach(None)
+    state = json.loads(json.dumps(dict(live)))
+    assert state["latitude"] == 38.0
+    assert state["Cell_id"] is None and state["gnb_id_hex"] is None
+    assert state["ip_address_v4"] == "10.0.0.1"
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.tools.notifications import NotificationDispatcher
+
+
+class SlowNetApp:
+    """NetApp on localhost answering after ``delay`` seconds"""
+
+    def __init__(self, delay: float):
+        app = self
+        self.active = 0
+        self.peak = 0
+        self.bodies = []
+        self.connections = set()
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                with app._lock:
+                    app.active += 1
+                    app.peak = max(app.peak, app.active)
+                    app.connections.add(self.client_address)
+                time.sleep(delay)
+                with app._lock:
+                    app.active -= 1
+                    app.bodies.append(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", "15")
+                self.end_headers()
+                self.wfile.write(b'{"ack": "TRUE"}')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/callback"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def test_send_does_not_wait_and_bounds_the_connections():
+    netapp = SlowNetApp(delay=0.1)
+    dispatcher = NotificationDispatcher(workers=8, connections=2)
+    acks = []
+    done = threading.Semaphore(0)
+
+    def on_response(response):
+        acks.append(response.json()["ack"])
+        done.release()
+
+    start = time.monotonic()
+    for i in range(6):
+        assert dispatcher.send(netapp.url, f'{{"n": {i}}}', on_response=on_response)
+    assert time.monotonic() - start < 0.05
+
+    for _ in range(6):
+        assert done.acquire(timeout=5)
+    assert acks == ["TRUE"] * 6
+    assert netapp.peak <= 2
+    # Kept alive: no more connections than the pool size
+    assert len(netapp.connections) <= 2
+    assert dispatcher.metrics()["sent"] == 6
+    netapp.server.shutdown()
+
+
+def test_unreachable_destination_goes_to_on_error_and_full_queue_drops():
+    dispatcher = NotificationDispatcher(workers=1, connections=1, queue_size=1)
+    errors = []
+    failed = threading.Event()
+
+    def on_error(ex):
+        errors.append(ex)
+        failed.set()
+
+    # Nothing listens on the discard port
+    assert dispatcher.send("http://127.0.0.1:9/callback", "{}", on_error=on_error)
+    assert failed.wait(5)
+    assert dispatcher.metrics()["failed"] == 1
+
+    dispatcher._outstanding = dispatcher.queue_size
+    assert not dispatcher.send("http://127.0.0.1:9/callback", "{}")
+    assert dispatcher.metrics()["dropped"] == 1
+
+
+def test_reports_of_a_subscription_are_coalesced():
+    netapp = SlowNetApp(delay=0)
+    dispatcher = NotificationDispatcher(workers=2, coalesce_window=0.1, max_reports=3)
+    acks = []
+    done = threading.Semaphore(0)
+
+    def on_response(response):
+        acks.append(response.json()["ack"])
+        done.release()
+
+    subscriptions = {"0": "http://nef/subscriptions/0", "1": "http://nef/subscriptions/1"}
+    reports = [("0", i) for i in range(5)] + [("1", 5)]
+    for sub, i in reports:
+        report = {
+            "externalId": f"{i}@domain.com",
+            "subscription": subscriptions[sub],
+            "monitoringType": "LOCATION_REPORTING",
+        }
+        assert dispatcher.send_report(netapp.url, report, on_response=on_response)
+
+    for _ in range(6):
+        assert done.acquire(timeout=5)
+    notifications = [json.loads(body) for body in netapp.bodies]
+    # The link is given once, the reports of another subscription are sent apart
+    batches = sorted(
+        (
+            notification["subscription"],
+            [report["externalId"] for report in notification["monitoringEventReports"]],
+        )
+        for notification in notifications
+    )
+    # The first 3 when the batch is full, the others at the end of the window
+    assert batches == [
+        (subscriptions["0"], ["0@domain.com", "1@domain.com", "2@domain.com"]),
+        (subscriptions["0"], ["3@domain.com", "4@domain.com"]),
+        (subscriptions["1"], ["5@domain.com"]),
+    ]
+    assert all(
+        "subscription" not in report
+        for notification in notifications
+        for report in notification["monitoringEventReports"]
+    )
+    assert acks == ["TRUE"] * 6
+    netapp.server.shutdown()
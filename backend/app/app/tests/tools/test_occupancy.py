@@ -0,0 +1,94 @@
+from app.tests.utils.mongo import Database
+from app.tools.occupancy import CellOccupancy, SharedCellOccupancy
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query(self, *columns):
+        return FakeQuery(self.rows)
+
+
+def test_occupancy_follows_handovers():
+    occupancy = CellOccupancy()
+    db = FakeSession([("202010000000001", 1), ("202010000000002", 1), ("202010000000003", None)])
+    occupancy.load(db)
+    assert occupancy.count(1) == 2
+    assert occupancy.count(None) == 0
+
+    # Handover, then loss of coverage
+    occupancy.attach("202010000000001", 2)
+    assert occupancy.counts() == {1: 1, 2: 1}
+    occupancy.attach("202010000000001", None)
+    assert occupancy.counts() == {1: 1}
+
+    # Regained coverage of a UE that was out of coverage from the start
+    occupancy.attach("202010000000003", 1)
+    occupancy.attach("202010000000003", 1)
+    assert occupancy.count(1) == 2
+
+    occupancy.detach("202010000000002")
+    assert occupancy.count(1) == 1
+
+
+def test_shared_occupancy_is_counted_by_every_worker():
+    mongo = Database()
+    rows = [("202010000000001", 1), ("202010000000002", 1), ("202010000000003", None)]
+    first = SharedCellOccupancy(mongo, flush_interval=3600)
+    second = SharedCellOccupancy(mongo, flush_interval=3600)
+    first.load(FakeSession(rows))
+    # The UEs are counted once, however many workers load them
+    second.load(FakeSession(rows))
+    assert first.counts() == second.counts() == {1: 2}
+
+    # The changes of a worker are counted at once and written on its next flush
+    writes = mongo["UECell"].writes
+    first.attach("202010000000001", 2)
+    first.attach("202010000000003", 2)
+    assert first.counts() == {1: 1, 2: 2}
+    assert mongo["UECell"].writes == writes
+    first.flush()
+    assert mongo["UECell"].writes == writes + 1
+    second.flush()
+    assert second.counts() == {1: 1, 2: 2}
+
+    # A UE moved by the other worker is taken out of the cell it was counted in
+    second.attach("202010000000001", 3)
+    second.detach("202010000000002")
+    second.flush()
+    first.flush()
+    assert first.counts() == second.counts() == {2: 1, 3: 1}
+
+
+def test_invalidate_reloads_every_worker():
+    mongo = Database()
+    rows = [("202010000000001", 1), ("202010000000002", 1)]
+    first = SharedCellOccupancy(mongo, flush_interval=3600)
+    second = SharedCellOccupancy(mongo, flush_interval=3600)
+    first.load(FakeSession(rows))
+    second.load(FakeSession(rows))
+    second.attach("202010000000001", 2)
+    second.flush()
+
+    # The UEs were replaced in the database
+    first.invalidate()
+    rows = [("202010000000003", 1)]
+    first.load(FakeSession(rows))
+    second.flush()
+    second.load(FakeSession(rows))
+    assert first.counts() == second.counts() == {1: 1}
+
+    # Counted from the reloaded cells, not the ones attached before
+    second.attach("202010000000003", 2)
+    second.flush()
+    first.flush()
+    assert first.counts() == second.counts() == {2: 1}
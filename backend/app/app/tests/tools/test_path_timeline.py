@@ -0,0 +1,110 @@
+import math
+
+from app.tools import radio
+from app.tools.cell_index import CellIndex
+from app.tools.path_timeline import build_timeline, locate_all
+
+cells = [
+    {"id": 1, "latitude": 37.998, "longitude": 23.819, "radius": 100},
+    {"id": 2, "latitude": 37.999, "longitude": 23.820, "radius": 500, "tx_power": 40},
+]
+points = [
+    {"latitude": 37.998 + step * 0.0005, "longitude": 23.819 + step * 0.0005}
+    for step in range(20)
+]
+
+
+def test_timeline_matches_evaluate():
+    timeline = build_timeline(1, 1, points, CellIndex(cells))
+
+    for point, serving, rsrp in zip(points, timeline.serving, timeline.rsrp):
+        report = radio.evaluate(point["latitude"], point["longitude"], cells)
+        if report.cell is None:
+            assert serving == -1 and math.isnan(rsrp)
+        else:
+            assert timeline.cells[serving] is report.cell
+            assert abs(rsrp - report.rsrps[f"{report.cell['id']}"]) < 1e-3
+
+
+def test_timeline_keeps_index_version():
+    index = CellIndex(cells)
+    assert build_timeline(1, 1, points, index).version == index.version
+    assert CellIndex(cells).version != index.version
+
+
+def test_locate_interpolates_by_distance():
+    timeline = build_timeline(1, 1, points, CellIndex(cells))
+    step = radio.haversine(
+        points[0]["latitude"], points[0]["longitude"],
+        points[1]["latitude"], points[1]["longitude"],
+    )
+    assert abs(timeline.distance[1] - step) < 1e-6
+    assert timeline.length == timeline.distance[-1]
+
+    middle = (timeline.distance[2] + timeline.distance[3]) / 2
+    lat, lon, index, fraction = timeline.locate(middle)
+    assert index == 2 and abs(fraction - 0.5) < 1e-9
+    assert abs(lat - (points[2]["latitude"] + 0.00025)) < 1e-9
+    assert abs(lon - (points[2]["longitude"] + 0.00025)) < 1e-9
+
+    # Past the end the UE loops back to the start
+    assert timeline.locate(timeline.length + middle)[2] == 2
+
+
+def test_resume_from_index_or_nearest_point():
+    timeline = build_timeline(1, 1, points, CellIndex(cells))
+    middle = (timeline.distance[5] + timeline.distance[6]) / 2
+    lat, lon, index, _ = timeline.locate(middle)
+
+    assert abs(timeline.resume(lat, lon, index) - middle) < 0.5
+    # Missing or stale index: nearest point
+    point = points[12]
+    assert timeline.resume(point["latitude"], point["longitude"]) == timeline.distance[12]
+    assert timeline.resume(point["latitude"], point["longitude"], 3) == timeline.distance[12]
+
+
+def test_located_cells_match_the_single_ue_kernel():
+    index = CellIndex(cells)
+    timeline = build_timeline(1, 1, points, index)
+    distances = [step * 7.0 for step in range(200)]
+
+    located = locate_all(index, [timeline] * len(distances), distances)
+    for distance, ((lat, lon, _, _), serving, rsrp) in zip(distances, located):
+        assert (lat, lon) == timeline.locate(distance)[:2]
+        single = radio.compute_radio([lat], [lon], index.arrays).reading(0)
+        assert serving == single.serving
+        if serving < 0:
+            assert math.isnan(rsrp)
+        else:
+            assert abs(rsrp - single.rsrps[serving]) < 1e-3
+
+
+def test_stale_timeline_is_resolved_with_the_index():
+    timeline = build_timeline(1, 1, points, CellIndex(cells))
+    index = CellIndex(cells[:1])
+
+    (_, serving, _), = locate_all(index, [timeline], [0.0])
+    assert serving == 0
+    (_, serving, rsrp), = locate_all(index, [timeline], [timeline.distance[3]])
+    assert serving == -1 and math.isnan(rsrp)
+
+
+def test_round_locates_the_ues_like_a_single_tick():
+    from types import SimpleNamespace
+
+    from app.tools.ue_movement_utils.sim_ue import BackgroundTasks
+
+    index = CellIndex(cells)
+    timeline = build_timeline(1, 1, points, index)
+    tasks = []
+    for distance in (0.0, 130.0, 1e4):
+        task = BackgroundTasks(args=(None, "202010000000001"))
+        task._ready = True
+        task.topology = SimpleNamespace(index=index)
+        task.timeline = timeline
+        task.distance = distance
+        tasks.append(task)
+
+    BackgroundTasks.prepare_round(tasks)
+    for task in tasks:
+        assert task._prepared == locate_all(index, [timeline], [task.distance])[0]
@@ -0,0 +1,55 @@
+from app.tools import radio
+from app.tools.distance import distance
+from app.tools.rsrp_calculation import calc_path_loss
+
+cells = [
+    {"id": 1, "latitude": 37.998, "longitude": 23.819, "radius": 100},
+    {"id": 2, "latitude": 37.999, "longitude": 23.820, "radius": 500},
+    {"id": 3, "latitude": 38.100, "longitude": 23.900, "radius": 50},
+]
+positions = [(37.9981, 23.8191), (37.9995, 23.8205), (38.5, 24.5)]
+
+
+def scalar_serving(lat, lon, cells):
+    in_range = [
+        (distance(lat, lon, cell["latitude"], cell["longitude"]), position)
+        for position, cell in enumerate(cells)
+        if distance(lat, lon, cell["latitude"], cell["longitude"]) <= cell["radius"]
+    ]
+    return min(in_range)[1] if in_range else -1
+
+
+def test_compute_radio_matches_scalar_functions():
+    matrices = radio.compute_radio(
+        [lat for lat, _ in positions],
+        [lon for _, lon in positions],
+        radio.cell_arrays(cells),
+    )
+
+    for row, (lat, lon) in enumerate(positions):
+        reading = matrices.reading(row)
+        assert reading.serving == scalar_serving(lat, lon, cells)
+
+        for position, cell in enumerate(cells):
+            args = (lat, lon, cell["latitude"], cell["longitude"])
+            assert abs(reading.distances[position] - distance(*args)) < 1e-6
+            assert abs(reading.path_losses[position] - calc_path_loss(*args)) < 1e-6
+            assert abs(reading.rsrps[position] - (30 - calc_path_loss(*args))) < 1e-6
+
+
+def test_evaluate_uses_per_cell_frequency_and_power():
+    custom = [dict(cells[0], frequency=3.5, tx_power=43), cells[1]]
+    lat, lon = positions[0]
+    report = radio.evaluate(lat, lon, custom)
+
+    assert report.cell == custom[0]
+    args = (lat, lon, custom[0]["latitude"], custom[0]["longitude"])
+    assert abs(report.path_losses["1"] - calc_path_loss(*args, fc=3.5)) < 1e-6
+    assert abs(report.rsrps["1"] - (43 - calc_path_loss(*args, fc=3.5))) < 1e-6
+    args = (lat, lon, custom[1]["latitude"], custom[1]["longitude"])
+    assert abs(report.rsrps["2"] - (30 - calc_path_loss(*args))) < 1e-6
+
+
+def test_compute_radio_without_cells():
+    matrices = radio.compute_radio([37.998], [23.819], radio.cell_arrays([]))
+    assert matrices.reading(0).serving == -1
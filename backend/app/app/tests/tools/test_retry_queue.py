@@ -0,0 +1,177 @@
+import copy
+import itertools
+import time
+
+from app.tools import retry_queue as retry_module
+from app.tools.circuit_breaker import CircuitOpenError
+from app.tools.notifications import Notification, SubscriptionRef
+from app.tools.retry_queue import RetryQueue
+
+
+class Collection:
+    """The operators of the Mongo collections the retry queue uses"""
+
+    def __init__(self):
+        self.docs = {}
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _matches(doc, query):
+        for key, value in query.items():
+            if isinstance(value, dict) and "$lte" in value:
+                if not doc.get(key) <= value["$lte"]:
+                    return False
+            elif isinstance(doc.get(key), list) and not isinstance(value, list):
+                if value not in doc[key]:
+                    return False
+            elif doc.get(key) != value:
+                return False
+        return True
+
+    def insert_one(self, doc):
+        doc.setdefault("_id", next(self._ids))
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    def find(self, query=None, projection=None):
+        return Cursor(
+            [copy.deepcopy(d) for d in self.docs.values() if self._matches(d, query or {})]
+        )
+
+    def find_one_and_update(self, query, update):
+        for doc in self.docs.values():
+            if self._matches(doc, query):
+                doc.update(update["$set"])
+                return copy.deepcopy(doc)
+
+    def update_one(self, query, update):
+        for doc in self.docs.values():
+            if self._matches(doc, query):
+                doc.update(update.get("$set", {}))
+                for key, value in update.get("$inc", {}).items():
+                    doc[key] += value
+                return
+
+    def delete_one(self, query):
+        for id, doc in list(self.docs.items()):
+            if self._matches(doc, query):
+                del self.docs[id]
+                return
+
+    def count_documents(self, query):
+        return len(self.find(query).docs)
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        return Cursor(self.docs[:count])
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class Dispatcher:
+    """Hands the retries to the test instead of the network"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, url, payload, on_response=None, on_error=None):
+        self.sent.append((url, payload, on_response, on_error))
+        return True
+
+
+def make_queue(monkeypatch, budget=3):
+    db = {"CallbackRetry": Collection(), "CallbackDeadLetter": Collection()}
+    deleted = []
+    monkeypatch.setattr(
+        retry_module.subscription_registry,
+        "delete",
+        lambda db, collection, id: deleted.append((collection, id)),
+    )
+    queue = RetryQueue(db, Dispatcher(), budget=budget, base_delay=0, max_delay=0)
+    monkeypatch.setattr(queue, "start", lambda: None)
+    return queue, db, deleted
+
+
+def failed_notification(errors):
+    ref = SubscriptionRef("MonitoringEvent", "sub1", owner_id=1)
+    return Notification(
+        "http://netapp/callback", "{}", on_error=errors.append, subscriptions=(ref,)
+    )
+
+
+def test_failed_callback_is_retried_until_delivered(monkeypatch):
+    queue, db, deleted = make_queue(monkeypatch)
+    errors = []
+    queue.push(failed_notification(errors), ConnectionError("down"))
+    queue.push(failed_notification(errors), ConnectionError("down"))
+    assert queue.status(owner_id=1)["pending"] == 2
+    assert queue.status(owner_id=2)["pending"] == 0
+
+    # One retry at a time while the NetApp is failing
+    queue._poll()
+    assert len(queue._dispatcher.sent) == 1
+    *_, on_error = queue._dispatcher.sent[0]
+    on_error(ConnectionError("still down"))
+    assert queue.status()["failing"][0]["failures"] == 1
+
+    queue._poll()
+    _, _, on_response, _ = queue._dispatcher.sent[1]
+    on_response("response")
+    # Back up: the other notification follows at once
+    queue._poll()
+    _, _, on_response, _ = queue._dispatcher.sent[2]
+    on_response("response")
+
+    assert db["CallbackRetry"].docs == {}
+    assert db["CallbackDeadLetter"].docs == {}
+    assert deleted == [] and errors == []
+
+
+def test_spent_budget_dead_letters_and_drops_the_subscription(monkeypatch):
+    queue, db, deleted = make_queue(monkeypatch, budget=2)
+    errors = []
+    queue.push(failed_notification(errors), ConnectionError("down"))
+    queue.push(failed_notification(errors), ConnectionError("down"))
+
+    for _ in range(2):
+        queue._poll()
+        *_, on_error = queue._dispatcher.sent[-1]
+        on_error(ConnectionError("down"))
+
+    status = queue.status()
+    assert status["pending"] == 0 and status["dead_letters"] == 2
+    assert status["failing"] == []
+    assert deleted == [("MonitoringEvent", "sub1")]
+    assert len(errors) == 2
+
+
+def test_circuit_rejections_do_not_spend_the_budget(monkeypatch):
+    queue, db, deleted = make_queue(monkeypatch, budget=2)
+    errors = []
+    queue.push(failed_notification(errors), ConnectionError("down"))
+
+    for _ in range(5):
+        queue._poll()
+        *_, on_error = queue._dispatcher.sent[-1]
+        on_error(CircuitOpenError("circuit open", retry_after=0))
+    failing = queue.status()["failing"][0]
+    assert failing["failures"] == 0
+    assert len(queue._dispatcher.sent) == 5
+    assert db["CallbackRetry"].find().docs[0]["attempts"] == 1
+
+    # Retried when the circuit half-opens
+    queue._poll()
+    *_, on_error = queue._dispatcher.sent[-1]
+    on_error(CircuitOpenError("circuit open", retry_after=30))
+    assert queue.status()["failing"][0]["retry_at"] >= time.time() + 29
+    queue._poll()
+    assert len(queue._dispatcher.sent) == 6
+    assert deleted == [] and errors == []
@@ -0,0 +1,81 @@
+from bson import ObjectId
+
+from app.tests.utils.mongo import Database
+from app.tools.subscription_registry import SubscriptionRegistry
+
+
+class Collection(list):
+    def find(self):
+        return iter(self)
+
+
+def test_lookups_are_indexed():
+    loss = {
+        "_id": ObjectId(),
+        "externalId": "10001@domain.com",
+        "monitoringType": "LOSS_OF_CONNECTIVITY",
+    }
+    qos = {
+        "_id": ObjectId(),
+        "ipv4Addr": "10.0.0.1",
+        "ipv6Addr": "0:0:0:0:0:0:0:1",
+        "macAddr": "22-00-00-00-00-01",
+    }
+    db = {"MonitoringEvent": Collection([loss]), "QoSMonitoring": Collection([qos])}
+
+    registry = SubscriptionRegistry()
+    found = registry.monitoring_event(db, "10001@domain.com", "LOSS_OF_CONNECTIVITY")
+    assert found == loss and found is not loss
+    assert registry.monitoring_event(db, "10001@domain.com", "UE_REACHABILITY") is None
+
+    for key in ("ipv4Addr", "ipv6Addr", "macAddr"):
+        assert registry.qos_monitoring(db, key, qos[key]) == qos
+    assert registry.qos_monitoring(db, "ipv4Addr", "10.0.0.2") is None
+
+    registry._remove("QoSMonitoring", str(qos["_id"]))
+    assert registry.qos_monitoring(db, "macAddr", qos["macAddr"]) is None
+
+
+def test_shared_registries_see_the_changes_of_the_other_workers():
+    mongo = Database()
+    loss = {"externalId": "10001@domain.com", "monitoringType": "LOSS_OF_CONNECTIVITY"}
+    mongo["MonitoringEvent"].insert_one(loss)
+    first = SubscriptionRegistry(shared=True, sync_interval=0)
+    second = SubscriptionRegistry(shared=True, sync_interval=0)
+    for registry in (first, second):
+        assert registry.monitoring_event(mongo, "10001@domain.com", "LOSS_OF_CONNECTIVITY")
+
+    reachability = {"externalId": "10001@domain.com", "monitoringType": "UE_REACHABILITY"}
+    mongo["MonitoringEvent"].insert_one(reachability)
+    first.refresh(mongo, "MonitoringEvent", reachability["_id"])
+    first.delete(mongo, "MonitoringEvent", loss["_id"])
+
+    assert second.monitoring_event(mongo, "10001@domain.com", "UE_REACHABILITY") == reachability
+    assert second.monitoring_event(mongo, "10001@domain.com", "LOSS_OF_CONNECTIVITY") is None
+    # Read once
+    assert len(second._applied) == 2
+    assert second.monitoring_event(mongo, "10001@domain.com", "UE_REACHABILITY") == reachability
+
+
+def test_reports_are_reserved_and_refunded():
+    mongo = Database()
+    location = {
+        "externalId": "10001@domain.com",
+        "monitoringType": "LOCATION_REPORTING",
+        "maximumNumberOfReports": 3,
+    }
+    mongo["MonitoringEvent"].insert_one(location)
+    registry = SubscriptionRegistry()
+    found = registry.monitoring_event(mongo, "10001@domain.com", "LOCATION_REPORTING")
+
+    # Reports queued from a copy taken before any of them
+    for _ in range(3):
+        assert registry.reserve_report(mongo, "MonitoringEvent", found["_id"])
+    assert registry.reserve_report(mongo, "MonitoringEvent", found["_id"]) is None
+    assert mongo["MonitoringEvent"].find_one()["maximumNumberOfReports"] == 0
+
+    # One of them was dead-lettered
+    doc = registry.refund_report(mongo, "MonitoringEvent", found["_id"])
+    assert doc["maximumNumberOfReports"] == 1
+    found = registry.monitoring_event(mongo, "10001@domain.com", "LOCATION_REPORTING")
+    assert found["maximumNumberOfReports"] == 1
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from app.tools.timer import RepeatedTimer, TimerScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_due_timers_keep_their_cadence():
+    clock = Clock()
+    scheduler = TimerScheduler(clock, thread=False)  # driven by the test
+    fast = scheduler.schedule(1, print)
+    slow = scheduler.schedule(5, print)
+
+    clock.now = 1.2
+    assert scheduler._pop_due(clock.now) == [fast]
+    assert fast.due == 2
+    # Late: the missed runs are skipped
+    clock.now = 5.5
+    assert scheduler._pop_due(clock.now) == [fast, slow]
+    assert fast.due == 6.5 and slow.due == 10
+
+
+def test_cancelled_timers_are_dropped():
+    clock = Clock()
+    scheduler = TimerScheduler(clock, thread=False)
+    entries = [scheduler.schedule(i + 1, print) for i in range(10)]
+    for entry in entries[:4]:
+        scheduler.cancel(entry)
+    assert len(scheduler) == 6 and len(scheduler._heap) == 10
+    # More than half cancelled, the heap is compacted
+    scheduler.cancel(entries[4])
+    scheduler.cancel(entries[5])
+    assert len(scheduler) == 4 and len(scheduler._heap) == 4
+
+    clock.now = 100
+    assert scheduler._pop_due(clock.now) == entries[6:]
+
+
+def test_repeated_timers_share_one_thread():
+    scheduler = TimerScheduler()
+    calls = []
+    timers = [
+        RepeatedTimer(0.02, calls.append, i, scheduler=scheduler) for i in range(50)
+    ]
+    threads = threading.active_count()
+    time.sleep(0.15)
+    assert threading.active_count() == threads
+    for rt in timers:
+        rt.stop()
+    assert len(scheduler) == 0
+    assert set(calls) == set(range(50))
+    time.sleep(0.02)  # a run already under way
+    count = len(calls)
+    time.sleep(0.05)
+    assert len(calls) == count
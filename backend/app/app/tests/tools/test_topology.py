@@ -0,0 +1,25 @@
+from types import MappingProxyType
+
+from app.tools.cell_index import CellIndex
+from app.tools.topology import Topology
+
+cells = [
+    {"id": 1, "cell_id": "AAAAA1001", "gNB_id": 7, "latitude": 37.998, "longitude": 23.819, "radius": 100},
+    {"id": 2, "cell_id": "AAAAA1002", "gNB_id": None, "latitude": 37.999, "longitude": 23.820, "radius": 100},
+]
+
+
+def test_topology_resolves_cells_and_gnbs():
+    topology = Topology(
+        owner_id=1,
+        version=1,
+        index=CellIndex(cells),
+        cells_by_id=MappingProxyType({cell["id"]: cell for cell in cells}),
+        gnbs=MappingProxyType({7: {"id": 7, "gNB_id": "AAAAA1"}}),
+    )
+
+    cell = topology.serving_cell(37.998, 23.819)
+    assert cell is topology.cell(1)
+    assert topology.gnb_hex(cell) == "AAAAA1"
+    assert topology.gnb_hex(topology.cell(2)) is None
+    assert topology.gnb_hex(topology.cell(None)) is None
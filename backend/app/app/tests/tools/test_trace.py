@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+
+from app.tools.ue_movement_utils.events import EventType, MovementEvent
+from app.tools.ue_movement_utils.live_ue import LiveUE
+from app.tools.ue_movement_utils.trace import (
+    EVENT_BITS,
+    TRACE_DTYPE,
+    TraceRecorder,
+    list_traces,
+    open_trace,
+)
+
+
+def test_recorded_trace_is_memory_mapped_back(tmp_path):
+    recorder = TraceRecorder(str(tmp_path))
+    live = LiveUE(supi="202010000000001", external_identifier="10001@domain.com")
+    cell = {"id": 3, "cell_id": "AAAAA1001"}
+
+    live.move(37.998, 23.819)
+    recorder.record(100.0, live, float("nan"))
+    live.move(37.999, 23.820)
+    live.attach(cell, "AAAAA1")
+    regained = MovementEvent(EventType.COVERAGE_REGAINED, live.supi, None, cell)
+    recorder.record(101.0, live, -72.5, [regained], qos_status="QOS_GUARANTEED")
+    recorder.flush()
+
+    assert list_traces(str(tmp_path)) == [recorder.name]
+    trace = open_trace(str(tmp_path), recorder.name)
+    assert isinstance(trace.records, np.memmap)
+    assert trace.records.dtype == TRACE_DTYPE
+    assert len(trace.records) == 2
+
+    first, second = trace.records
+    assert first["cell"] == -1 and math.isnan(first["rsrp"]) and first["qos"] == -1
+    assert second["cell"] == 3 and second["rsrp"] == np.float32(-72.5)
+    assert second["events"] == EVENT_BITS[EventType.COVERAGE_REGAINED]
+    assert list(np.flatnonzero(trace.records["events"])) == [1]
+
+    replayed = trace.live(second)
+    assert replayed.supi == live.supi
+    assert replayed.external_identifier == live.external_identifier
+    assert (replayed.latitude, replayed.longitude) == (37.999, 23.820)
+    assert (replayed.Cell_id, replayed.cell_id_hex, replayed.gnb_id_hex) == (
+        3,
+        "AAAAA1001",
+        "AAAAA1",
+    )
+
+
+def test_partial_record_is_ignored(tmp_path):
+    recorder = TraceRecorder(str(tmp_path))
+    recorder.record(100.0, LiveUE(supi="202010000000001"), float("nan"))
+    recorder.flush()
+    with open(tmp_path / f"{recorder.name}.trace", "ab") as f:
+        f.write(b"\0" * 5)
+
+    assert len(open_trace(str(tmp_path), recorder.name).records) == 1
+
+
+def test_traces_are_rotated_and_bounded(tmp_path):
+    recorder = TraceRecorder(str(tmp_path), max_bytes=2 * TRACE_DTYPE.itemsize, keep=2)
+    live = LiveUE(supi="202010000000001")
+    names = []
+    for tick in range(6):
+        recorder.record(100.0 + tick, live, float("nan"))
+        if recorder.name not in names:
+            names.append(recorder.name)
+    recorder.close()
+
+    assert len(names) == 3
+    assert list_traces(str(tmp_path)) == sorted(names[1:])
+    for name in names[1:]:
+        trace = open_trace(str(tmp_path), name)
+        assert len(trace.records) == 2
+        assert trace.ues == [{"supi": "202010000000001", "external_identifier": None,
+                              "ip_address_v4": None, "owner_id": None}]
+
+
+def test_traces_are_listed_by_owner(tmp_path):
+    recorder = TraceRecorder(str(tmp_path))
+    recorder.record(100.0, LiveUE(supi="202010000000001", owner_id=1), float("nan"))
+    recorder.record(100.0, LiveUE(supi="202010000000002", owner_id=2), float("nan"))
+    recorder.close()
+
+    assert list_traces(str(tmp_path), 1) == [recorder.name]
+    assert list_traces(str(tmp_path), 3) == []
+    trace = open_trace(str(tmp_path), recorder.name)
+    assert trace.ues_of(2) == [1]
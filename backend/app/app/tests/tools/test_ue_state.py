@@ -0,0 +1,134 @@
+import pytest
+
+from app.tools.ue_movement_utils.live_ue import LiveUE, LiveUEMap
+from app.tests.utils.mongo import Collection
+from app.tools.ue_movement_utils.state import (
+    InProcessUEStateStore,
+    MongoUEStateStore,
+    create_state_store,
+)
+
+
+def test_in_process_store_claims_once():
+    ues = LiveUEMap()
+    store = InProcessUEStateStore(ues)
+
+    assert store.claim("202010000000001", 1)
+    assert not store.claim("202010000000001", 2)
+    assert store.is_running("202010000000001", 1)
+    assert not store.is_running("202010000000001", 2)
+
+    live = LiveUE(supi="202010000000001", Cell_id=3)
+    assert store.publish("202010000000001", live) is False
+    assert store.get("202010000000001") is live
+    assert store.as_json()["202010000000001"]["Cell_id"] == 3
+
+    store.remove("202010000000001")
+    assert store.get("202010000000001") is None
+    assert not store.is_running("202010000000001", 1)
+    assert store.claim("202010000000001", 2)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_state_store("redis", LiveUEMap())
+
+
+def test_snapshots_stay_consistent():
+    ues = LiveUEMap()
+    first = LiveUE(supi="202010000000001", Cell_id=1)
+    ues["202010000000001"] = first
+    snapshot = ues.snapshot()
+    version = ues.version
+    # Taken without a copy while nothing changed
+    assert ues.snapshot() is snapshot
+    ues["202010000000001"] = first
+    assert ues.version == version
+
+    ues["202010000000002"] = LiveUE(supi="202010000000002", Cell_id=1)
+    ues.pop("202010000000001")
+    assert ues.version == version + 2
+    assert list(snapshot) == ["202010000000001"]
+    assert list(ues.snapshot()) == ["202010000000002"]
+
+    # Records are shared, so snapshots show the current cell
+    first.attach({"id": 2, "cell_id": "AAAAA1002"})
+    assert snapshot["202010000000001"]["Cell_id"] == 2
+
+    # Iterating the map while UEs start and stop
+    for supi in ues:
+        ues[f"{supi}0"] = LiveUE(supi=f"{supi}0")
+        ues.pop(supi)
+    assert list(ues) == ["2020100000000020"]
+
+
+def test_speed_to_mps():
+    from app.tools.ue_movement_utils.common import speed_to_mps
+
+    assert speed_to_mps("LOW") == 1.0
+    assert speed_to_mps("HIGH") == 10.0
+    assert speed_to_mps("STATIONARY") == 0.0
+    assert speed_to_mps(None) == 0.0
+    assert speed_to_mps("12.5") == 12.5
+
+
+def test_mongo_store_writes_the_states_in_batches():
+    collection = Collection()
+    store = MongoUEStateStore(collection, lease=30, flush_interval=3600)
+    other = MongoUEStateStore(collection, lease=30, flush_interval=3600)
+    supis = [f"20201000000000{i}" for i in range(1, 6)]
+    for supi in supis:
+        assert store.claim(supi, 1)
+    assert not other.claim(supis[0], 2)
+
+    writes = collection.writes
+    for tick in range(10):
+        for supi in supis:
+            assert store.publish(supi, {"supi": supi, "tick": tick}, lease=30) is False
+    assert collection.writes == writes
+    store.flush()
+    assert collection.writes == writes + 1
+    assert other.get(supis[0]) == {"supi": supis[0], "tick": 9}
+
+    # A stop request of another worker is seen after the next flush
+    assert other.stop(supis[0], 1, timeout=0)
+    store.flush()
+    assert store.publish(supis[0], {"supi": supis[0]}) is True
+    assert store.publish(supis[1], {"supi": supis[1]}) is False
+
+    # Nothing is written back for a removed UE
+    store.remove(supis[0])
+    store.flush()
+    assert other.get(supis[0]) is None
+
+    # A released UE is not shown, nor the ones of a worker whose lease expired
+    store.release(supis[1])
+    assert supis[1] not in other.all()
+    collection.update_one({"_id": supis[2]}, {"$set": {"expires": 0}})
+    assert other.get(supis[2]) is None
+    assert sorted(other.all()) == supis[3:]
+
+
+def test_radio_reading_is_computed_on_request(monkeypatch):
+    from app.tools import radio, topology
+    from app.tools.cell_index import CellIndex
+    from app.tools.ue_movement_utils import common
+
+    cells = [{"id": 3, "latitude": 37.998, "longitude": 23.819, "radius": 100}]
+    index = CellIndex(cells)
+    monkeypatch.setitem(
+        topology.topologies,
+        1,
+        topology.Topology(1, 1, index, {3: cells[0]}, {}),
+    )
+    store = InProcessUEStateStore(LiveUEMap())
+    monkeypatch.setattr(common, "ue_state", store)
+
+    assert common.retrieve_ue_rsrps(None, "202010000000001") is None
+    live = LiveUE(supi="202010000000001", owner_id=1, Cell_id=3)
+    live.move(37.998, 23.8195)
+    store.publish("202010000000001", live)
+
+    reading = radio.compute_radio([37.998], [23.8195], index.arrays).reading(0)
+    assert common.retrieve_ue_radio(None, "202010000000001") == reading.as_json()
+    assert common.retrieve_ue_rsrps(None, "202010000000001") == reading.as_json()["rsrps"]
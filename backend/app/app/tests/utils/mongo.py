@@ -0,0 +1,176 @@
+import copy
+
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(doc, branch) for branch in condition):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if op == "$gt" and not value > operand:
+                        return False
+                    if op == "$gte" and not value >= operand:
+                        return False
+                    if op == "$lt" and not value < operand:
+                        return False
+                    if op == "$lte" and not value <= operand:
+                        return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _apply(doc: dict, update: dict):
+    for key, value in update.get("$set", {}).items():
+        doc[key] = copy.deepcopy(value)
+    for key, value in update.get("$inc", {}).items():
+        doc[key] = doc.get(key, 0) + value
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+
+
+class Result:
+    def __init__(self, modified_count=0):
+        self.modified_count = modified_count
+
+
+class Collection:
+    """The operators of a Mongo collection used by the shared state, in memory"""
+
+    def __init__(self):
+        self.docs = {}
+        self.writes = 0  # round trips that wrote to the collection
+
+    def _find(self, query):
+        return [doc for doc in self.docs.values() if _matches(doc, query or {})]
+
+    def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate key")
+        self.writes += 1
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    def insert_many(self, docs, ordered=True):
+        self.writes += 1
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc["_id"] in self.docs:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.docs[doc["_id"]] = copy.deepcopy(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    def find(self, query=None, projection=None):
+        return [copy.deepcopy(doc) for doc in self._find(query)]
+
+    def find_one(self, query=None, projection=None):
+        found = self._find(query)
+        return copy.deepcopy(found[0]) if found else None
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=False, **kwargs):
+        self.writes += 1
+        found = self._find(query)
+        if not found:
+            if upsert:
+                doc = {key: value for key, value in query.items() if not key.startswith("$")}
+                _apply(doc, update)
+                self.docs[doc["_id"]] = doc
+            return None
+        before = copy.deepcopy(found[0])
+        _apply(found[0], update)
+        # ReturnDocument.AFTER is True
+        return copy.deepcopy(found[0]) if return_document else before
+
+    def find_one_and_delete(self, query):
+        self.writes += 1
+        found = self._find(query)
+        if not found:
+            return None
+        return self.docs.pop(found[0]["_id"])
+
+    def update_one(self, query, update, upsert=False):
+        self.writes += 1
+        found = self._find(query)
+        if found:
+            _apply(found[0], update)
+            return Result(1)
+        if upsert:
+            doc = {key: value for key, value in query.items() if not key.startswith("$")}
+            _apply(doc, update)
+            self.docs[doc["_id"]] = doc
+        return Result(0)
+
+    def replace_one(self, query, doc):
+        self.writes += 1
+        found = self._find(query)
+        if found:
+            self.docs[found[0]["_id"]] = dict(copy.deepcopy(doc), _id=found[0]["_id"])
+
+    def bulk_write(self, requests, ordered=True):
+        self.writes += 1
+        for request in requests:
+            found = self._find(request._filter)
+            if isinstance(request, DeleteOne):
+                for doc in found[:1]:
+                    del self.docs[doc["_id"]]
+                continue
+            assert isinstance(request, UpdateOne)
+            if found:
+                _apply(found[0], request._doc)
+            elif request._upsert:
+                doc = dict(request._filter)
+                _apply(doc, request._doc)
+                self.docs[doc["_id"]] = doc
+
+    def delete_one(self, query):
+        self.writes += 1
+        for doc in self._find(query)[:1]:
+            del self.docs[doc["_id"]]
+
+    def delete_many(self, query):
+        self.writes += 1
+        for doc in self._find(query):
+            del self.docs[doc["_id"]]
+
+    def aggregate(self, pipeline):
+        """$match, then $group by one field counting the documents ({"$sum": 1})"""
+        docs = self.find()
+        for stage in pipeline:
+            if "$match" in stage:
+                docs = [doc for doc in docs if _matches(doc, stage["$match"])]
+            elif "$group" in stage:
+                group = dict(stage["$group"])
+                key = group.pop("_id")[1:]
+                (field, _), = group.items()
+                counts = {}
+                for doc in docs:
+                    counts[doc.get(key)] = counts.get(doc.get(key), 0) + 1
+                docs = [{"_id": value, field: count} for value, count in counts.items()]
+        return iter(docs)
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+
+class Database(dict):
+    def __missing__(self, name):
+        self[name] = Collection()
+        return self[name]
+
+
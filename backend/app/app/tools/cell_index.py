@@ -0,0 +1,100 @@
+import itertools
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.tools import radio
+
+METRES_PER_DEGREE = 111320.0
+MIN_BIN_SIZE = 50.0  # in metres
+
+# Every index gets a new version, so results derived from a cell topology can
+# tell whether they are still up to date
+_versions = itertools.count(1)
+
+
+class CellIndex:
+    """Uniform lat/lon grid over the coverage circles of a set of cells.
+
+    Every cell is registered in each grid bin its coverage circle overlaps, so
+    "which cells cover this point" only looks at the cells of a single bin
+    instead of every cell of the owner. The candidates of each bin are kept
+    in a padded table so that a whole batch of points is resolved with NumPy.
+    """
+
+    def __init__(self, cells: List[dict], bin_size: float = None):
+        self.version = next(_versions)
+        self.cells = cells
+        self.arrays = radio.cell_arrays(cells)
+
+        if bin_size is None:
+            median_radius = float(np.median(self.arrays.radius)) if cells else 0.0
+            bin_size = max(median_radius, MIN_BIN_SIZE)
+        self.bin_size = bin_size
+        self._step = bin_size / METRES_PER_DEGREE
+
+        bins = {}
+        for position, (lat, lon, radius) in enumerate(
+            zip(self.arrays.latitude, self.arrays.longitude, self.arrays.radius)
+        ):
+            dlat = radius / METRES_PER_DEGREE
+            dlon = radius / (METRES_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+            for row in range(self._floor(lat - dlat), self._floor(lat + dlat) + 1):
+                for col in range(self._floor(lon - dlon), self._floor(lon + dlon) + 1):
+                    bins.setdefault((row, col), []).append(position)
+
+        # Slot 0 is the empty bin, used for points that no cell covers
+        width = max((len(members) for members in bins.values()), default=1)
+        self._slots = {}
+        self._candidates = np.full((len(bins) + 1, width), -1, dtype=np.int64)
+        for slot, (key, members) in enumerate(bins.items(), start=1):
+            self._slots[key] = slot
+            self._candidates[slot, : len(members)] = members
+
+    def _floor(self, degrees: float) -> int:
+        return math.floor(degrees / self._step)
+
+    def serving(self, lats, lons) -> np.ndarray:
+        """Index (in self.cells) of the closest covering cell for every point, -1 if none"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        rows = np.floor(lats / self._step).astype(np.int64).tolist()
+        cols = np.floor(lons / self._step).astype(np.int64).tolist()
+        slots = np.fromiter(
+            (self._slots.get(key, 0) for key in zip(rows, cols)),
+            dtype=np.int64,
+            count=len(rows),
+        )
+
+        candidates = self._candidates[slots]
+        valid = candidates >= 0
+        if not self.cells or not valid.any():
+            return np.full(len(rows), -1, dtype=np.int64)
+
+        safe = np.where(valid, candidates, 0)
+        distances = radio.haversine(
+            lats[:, np.newaxis],
+            lons[:, np.newaxis],
+            self.arrays.latitude[safe],
+            self.arrays.longitude[safe],
+        )
+        distances = np.where(
+            valid & (distances <= self.arrays.radius[safe]), distances, np.inf
+        )
+
+        best = np.argmin(distances, axis=1)
+        picked = np.arange(len(best))
+        serving = safe[picked, best]
+        serving[np.isinf(distances[picked, best])] = -1
+        return serving
+
+    def serving_rsrp(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Serving cell of every point (as serving()) and its RSRP, NaN when out of coverage"""
+        serving = self.serving(lats, lons)
+        return serving, radio.serving_rsrp(lats, lons, self.arrays, serving)
+
+    def serving_cell(self, lat: float, lon: float) -> Optional[dict]:
+        position = int(self.serving([lat], [lon])[0])
+        return self.cells[position] if position >= 0 else None
@@ -2,7 +2,7 @@ import logging
 import time
 from app.crud import crud_mongo
 
-def check_expiration_time(expire_time):
+def check_expiration_time(expire_time, now=None):
     year = int(expire_time[0:4])
     month = int(expire_time[5:7])
     day = int(expire_time[8:10])
@@ -10,7 +10,8 @@ def check_expiration_time(expire_time):
     minute = int(expire_time[14:16])
     sec = int(expire_time[17:19])
 
-    time_now = time.localtime()
+    # now: struct_time of a simulation clock, defaults to the local time
+    time_now = time.localtime() if now is None else now
     # print(time.asctime(time_now))
     
     if year>time_now[0]: 
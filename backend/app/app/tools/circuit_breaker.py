@@ -0,0 +1,138 @@
+import threading
+import time
+
+import requests
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Not sent: the destination failed too often, its circuit is open"""
+
+    def __init__(self, *args, retry_after: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Seconds until the circuit lets a callback through again
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Health of one callback destination: circuit breaker and adaptive read timeout.
+
+    After ``failures`` failed callbacks in a row the circuit opens and the
+    callbacks to the destination fail at once, without waiting on the
+    network, for ``cooldown`` seconds. Then a single callback is let through
+    (half open): the circuit closes if it succeeds and opens again if not.
+
+    The read timeout follows the response times of the destination, as the
+    retransmission timeout of TCP: smoothed latency plus 4 times its mean
+    deviation, between ``min_timeout`` and ``max_timeout``. Until
+    ``warmup`` responses were timed, and after a timeout (doubled every time),
+    it is longer, so a destination that slows down is not cut off at once.
+    """
+
+    def __init__(
+        self,
+        failures: int = 5,
+        cooldown: float = 30.0,
+        min_timeout: float = 1.0,
+        max_timeout: float = 27.0,
+        warmup: int = 5,
+    ):
+        self.failure_threshold = failures
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.warmup = warmup
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._opened_at = None
+        self._probing = False
+        self.consecutive_failures = 0
+        self._srtt = None  # smoothed latency
+        self._rttvar = None  # its mean deviation
+        self._backoff = 1
+        self.samples = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0  # failed fast while open
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """Whether a callback can be sent now, False to fail it fast"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    return False
+                self._probing = True
+            return True
+
+    def retry_after(self) -> float:
+        """Seconds until a callback is let through again, 0 when the circuit is not open"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def timeout(self) -> float:
+        with self._lock:
+            if self.samples < self.warmup:
+                return self.max_timeout
+            timeout = (self._srtt + 4 * self._rttvar) * self._backoff
+            return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def success(self, latency: float):
+        with self._lock:
+            if self._srtt is None:
+                self._srtt, self._rttvar = latency, latency / 2
+            else:
+                self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - latency)
+                self._srtt = 0.875 * self._srtt + 0.125 * latency
+            self.samples += 1
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._backoff = 1
+            self.state = CLOSED
+            self._probing = False
+
+    def failure(self, timed_out: bool = False):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if timed_out:
+                self._backoff = min(self._backoff * 2, 64)
+            if (
+                self.state == HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+            ):
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            state = self.state
+            srtt = self._srtt
+            counters = {
+                "consecutive_failures": self.consecutive_failures,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+            }
+        return dict(
+            counters,
+            state=state,
+            latency_ms=None if srtt is None else 1000 * srtt,
+            timeout_s=self.timeout(),
+        )
@@ -0,0 +1,56 @@
+import threading
+import time
+from time import struct_time
+
+
+class WallClock:
+    """Real time, used when nothing is being simulated"""
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.perf_counter()
+
+    def localtime(self) -> struct_time:
+        return time.localtime()
+
+
+class SimulationClock:
+    """Virtual time of a single simulation run.
+
+    Every movement step of the run advances the clock by ``step`` simulated
+    seconds, no matter how long the step took on the wall clock. The
+    ``speedup`` factor only decides how often the steps are taken: 1 is real
+    time, 10 runs ten steps per wall second and 0 runs the steps back to back
+    (as fast as possible). Timers and expiry checks of the run read this clock,
+    so the emulated scenario behaves the same at any speed.
+    """
+
+    def __init__(self, speedup: float = 1.0, step: float = 1.0, start: float = None):
+        self.speedup = speedup
+        self.step = step
+        self._start = time.time() if start is None else start
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def interval(self) -> float:
+        """Wall seconds between two steps, 0 when running as fast as possible"""
+        return self.step / self.speedup if self.speedup > 0 else 0.0
+
+    def advance(self):
+        with self._lock:
+            self._elapsed += self.step
+
+    def time(self) -> float:
+        return self._start + self._elapsed
+
+    def monotonic(self) -> float:
+        return self._elapsed
+
+    def localtime(self) -> struct_time:
+        return time.localtime(self.time())
+
+
+wall_clock = WallClock()
@@ -1,4 +1,5 @@
 import math
+from app.tools import radio
 
 def distance(lat1, lon1, lat2, lon2): #Haversine formula: determines the great-circle distance between two points on a sphere given their longitudes and latitudes.
     R = 6371e3
@@ -15,20 +16,6 @@ def distance(lat1, lon1, lat2, lon2): #Haversine formula: determines the great-c
     return d
 
 def check_distance(UE_lat, UE_long, cells):
-    
-    # logging.info(f"Current cell {current_cell}") 
-    current_cell = None      
-    current_cell_dist = float("inf")
-    distances = {}
-    for cell in cells:
-        dist = distance(UE_lat, UE_long, cell.get("latitude"), cell.get("longitude"))
-        distances[f"{cell.get('id')}"]= dist
-        #print(f"Distance = {dist} meters from Cell {cell.get('description')}") 
-        if (dist <= cell.get("radius")):
-            if (dist < current_cell_dist):
-                current_cell_dist = dist
-                current_cell = cell
-    return current_cell, distances
-        
-
-    
\ No newline at end of file
+    # Serving cell and distance to every cell, see radio.evaluate for the full report
+    report = radio.evaluate(UE_lat, UE_long, cells)
+    return report.cell, report.distances
@@ -1,9 +1,9 @@
-import requests, json
+from app.tools.notifications import dispatcher
 
-def location_callback(ue, callbackurl, subscription):
+def location_callback(ue, callbackurl, subscription, on_response=None, on_error=None, ref=None):
     url = callbackurl
 
-    payload = json.dumps({
+    report = {
     "externalId" : ue.get("external_identifier"),
     "ipv4Addr" : ue.get("ip_address_v4"),
     "subscription" : subscription,
@@ -14,62 +14,35 @@ def location_callback(ue, callbackurl, subscription):
         "lat": ue.get("latitude"),
         "lon": ue.get("longitude"),
     }
-    })
-    headers = {
-    'accept': 'application/json',
-    'Content-Type': 'application/json'
     }
+    #Queued, the notification dispatcher sends it (maybe with other reports to the same url),
+    #retries it if it fails (ref: SubscriptionRef) and hands the response (or error) to the handlers
+    return dispatcher.send_report(url, report, on_response, on_error, ref)
 
-    #Timeout values according to https://docs.python-requests.org/en/master/user/advanced/#timeouts 
-    #First value of the tuple "3.05" corresponds to connect and second "27" to read timeouts 
-    #(i.e., connect timeout means that the server is unreachable and read that the server is reachable but the client does not receive a response within 27 seconds)
-    
-    response = requests.request("POST", url, headers=headers, data=payload, timeout=(3.05, 27))
-    
-    return response
-
-def loss_of_connectivity_callback(ue, callbackurl, subscription):
+def loss_of_connectivity_callback(ue, callbackurl, subscription, on_response=None, on_error=None, ref=None):
     url = callbackurl
 
-    payload = json.dumps({
+    report = {
     "externalId" : ue.get("external_identifier"),
     "ipv4Addr" : ue.get("ip_address_v4"),
     "subscription" : subscription,
     "monitoringType": "LOSS_OF_CONNECTIVITY",
     "lossOfConnectReason": 7
-    })
-    headers = {
-    'accept': 'application/json',
-    'Content-Type': 'application/json'
     }
+    #Queued, the notification dispatcher sends it (maybe with other reports to the same url),
+    #retries it if it fails (ref: SubscriptionRef) and hands the response (or error) to the handlers
+    return dispatcher.send_report(url, report, on_response, on_error, ref)
 
-    #Timeout values according to https://docs.python-requests.org/en/master/user/advanced/#timeouts 
-    #First value of the tuple "3.05" corresponds to connect and second "27" to read timeouts 
-    #(i.e., connect timeout means that the server is unreachable and read that the server is reachable but the client does not receive a response within 27 seconds)
-    
-    response = requests.request("POST", url, headers=headers, data=payload, timeout=(3.05, 27))
-    
-    return response
-
-def ue_reachability_callback(ue, callbackurl, subscription, reachabilityType):
+def ue_reachability_callback(ue, callbackurl, subscription, reachabilityType, on_response=None, on_error=None, ref=None):
     url = callbackurl
 
-    payload = json.dumps({
+    report = {
     "externalId" : ue.get("external_identifier"),
     "ipv4Addr" : ue.get("ip_address_v4"),
     "subscription" : subscription,
     "monitoringType": "UE_REACHABILITY",
     "reachabilityType": reachabilityType
-    })
-    headers = {
-    'accept': 'application/json',
-    'Content-Type': 'application/json'
     }
-
-    #Timeout values according to https://docs.python-requests.org/en/master/user/advanced/#timeouts 
-    #First value of the tuple "3.05" corresponds to connect and second "27" to read timeouts 
-    #(i.e., connect timeout means that the server is unreachable and read that the server is reachable but the client does not receive a response within 27 seconds)
-    
-    response = requests.request("POST", url, headers=headers, data=payload, timeout=(3.05, 27))
-    
-    return response
\ No newline at end of file
+    #Queued, the notification dispatcher sends it (maybe with other reports to the same url),
+    #retries it if it fails (ref: SubscriptionRef) and hands the response (or error) to the handlers
+    return dispatcher.send_report(url, report, on_response, on_error, ref)
\ No newline at end of file
@@ -0,0 +1,406 @@
+import heapq
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+from app.db.session import client
+from app.tools.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.tools.retry_queue import RetryQueue
+
+HEADERS = {"accept": "application/json", "Content-Type": "application/json"}
+
+# Timeout values according to https://docs.python-requests.org/en/master/user/advanced/#timeouts
+# Connect timeout, the read timeout of each destination adapts to its latency (at most 27s)
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 27
+
+
+class SubscriptionRef(NamedTuple):
+    """The subscription a notification is sent for"""
+
+    collection: str
+    id: str
+    owner_id: Optional[int] = None
+
+
+def subscription_ref(collection: str, sub: dict) -> SubscriptionRef:
+    return SubscriptionRef(collection, str(sub.get("_id")), sub.get("owner_id"))
+
+
+class Notification(NamedTuple):
+    url: str
+    payload: str  # JSON body
+    on_response: Optional[Callable[[requests.Response], None]] = None
+    on_error: Optional[Callable[[requests.exceptions.RequestException], None]] = None
+    reports: int = 1  # monitoring event reports carried
+    # Notifications with subscriptions are retried when they fail (see RetryQueue)
+    subscriptions: Tuple[SubscriptionRef, ...] = ()
+
+
+class _Batch:
+    """Monitoring event reports of one subscription to one url, waiting for the end of the coalescing window"""
+
+    def __init__(self, url: str, subscription: Optional[str]):
+        self.url = url
+        self.subscription = subscription  # link of the subscription
+        self.reports = []
+        self.on_response = []
+        self.on_error = []
+        self.subscriptions = []
+
+    def add(
+        self,
+        report: dict,
+        on_response: Callable,
+        on_error: Callable,
+        subscription: Optional[SubscriptionRef],
+    ):
+        # The link is given once, for the whole notification
+        self.reports.append(
+            {key: value for key, value in report.items() if key != "subscription"}
+        )
+        if subscription is not None and subscription not in self.subscriptions:
+            self.subscriptions.append(subscription)
+        if on_response is not None:
+            self.on_response.append(on_response)
+        if on_error is not None:
+            self.on_error.append(on_error)
+
+    def notification(self) -> Notification:
+        # A MonitoringNotification of the subscription with the list of its monitoringEventReports
+        payload = json.dumps(
+            {"subscription": self.subscription, "monitoringEventReports": self.reports}
+        )
+        return Notification(
+            self.url,
+            payload,
+            self._fan_out(self.on_response),
+            self._fan_out(self.on_error),
+            len(self.reports),
+            tuple(self.subscriptions),
+        )
+
+    @staticmethod
+    def _fan_out(handlers: List[Callable]) -> Optional[Callable]:
+        if not handlers:
+            return None
+
+        def handle(value):
+            for handler in handlers:
+                NotificationDispatcher._handle(handler, value)
+
+        return handle
+
+
+class _Destination:
+    """Keep-alive connections to one NetApp (scheme + host + port)"""
+
+    def __init__(self, connections: int, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.active = 0  # notifications being sent
+        self.pending = deque()  # waiting for a free connection
+
+
+class NotificationDispatcher:
+    """Sends the callbacks to the NetApps off the simulation threads.
+
+    send() only queues the notification and returns; ``workers`` threads POST
+    them. Every destination has its own requests session, so connections are
+    kept alive between notifications, and at most ``connections`` of its
+    notifications are sent at the same time: a slow NetApp holds at most that
+    many workers, the others keep serving the rest. The outcome is handed to
+    the optional on_response / on_error callbacks, on a worker thread. When
+    ``queue_size`` notifications are already waiting, new ones are dropped
+    instead of blocking the caller.
+
+    With a ``coalesce_window`` (seconds), the monitoring event reports of a
+    subscription sent with send_report() to the same url within the window
+    are sent together, as one notification with the link of the
+    subscription and the list of its ``monitoringEventReports`` (at most
+    ``max_reports``). Without it, every report is a notification of its own,
+    as before.
+
+    Every destination has a circuit breaker: once it failed too often, its
+    notifications fail at once (and are retried later) instead of holding the
+    workers for the whole timeout, and the read timeout follows its latency.
+
+    A notification sent for subscriptions that fails is handed to the
+    ``retry_queue`` instead of its on_error handler, which is only called if
+    the retries are given up.
+    """
+
+    def __init__(
+        self,
+        workers: int = 16,
+        connections: int = 4,
+        queue_size: int = 10000,
+        coalesce_window: float = 0.0,
+        max_reports: int = 500,
+        retry_queue: RetryQueue = None,
+        breaker_failures: int = 5,
+        breaker_cooldown: float = 30.0,
+    ):
+        self.workers = workers
+        self.connections = connections
+        self.queue_size = queue_size
+        self.coalesce_window = coalesce_window
+        self.max_reports = max_reports
+        self.retry_queue = retry_queue
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self._batches = {}  # (url, subscription link) -> _Batch being filled
+        self._deadlines = []  # heap of (end of the window, sequence, _Batch)
+        self._sequence = 0
+        self._batch_cond = threading.Condition()
+        self._flusher = None
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._destinations = {}
+        self._threads = []
+        self._outstanding = 0  # queued, pending or being sent
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0  # failed fast, circuit open
+        self.dropped = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"notifications-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._flusher = threading.Thread(
+                target=self._flush_batches, name="notifications-batches", daemon=True
+            )
+            self._flusher.start()
+
+    def _reserve(self, url: str) -> bool:
+        with self._lock:
+            if self._outstanding >= self.queue_size:
+                self.dropped += 1
+                logging.warning(f"Notification queue full, dropped a callback to {url}")
+                return False
+            self._outstanding += 1
+        return True
+
+    def send(
+        self,
+        url: str,
+        payload: str,
+        on_response: Callable = None,
+        on_error: Callable = None,
+        subscription: SubscriptionRef = None,
+    ) -> bool:
+        """Queue a notification, False when it was dropped"""
+        if not self._reserve(url):
+            return False
+        self.start()
+        subscriptions = (subscription,) if subscription is not None else ()
+        self._queue.put(
+            Notification(url, payload, on_response, on_error, 1, subscriptions)
+        )
+        return True
+
+    def send_report(
+        self,
+        url: str,
+        report: dict,
+        on_response: Callable = None,
+        on_error: Callable = None,
+        subscription: SubscriptionRef = None,
+    ) -> bool:
+        """Queue a monitoring event report, coalesced with the others of its subscription if enabled"""
+        if self.coalesce_window <= 0:
+            return self.send(
+                url, json.dumps(report), on_response, on_error, subscription
+            )
+        if not self._reserve(url):
+            return False
+        self.start()
+        full = None
+        key = (url, report.get("subscription"))
+        with self._batch_cond:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = _Batch(*key)
+                self._sequence += 1
+                heapq.heappush(
+                    self._deadlines,
+                    (time.monotonic() + self.coalesce_window, self._sequence, batch),
+                )
+                self._batch_cond.notify()
+            batch.add(report, on_response, on_error, subscription)
+            if len(batch.reports) >= self.max_reports:
+                # Sent now, its deadline is ignored by the flusher
+                full = self._batches.pop(key)
+        if full is not None:
+            self._queue.put(full.notification())
+        return True
+
+    def _flush_batches(self):
+        while True:
+            with self._batch_cond:
+                while not self._deadlines:
+                    self._batch_cond.wait()
+                deadline, _, batch = self._deadlines[0]
+                now = time.monotonic()
+                if deadline > now:
+                    self._batch_cond.wait(deadline - now)
+                    continue
+                heapq.heappop(self._deadlines)
+                key = (batch.url, batch.subscription)
+                if self._batches.get(key) is not batch:
+                    continue
+                del self._batches[key]
+            self._queue.put(batch.notification())
+
+    def _destination(self, url: str) -> _Destination:
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        destination = self._destinations.get(key)
+        if destination is None:
+            breaker = CircuitBreaker(
+                failures=self.breaker_failures,
+                cooldown=self.breaker_cooldown,
+                max_timeout=READ_TIMEOUT,
+            )
+            destination = self._destinations[key] = _Destination(
+                self.connections, breaker
+            )
+        return destination
+
+    def _run(self):
+        while True:
+            notification = self._queue.get()
+            with self._lock:
+                destination = self._destination(notification.url)
+                if destination.active >= self.connections:
+                    # Sent by one of the workers already busy with this destination
+                    destination.pending.append(notification)
+                    continue
+                destination.active += 1
+
+            while notification is not None:
+                self._deliver(destination, notification)
+                with self._lock:
+                    if destination.pending:
+                        notification = destination.pending.popleft()
+                    else:
+                        notification = None
+                        destination.active -= 1
+
+    def _post(self, destination: _Destination, notification: Notification):
+        breaker = destination.breaker
+        if not breaker.allow():
+            raise CircuitOpenError(
+                f"Circuit open for {notification.url}",
+                retry_after=breaker.retry_after(),
+            )
+        start = time.monotonic()
+        try:
+            response = destination.session.post(
+                notification.url,
+                headers=HEADERS,
+                data=notification.payload,
+                timeout=(CONNECT_TIMEOUT, breaker.timeout()),
+            )
+        except requests.exceptions.RequestException as ex:
+            breaker.failure(timed_out=isinstance(ex, requests.exceptions.ReadTimeout))
+            raise
+        # A NetApp answering with server errors is not healthy either, and the
+        # notification was not delivered: it fails (and is retried) as if the
+        # NetApp could not be reached
+        if response.status_code >= 500:
+            breaker.failure()
+            raise requests.exceptions.HTTPError(
+                f"{response.status_code} Server Error for {notification.url}",
+                response=response,
+            )
+        breaker.success(time.monotonic() - start)
+        return response
+
+    def _deliver(self, destination: _Destination, notification: Notification):
+        try:
+            response = self._post(destination, notification)
+        except requests.exceptions.RequestException as ex:
+            with self._lock:
+                if isinstance(ex, CircuitOpenError):
+                    self.rejected += 1
+                else:
+                    self.failed += 1
+            if notification.subscriptions and self.retry_queue is not None:
+                self._handle(lambda ex: self.retry_queue.push(notification, ex), ex)
+            elif notification.on_error is None:
+                logging.warning("Failed to send the callback request")
+                logging.warning(ex)
+            else:
+                self._handle(notification.on_error, ex)
+        else:
+            with self._lock:
+                self.sent += 1
+            if notification.subscriptions and self.retry_queue is not None:
+                self.retry_queue.delivered(notification.subscriptions)
+            if notification.on_response is not None:
+                self._handle(notification.on_response, response)
+        finally:
+            with self._lock:
+                self._outstanding -= notification.reports
+
+    @staticmethod
+    def _handle(handler: Callable, value):
+        try:
+            handler(value)
+        except Exception as ex:
+            logging.warning(ex)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            counters = {
+                "queued": self._outstanding,
+                "sent": self.sent,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+            }
+            destinations = dict(self._destinations)
+        return dict(
+            counters,
+            destinations={
+                key: destination.breaker.as_dict()
+                for key, destination in destinations.items()
+            },
+        )
+
+
+dispatcher = NotificationDispatcher(
+    workers=settings.NOTIFICATION_WORKERS,
+    connections=settings.NOTIFICATION_CONNECTIONS_PER_DESTINATION,
+    queue_size=settings.NOTIFICATION_QUEUE_SIZE,
+    coalesce_window=settings.NOTIFICATION_COALESCE_WINDOW,
+    breaker_failures=settings.CALLBACK_BREAKER_FAILURES,
+    breaker_cooldown=settings.CALLBACK_BREAKER_COOLDOWN,
+)
+dispatcher.retry_queue = RetryQueue(
+    client.fastapi,
+    dispatcher,
+    budget=settings.CALLBACK_RETRY_BUDGET,
+    base_delay=settings.CALLBACK_RETRY_BASE_DELAY,
+    max_delay=settings.CALLBACK_RETRY_MAX_DELAY,
+)
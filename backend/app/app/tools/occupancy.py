@@ -0,0 +1,294 @@
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+
+class CellOccupancy:
+    """Number of UEs served by every cell, moving or not.
+
+    The QoS status of a GBR subscription depends on how many UEs share the
+    serving cell. Instead of scanning the moving UEs and querying the
+    stationary ones on every report, the serving cell of every UE is loaded
+    once from the database and then followed incrementally: the movement
+    loops call attach() on every handover / loss / regain of coverage and the
+    UE endpoints when a UE is created or deleted (an update does not change
+    its cell).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._cells = {}  # supi -> Cell primary key (None when out of coverage)
+        self._counts = Counter()  # Cell primary key -> number of UEs
+
+    def load(self, db: Session):
+        rows = db.query(models.UE.supi, models.UE.Cell_id).all()
+        with self._lock:
+            self._cells = {supi: cell_id for supi, cell_id in rows}
+            self._counts = Counter(
+                cell_id for cell_id in self._cells.values() if cell_id is not None
+            )
+            self._loaded = True
+
+    def invalidate(self):
+        """Reload from the database on the next read, after bulk changes of the UEs"""
+        with self._lock:
+            self._loaded = False
+
+    def _ensure_loaded(self, db: Optional[Session]):
+        if self._loaded:
+            return
+        if db is not None:
+            self.load(db)
+            return
+        db = SessionLocal()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    def attach(self, supi: str, cell_id: Optional[int]):
+        """Serve the UE from a cell (None when it is out of coverage), detaching it from the previous one"""
+        self._ensure_loaded(None)
+        with self._lock:
+            previous = self._cells.get(supi)
+            if supi in self._cells and previous == cell_id:
+                return
+            if previous is not None:
+                self._counts[previous] -= 1
+                if self._counts[previous] <= 0:
+                    del self._counts[previous]
+            self._cells[supi] = cell_id
+            if cell_id is not None:
+                self._counts[cell_id] += 1
+
+    def detach(self, supi: str):
+        """Forget a deleted UE"""
+        self.attach(supi, None)
+        with self._lock:
+            self._cells.pop(supi, None)
+
+    def count(self, cell_id: Optional[int], db: Session = None) -> int:
+        if cell_id is None:
+            return 0
+        self._ensure_loaded(db)
+        return self._counts.get(cell_id, 0)
+
+    def counts(self, db: Session = None) -> Dict[int, int]:
+        self._ensure_loaded(db)
+        with self._lock:
+            return dict(self._counts)
+
+
+# Change of a deleted UE, not written yet
+_DETACHED = object()
+
+
+class SharedCellOccupancy:
+    """CellOccupancy shared by all the workers through Mongo.
+
+    The serving cell of every UE is kept in the UECell collection and the
+    number of UEs of every cell is counted from it, with one aggregation.
+    attach() and detach() only record the change; a background thread writes
+    the changes every ``flush_interval`` seconds with one bulk write (the last
+    cell of every UE that changed, whichever worker moved it before) and
+    reads the counts back. They are then served from memory: the changes of
+    this worker are counted at once, those of the other workers at most
+    ``flush_interval`` seconds late.
+
+    invalidate() bumps a generation in the CellOccupancy collection: every
+    worker sees it on its next flush and loads the UEs from the database
+    again, forgetting the cells it attached them to.
+    """
+
+    def __init__(self, db: Database, flush_interval: float = 0.5):
+        self._ue_cells = db["UECell"]
+        self._meta = db["CellOccupancy"]
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._loaded = False
+        self._generation = None  # the one the cells were loaded for
+        self._changes = {}  # supi -> cell not written yet (_DETACHED when deleted)
+        self._cells = {}  # supi -> last cell this worker attached it to
+        self._counts = Counter()
+        self._unflushed = Counter()  # changes of this worker, not counted in Mongo yet
+        self._thread = None
+
+    def _current_generation(self) -> int:
+        doc = self._meta.find_one({"_id": "generation"})
+        return doc.get("value", 0) if doc else 0
+
+    def load(self, db: Session):
+        """Add the UEs of the database that no worker added yet"""
+        generation = self._current_generation()
+        rows = db.query(models.UE.supi, models.UE.Cell_id).all()
+        docs = [{"_id": supi, "cell": cell_id} for supi, cell_id in rows]
+        if docs:
+            try:
+                self._ue_cells.insert_many(docs, ordered=False)
+            except BulkWriteError:
+                # Already added (by another worker or a previous run)
+                pass
+        with self._lock:
+            # Local estimate until the next flush reads the cells of the other workers
+            self._cells = {supi: cell_id for supi, cell_id in rows}
+            self._generation = generation
+            self._loaded = True
+        self._refresh()
+
+    def invalidate(self):
+        """Count again from the database, in every worker, after bulk changes of the UEs"""
+        with self._flush_lock:
+            self._meta.update_one(
+                {"_id": "generation"}, {"$inc": {"value": 1}}, upsert=True
+            )
+            self._ue_cells.delete_many({})
+            self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self._loaded = False
+            self._changes.clear()
+            self._cells.clear()
+            self._counts = Counter()
+            self._unflushed = Counter()
+
+    def _ensure_loaded(self, db: Optional[Session]):
+        if self._loaded:
+            return
+        if db is not None:
+            self.load(db)
+        else:
+            db = SessionLocal()
+            try:
+                self.load(db)
+            finally:
+                db.close()
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="cell-occupancy", daemon=True
+            )
+            self._thread.start()
+
+    def _move(self, previous: Optional[int], cell_id: Optional[int]):
+        for cell, change in ((previous, -1), (cell_id, 1)):
+            if cell is not None:
+                self._counts[cell] += change
+                self._unflushed[cell] += change
+
+    def attach(self, supi: str, cell_id: Optional[int]):
+        """Serve the UE from a cell (None when it is out of coverage), detaching it from the previous one"""
+        self._ensure_loaded(None)
+        with self._lock:
+            known = supi in self._cells
+            previous = self._cells.get(supi)
+            if known and previous == cell_id:
+                return
+            self._cells[supi] = cell_id
+            self._changes[supi] = cell_id
+            if known:
+                self._move(previous, cell_id)
+
+    def detach(self, supi: str):
+        """Forget a deleted UE"""
+        self._ensure_loaded(None)
+        with self._lock:
+            self._move(self._cells.pop(supi, None), None)
+            self._changes[supi] = _DETACHED
+
+    def count(self, cell_id: Optional[int], db: Session = None) -> int:
+        if cell_id is None:
+            return 0
+        self._ensure_loaded(db)
+        with self._lock:
+            return max(self._counts.get(cell_id, 0), 0)
+
+    def counts(self, db: Session = None) -> Dict[int, int]:
+        self._ensure_loaded(db)
+        with self._lock:
+            return {cell: count for cell, count in self._counts.items() if count > 0}
+
+    def _refresh(self):
+        counts = Counter(
+            {
+                doc["_id"]: doc["ues"]
+                for doc in self._ue_cells.aggregate(
+                    [
+                        {"$match": {"cell": {"$ne": None}}},
+                        {"$group": {"_id": "$cell", "ues": {"$sum": 1}}},
+                    ]
+                )
+            }
+        )
+        with self._lock:
+            counts.update(self._unflushed)
+            self._counts = counts
+
+    def flush(self):
+        """Write the changes of this worker and read back the counts of every worker"""
+        with self._flush_lock:
+            if self._current_generation() != self._generation:
+                # Invalidated by another worker, loaded again on the next use
+                self._reset()
+            with self._lock:
+                if not self._loaded:
+                    return
+                changes, self._changes = self._changes, {}
+                unflushed, self._unflushed = self._unflushed, Counter()
+            ops = [
+                DeleteOne({"_id": supi})
+                if cell_id is _DETACHED
+                else UpdateOne({"_id": supi}, {"$set": {"cell": cell_id}}, upsert=True)
+                for supi, cell_id in changes.items()
+            ]
+            try:
+                if ops:
+                    self._ue_cells.bulk_write(ops, ordered=False)
+            except Exception:
+                # Written on the next flush, unless the UE changed again since
+                with self._lock:
+                    for supi, cell_id in changes.items():
+                        self._changes.setdefault(supi, cell_id)
+                    self._unflushed.update(unflushed)
+                raise
+            self._refresh()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as ex:
+                logging.warning("Failed to share the cell occupancy")
+                logging.warning(ex)
+
+
+def create_cell_occupancy(backend: str):
+    if backend == "mongo":
+        from app.db.session import client
+
+        return SharedCellOccupancy(
+            client.fastapi, flush_interval=settings.UE_STATE_FLUSH_INTERVAL
+        )
+    return CellOccupancy()
+
+
+# Shared by all the workers with the "mongo" UE_STATE_BACKEND
+cell_occupancy = create_cell_occupancy(settings.UE_STATE_BACKEND)
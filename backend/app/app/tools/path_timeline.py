@@ -0,0 +1,232 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.tools import radio
+from app.tools.cell_index import CellIndex
+from app.tools.topology import get_topology
+
+
+class PathTimeline(NamedTuple):
+    """Serving cell and its RSRP at every point of a path, for one cell topology.
+
+    Cells cannot be edited while UEs are moving, so for a given path and cell
+    index the radio state of each point is fixed: a moving UE only has to look
+    up its current point index instead of evaluating the cells again (see
+    locate_all()).
+    """
+
+    path_id: int
+    owner_id: int
+    version: int  # version of the cell index the timeline was computed with
+    cells: List[dict]  # the cells of that index, serving refers to this list
+    points: List[dict]
+    serving: np.ndarray  # index in cells, -1 when the point is out of coverage
+    rsrp: np.ndarray  # RSRP of the serving cell, NaN when out of coverage
+    distance: np.ndarray  # metres along the path from the first point to each point
+
+    @property
+    def length(self) -> float:
+        return float(self.distance[-1]) if len(self.distance) else 0.0
+
+    def locate(self, distance: float) -> Tuple[float, float, int, float]:
+        """Position at a distance along the path, looping back to the start after the last point.
+
+        Returns the coordinates, the index of the point just before the
+        position and how far (0 to 1) the position is towards the next point.
+        """
+        if self.length <= 0:
+            point = self.points[0]
+            return point["latitude"], point["longitude"], 0, 0.0
+
+        distance = distance % self.length
+        index = int(np.searchsorted(self.distance, distance, side="right")) - 1
+        start = self.points[index]
+        if index == len(self.points) - 1:
+            return start["latitude"], start["longitude"], index, 0.0
+
+        end = self.points[index + 1]
+        segment = self.distance[index + 1] - self.distance[index]
+        fraction = (
+            float((distance - self.distance[index]) / segment) if segment else 0.0
+        )
+        return (
+            start["latitude"] + (end["latitude"] - start["latitude"]) * fraction,
+            start["longitude"] + (end["longitude"] - start["longitude"]) * fraction,
+            index,
+            fraction,
+        )
+
+    def serving_at(self, index: int, fraction: float) -> Optional[int]:
+        """Serving cell (index in cells) at a position returned by locate().
+
+        Between two points served by the same cell the UE is served by it too.
+        None when they are not (a cell boundary is crossed between them, or
+        they are out of coverage): the position has to be resolved with the
+        cell index.
+        """
+        serving = int(self.serving[index])
+        if fraction <= 0 or index + 1 >= len(self.points):
+            return serving
+        if serving < 0 or self.serving[index + 1] != serving:
+            return None
+        return serving
+
+    def resume(self, latitude: float, longitude: float, index: int = None) -> float:
+        """Distance along the path of a stored position.
+
+        ``index`` is the point the UE was at (or had just passed) when it
+        stopped, the position is then found in constant time. When it is
+        missing or does not match the coordinates, the nearest point of the
+        path is used.
+        """
+        if index is not None and 0 <= index < len(self.points):
+            point = self.points[index]
+            offset = float(
+                radio.haversine(
+                    point["latitude"], point["longitude"], latitude, longitude
+                )
+            )
+            if index + 1 < len(self.points):
+                segment = self.distance[index + 1] - self.distance[index]
+            else:
+                segment = 0.0
+            # 1m of tolerance for the rounding of the stored coordinates
+            if offset <= segment + 1.0:
+                return float(self.distance[index]) + min(offset, segment)
+
+        if not self.points or latitude is None or longitude is None:
+            return 0.0
+        lats = np.fromiter((point["latitude"] for point in self.points), np.float64)
+        lons = np.fromiter((point["longitude"] for point in self.points), np.float64)
+        nearest = int(np.argmin(radio.haversine(lats, lons, latitude, longitude)))
+        return float(self.distance[nearest])
+
+
+def build_timeline(
+    path_id: int, owner_id: int, points: List[dict], index: CellIndex
+) -> PathTimeline:
+    lats = np.array([point.get("latitude") for point in points], dtype=np.float64)
+    lons = np.array([point.get("longitude") for point in points], dtype=np.float64)
+
+    serving, rsrp = index.serving_rsrp(lats, lons)
+    serving = serving.astype(np.int32)
+    rsrp = rsrp.astype(np.float32)
+
+    distance = np.zeros(len(points), dtype=np.float64)
+    if len(points) > 1:
+        np.cumsum(
+            radio.haversine(lats[:-1], lons[:-1], lats[1:], lons[1:]),
+            out=distance[1:],
+        )
+
+    return PathTimeline(
+        path_id, owner_id, index.version, index.cells, points, serving, rsrp, distance
+    )
+
+
+def locate_all(
+    index: CellIndex, timelines: List[PathTimeline], distances: Iterable[float]
+) -> List[Tuple[tuple, int, float]]:
+    """Position, serving cell (index in index.cells) and its RSRP of UEs moving on paths.
+
+    The serving cell is read from the timelines, only the UEs between two
+    points that are not served by the same cell (or on a timeline of another
+    cell index) are resolved with the cell index. The RSRP is read from the
+    timeline on a point; between points it is evaluated for the serving cell
+    only (interpolating it is off by tens of dB next to a cell site). Both
+    are done in one batch for all the UEs.
+    """
+    located = []
+    misses = []
+    between = []
+    for row, (timeline, distance) in enumerate(zip(timelines, distances)):
+        position = timeline.locate(distance)
+        serving = None
+        if timeline.version == index.version:
+            serving = timeline.serving_at(position[2], position[3])
+        rsrp = float("nan")
+        if serving is None:
+            misses.append(row)
+            serving = -1
+        elif serving >= 0 and position[3] > 0:
+            between.append(row)
+        else:
+            rsrp = float(timeline.rsrp[position[2]])
+        located.append([position, serving, rsrp])
+
+    if misses:
+        serving = index.serving(
+            [located[row][0][0] for row in misses],
+            [located[row][0][1] for row in misses],
+        )
+        for row, cell in zip(misses, serving):
+            located[row][1] = int(cell)
+        between += misses
+
+    if between:
+        rsrp = radio.serving_rsrp(
+            [located[row][0][0] for row in between],
+            [located[row][0][1] for row in between],
+            index.arrays,
+            [located[row][1] for row in between],
+        )
+        for row, value in zip(between, rsrp):
+            located[row][2] = float(value)
+    return [tuple(fix) for fix in located]
+
+
+# Dictionary holding the latest timeline of each path, shared by all the UEs on it
+timelines = {}
+
+
+def get_timeline(db: Session, path_id: int, owner_id: int) -> PathTimeline:
+    """Timeline of the path for the current cell index of the owner, computed on a miss"""
+    index = get_topology(db, owner_id).index
+    timeline = timelines.get(path_id)
+    if timeline is not None and timeline.version == index.version:
+        return timeline
+
+    if timeline is not None:
+        # The cells changed, the points of the path did not
+        points = timeline.points
+    else:
+        points = jsonable_encoder(crud.points.get_points(db=db, path_id=path_id))
+
+    timeline = build_timeline(path_id, owner_id, points, index)
+    timelines[path_id] = timeline
+    return timeline
+
+
+def get_timelines(
+    db: Session, path_ids: Iterable[int], owner_id: int
+) -> Dict[int, PathTimeline]:
+    """Timelines of many paths, the points of the missing ones are loaded with a single query"""
+    path_ids = set(path_ids)
+    missing = [path_id for path_id in path_ids if path_id not in timelines]
+    if missing:
+        index = get_topology(db, owner_id).index
+        points = {path_id: [] for path_id in missing}
+        for point in jsonable_encoder(
+            crud.points.get_points_by_paths(db=db, path_ids=missing)
+        ):
+            points[point.get("path_id")].append(point)
+        for path_id in missing:
+            timelines[path_id] = build_timeline(
+                path_id, owner_id, points[path_id], index
+            )
+    return {path_id: get_timeline(db, path_id, owner_id) for path_id in path_ids}
+
+
+def invalidate_timeline(path_id: int):
+    timelines.pop(path_id, None)
+
+
+def refresh_timelines(db: Session, owner_id: int):
+    """Recompute the cached timelines of the owner after a change of its cells"""
+    for timeline in list(timelines.values()):
+        if timeline.owner_id == owner_id:
+            get_timeline(db, timeline.path_id, owner_id)
@@ -0,0 +1,172 @@
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+EARTH_RADIUS = 6371e3  # in metres
+DEFAULT_FC = 2.6475  # carrier frequency in GHz
+DEFAULT_POWER = 30  # transmit power in dBm
+
+
+class CellArrays(NamedTuple):
+    """Column view of a list of cells (one entry per cell, same order as the list)"""
+
+    ids: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+    radius: np.ndarray
+    frequency: np.ndarray  # carrier frequency in GHz
+    power: np.ndarray  # transmit power in dBm
+
+
+class RadioReading(NamedTuple):
+    """Radio state of one UE against every cell of a CellArrays"""
+
+    cells: CellArrays
+    distances: np.ndarray
+    path_losses: np.ndarray
+    rsrps: np.ndarray
+    serving: int  # index in cells, -1 when the UE is out of coverage
+
+    def as_dict(self, values: np.ndarray) -> dict:
+        return {
+            f"{cell_id}": float(value) for cell_id, value in zip(self.cells.ids, values)
+        }
+
+    def as_json(self) -> dict:
+        """The readings keyed by cell id, as served by the test API"""
+        return {
+            "distances": self.as_dict(self.distances),
+            "path_losses": self.as_dict(self.path_losses),
+            "rsrps": self.as_dict(self.rsrps),
+        }
+
+
+class RadioMatrices(NamedTuple):
+    """Radio state of N UEs against M cells, one row per UE"""
+
+    cells: CellArrays
+    distances: np.ndarray
+    path_losses: np.ndarray
+    rsrps: np.ndarray
+    serving: np.ndarray
+
+    def reading(self, row: int) -> RadioReading:
+        return RadioReading(
+            self.cells,
+            self.distances[row],
+            self.path_losses[row],
+            self.rsrps[row],
+            int(self.serving[row]),
+        )
+
+
+class RadioReport(NamedTuple):
+    """Radio state of one UE keyed by cell id, as returned by evaluate()"""
+
+    cell: Optional[dict]  # serving cell, None when the UE is out of coverage
+    distances: dict
+    path_losses: dict
+    rsrps: dict
+
+
+def _cell_values(cells: List[dict], key: str, default: float) -> np.ndarray:
+    values = [cell.get(key) for cell in cells]
+    return np.array(
+        [default if value is None else value for value in values], dtype=np.float64
+    )
+
+
+def cell_arrays(
+    cells: List[dict], fc: float = DEFAULT_FC, power: float = DEFAULT_POWER
+) -> CellArrays:
+    """Cells without their own frequency / tx_power get the ``fc`` / ``power`` defaults"""
+    return CellArrays(
+        ids=np.array([cell.get("id") for cell in cells], dtype=np.int64),
+        latitude=np.array([cell.get("latitude") for cell in cells], dtype=np.float64),
+        longitude=np.array([cell.get("longitude") for cell in cells], dtype=np.float64),
+        radius=np.array([cell.get("radius") for cell in cells], dtype=np.float64),
+        frequency=_cell_values(cells, "frequency", fc),
+        power=_cell_values(cells, "tx_power", power),
+    )
+
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized haversine distance in metres (inputs in degrees, broadcastable)"""
+    φ1 = np.radians(lat1)
+    φ2 = np.radians(lat2)
+    Δφ = φ2 - φ1
+    Δλ = np.radians(lon2) - np.radians(lon1)
+
+    a = np.sin(Δφ / 2) ** 2 + np.cos(φ1) * np.cos(φ2) * np.sin(Δλ / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def path_loss(distances, frequency) -> np.ndarray:
+    return 28 + 22 * np.log(np.maximum(distances, 1.0)) + 20 * np.log(frequency)
+
+
+def serving_rsrp(ue_lat, ue_lon, cells: CellArrays, serving) -> np.ndarray:
+    """RSRP of the serving cell of every UE, NaN when out of coverage (serving -1).
+
+    Only the serving cell of each UE is evaluated, not every cell as in
+    compute_radio().
+    """
+    lat = np.asarray(ue_lat, dtype=np.float64)
+    lon = np.asarray(ue_lon, dtype=np.float64)
+    serving = np.asarray(serving, dtype=np.int64)
+    rsrp = np.full(len(serving), np.nan, dtype=np.float64)
+    covered = np.flatnonzero(serving >= 0)
+    if covered.size:
+        picked = serving[covered]
+        distances = haversine(
+            lat[covered], lon[covered], cells.latitude[picked], cells.longitude[picked]
+        )
+        rsrp[covered] = cells.power[picked] - path_loss(
+            distances, cells.frequency[picked]
+        )
+    return rsrp
+
+
+def compute_radio(ue_lat, ue_lon, cells: CellArrays) -> RadioMatrices:
+    """Distance, path loss, RSRP and serving cell of every UE against every cell in one pass.
+
+    The distance of each (UE, cell) pair is computed once and reused for the
+    path loss and the RSRP. The path loss model is the same as
+    rsrp_calculation.calc_path_loss, evaluated with the carrier frequency and
+    transmit power of each cell; distances are clamped to 1m so that a UE
+    standing on a cell site does not produce -inf.
+    """
+    lat = np.asarray(ue_lat, dtype=np.float64)[:, np.newaxis]
+    lon = np.asarray(ue_lon, dtype=np.float64)[:, np.newaxis]
+
+    distances = haversine(lat, lon, cells.latitude, cells.longitude)
+    path_losses = path_loss(distances, cells.frequency)
+    rsrps = cells.power - path_losses
+
+    if cells.ids.size == 0:
+        serving = np.full(distances.shape[0], -1, dtype=np.int64)
+    else:
+        in_range = np.where(distances <= cells.radius, distances, np.inf)
+        serving = np.argmin(in_range, axis=1)
+        serving[np.isinf(in_range[np.arange(len(serving)), serving])] = -1
+
+    return RadioMatrices(cells, distances, path_losses, rsrps, serving)
+
+
+def evaluate(
+    UE_lat: float,
+    UE_long: float,
+    cells: List[dict],
+    fc: float = DEFAULT_FC,
+    power: float = DEFAULT_POWER,
+) -> RadioReport:
+    """Serving cell, distances, path losses and RSRPs of a single UE position"""
+    reading = compute_radio([UE_lat], [UE_long], cell_arrays(cells, fc, power)).reading(
+        0
+    )
+    return RadioReport(
+        cell=cells[reading.serving] if reading.serving >= 0 else None,
+        distances=reading.as_dict(reading.distances),
+        path_losses=reading.as_dict(reading.path_losses),
+        rsrps=reading.as_dict(reading.rsrps),
+    )
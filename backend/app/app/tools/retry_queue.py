@@ -0,0 +1,256 @@
+import functools
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.database import Database
+
+from app.tools.circuit_breaker import CircuitOpenError
+from app.tools.subscription_registry import subscription_registry
+
+# Subscriptions deleted once their budget is spent, as when a NetApp could not
+# be reached before the callbacks were retried; the others are only dead-lettered
+DROP_ON_EXHAUSTION = {"MonitoringEvent"}
+
+# Seconds a retry is claimed by the worker sending it
+LEASE = 60.0
+
+
+class _Failing:
+    """Retry state of a subscription whose NetApp does not answer"""
+
+    def __init__(self, retry_at: float, owner_ids=()):
+        self.failures = 0  # failed retries, compared with the budget
+        self.retry_at = retry_at
+        self.in_flight = False
+        self.owner_ids = set(owner_ids)
+
+
+class RetryQueue:
+    """Callbacks that could not be delivered, retried with exponential backoff.
+
+    A failed notification is stored in the CallbackRetry collection instead of
+    its subscription being deleted, so a NetApp that restarts for a few
+    seconds gets its reports late instead of losing its subscriptions. The
+    retries of a subscription are sent one at a time (the oldest first), every
+    ``base_delay * 2^n`` seconds up to ``max_delay``; once one goes through,
+    the others follow at once. A subscription whose retries failed ``budget``
+    times in a row has its notifications moved to the CallbackDeadLetter
+    collection and, for monitoring events, is deleted. A retry rejected by
+    the circuit breaker of the destination was not sent: it does not count
+    against the budget and is sent again once the circuit lets callbacks
+    through.
+
+    The notifications survive a restart in Mongo; the backoff and budget of
+    the subscriptions start again from zero.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        dispatcher,
+        budget: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        poll_interval: float = 0.5,
+    ):
+        self._db = db
+        self._dispatcher = dispatcher
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._failing: Dict[Tuple, _Failing] = {}
+        self._handlers = {}  # retry id -> (on_response, on_error) of this worker
+        self._thread = None
+
+    @property
+    def _pending(self):
+        return self._db["CallbackRetry"]
+
+    @property
+    def _dead(self):
+        return self._db["CallbackDeadLetter"]
+
+    @staticmethod
+    def _key(subscriptions) -> Tuple:
+        return tuple((collection, id) for collection, id, *_ in subscriptions)
+
+    def _delay(self, failures: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2**failures)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry_delay(self, ex: Exception, failures: int) -> float:
+        if isinstance(ex, CircuitOpenError):
+            # Not sent, the destination is tried again when its circuit half-opens
+            return ex.retry_after
+        return self._delay(failures)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="callback-retries", daemon=True
+            )
+            self._thread.start()
+
+    # Called by the dispatcher
+    def push(self, notification, ex: Exception):
+        """Keep a notification that failed, it is retried in the background"""
+        now = time.time()
+        key = self._key(notification.subscriptions)
+        owner_ids = [ref.owner_id for ref in notification.subscriptions]
+        with self._lock:
+            if key not in self._failing:
+                self._failing[key] = _Failing(now + self._retry_delay(ex, 0), owner_ids)
+        doc = {
+            "url": notification.url,
+            "payload": notification.payload,
+            "reports": notification.reports,
+            "subscriptions": [list(ref) for ref in key],
+            "owner_ids": owner_ids,
+            "attempts": 1,
+            "created": now,
+            "next_attempt": now,
+            "last_error": str(ex),
+        }
+        self._pending.insert_one(doc)
+        if notification.on_response or notification.on_error:
+            self._handlers[doc["_id"]] = (
+                notification.on_response,
+                notification.on_error,
+            )
+        self.start()
+
+    def delivered(self, subscriptions):
+        """A notification of the subscriptions went through, their NetApp is back"""
+        key = self._key(subscriptions)
+        if key in self._failing:
+            with self._lock:
+                self._failing.pop(key, None)
+
+    # Retries
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._poll()
+            except Exception as ex:
+                logging.warning("Failed to retry the callbacks")
+                logging.warning(ex)
+
+    def _poll(self):
+        now = time.time()
+        due = self._pending.find({"next_attempt": {"$lte": now}}).sort("created", 1)
+        for doc in due.limit(500):
+            key = self._key(doc["subscriptions"])
+            with self._lock:
+                failing = self._failing.get(key)
+                if failing is not None:
+                    # Still failing: one retry at a time, after the backoff
+                    if failing.in_flight or failing.retry_at > now:
+                        continue
+                    failing.in_flight = True
+            # Claimed, the other workers skip it until the lease expires
+            claimed = self._pending.find_one_and_update(
+                {"_id": doc["_id"], "next_attempt": doc["next_attempt"]},
+                {"$set": {"next_attempt": now + LEASE}},
+            )
+            if claimed is None or not self._dispatcher.send(
+                doc["url"],
+                doc["payload"],
+                on_response=functools.partial(self._retried, doc),
+                on_error=functools.partial(self._retry_failed, doc),
+            ):
+                if claimed is not None:
+                    self._pending.update_one(
+                        {"_id": doc["_id"]}, {"$set": {"next_attempt": now}}
+                    )
+                self._release(key)
+
+    def _release(self, key: Tuple):
+        with self._lock:
+            failing = self._failing.get(key)
+            if failing is not None:
+                failing.in_flight = False
+
+    def _retried(self, doc: dict, response):
+        self._pending.delete_one({"_id": doc["_id"]})
+        with self._lock:
+            self._failing.pop(self._key(doc["subscriptions"]), None)
+        on_response, _ = self._handlers.pop(doc["_id"], (None, None))
+        if on_response is not None:
+            on_response(response)
+
+    def _retry_failed(self, doc: dict, ex: Exception):
+        now = time.time()
+        key = self._key(doc["subscriptions"])
+        rejected = isinstance(ex, CircuitOpenError)
+        with self._lock:
+            failing = self._failing.setdefault(
+                key, _Failing(now, doc.get("owner_ids", ()))
+            )
+            if not rejected:
+                failing.failures += 1
+            failing.in_flight = False
+            exhausted = failing.failures >= self.budget
+            if not exhausted:
+                failing.retry_at = now + self._retry_delay(ex, failing.failures)
+        if exhausted:
+            self._give_up(key, doc["subscriptions"], ex)
+            return
+        update = {"$set": {"next_attempt": failing.retry_at, "last_error": str(ex)}}
+        if not rejected:
+            update["$inc"] = {"attempts": 1}
+        self._pending.update_one({"_id": doc["_id"]}, update)
+
+    def _give_up(self, key: Tuple, subscriptions: List, ex: Exception):
+        logging.warning(f"Callbacks of {key} dead-lettered after {self.budget} retries")
+        for doc in self._pending.find({"subscriptions": subscriptions}):
+            self._dead.insert_one(dict(doc, failed_at=time.time(), last_error=str(ex)))
+            self._pending.delete_one({"_id": doc["_id"]})
+            _, on_error = self._handlers.pop(doc["_id"], (None, None))
+            if on_error is not None:
+                on_error(ex)
+        for collection, id in key:
+            if collection in DROP_ON_EXHAUSTION:
+                subscription_registry.delete(self._db, collection, id)
+        with self._lock:
+            self._failing.pop(key, None)
+
+    # Delivery state
+    def status(self, owner_id: Optional[int] = None, limit: int = 100) -> dict:
+        """Pending retries and dead letters, of one owner or (None) all of them"""
+        query = {} if owner_id is None else {"owner_ids": owner_id}
+        projection = {"payload": 0}
+
+        def entries(collection):
+            return [
+                dict(doc, _id=str(doc["_id"]))
+                for doc in collection.find(query, projection)
+                .sort("created", -1)
+                .limit(limit)
+            ]
+
+        with self._lock:
+            failing = [
+                {
+                    "subscriptions": [list(ref) for ref in key],
+                    "failures": state.failures,
+                    "budget": self.budget,
+                    "retry_at": state.retry_at,
+                }
+                for key, state in self._failing.items()
+                if owner_id is None or owner_id in state.owner_ids
+            ]
+        return {
+            "pending": self._pending.count_documents(query),
+            "dead_letters": self._dead.count_documents(query),
+            "failing": failing,
+            "retries": entries(self._pending),
+            "dead": entries(self._dead),
+        }
@@ -1,4 +1,5 @@
 import math
+from app.tools import radio
 from app.tools.distance import distance
 
 def cartesian_from_haversine(lat, lng, lat0, lng0):
@@ -13,24 +14,16 @@ def cartesian_from_haversine(lat, lng, lat0, lng0):
     return x, y
 
 
-def check_path_loss(UE_lat, UE_long, cells):
-    losses_by_cell = {}
-    for cell in cells:
-        loss = calc_path_loss(UE_lat, UE_long, cell.get("latitude"), cell.get("longitude"))
-        losses_by_cell[f"{cell.get('id')}"]= loss
-    return losses_by_cell
+def check_path_loss(UE_lat, UE_long, cells, fc=radio.DEFAULT_FC):
+    return radio.evaluate(UE_lat, UE_long, cells, fc=fc).path_losses
 
 
-def calc_path_loss(UE_lat, UE_long, cell_lat, cell_long, fc=2.6475):
+def calc_path_loss(UE_lat, UE_long, cell_lat, cell_long, fc=radio.DEFAULT_FC):
     distance_3d = distance(UE_lat, UE_long, cell_lat, cell_long)
     path_loss = 28 + 22*math.log(distance_3d) + 20* math.log(fc) 
     return path_loss
 
 
-def check_rsrp(UE_lat, UE_long, cells, power=30):
-    rsrps_by_cell = {}
-    losses = check_path_loss(UE_lat, UE_long, cells)
-    for key in losses:
-        rsrp= power - losses[key]
-        rsrps_by_cell[f"{key}"] = rsrp
-    return rsrps_by_cell
+def check_rsrp(UE_lat, UE_long, cells, power=radio.DEFAULT_POWER):
+    # fc / power only apply to the cells that do not define their own
+    return radio.evaluate(UE_lat, UE_long, cells, power=power).rsrps
@@ -0,0 +1,222 @@
+import copy
+import datetime
+import logging
+import threading
+import time
+from typing import Optional
+
+from bson import ObjectId
+from pymongo.database import Database
+
+from app.core.config import settings
+from app.crud import crud_mongo
+
+MONITORING_EVENT = "MonitoringEvent"
+QOS_MONITORING = "QoSMonitoring"
+QOS_KEYS = ("ipv4Addr", "ipv6Addr", "macAddr")
+
+# Subscriptions written by every worker, read back by the registries of the others
+CHANGES = "SubscriptionChanges"
+# Seconds the changes are read again, for the ones written late
+CHANGES_OVERLAP = 5.0
+# Seconds the changes are kept
+CHANGES_TTL = 3600
+
+
+class SubscriptionRegistry:
+    """In-memory copy of the MonitoringEvent and QoSMonitoring subscriptions.
+
+    The simulator looks for the subscriptions of every moving UE on every tick;
+    most of the time there are none. The registry answers these lookups from
+    dictionaries indexed by (externalId, monitoringType) and by ipv4 / ipv6 /
+    MAC address, without going to Mongo. Mongo stays the source of truth: the
+    registry is loaded from it once and every write done by the endpoints or
+    the simulator is written through with refresh() / update() / delete().
+
+    Every worker has its own registry. When they are ``shared`` (several API
+    workers), every write also adds an entry to the SubscriptionChanges
+    collection, and a registry reads the entries of the other workers (one
+    query at most every ``sync_interval`` seconds, on a lookup) and reloads
+    the subscriptions they changed.
+    """
+
+    def __init__(self, shared: bool = False, sync_interval: float = 1.0):
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self._synced_at = 0.0
+        self._applied = {}  # change id -> time, changes already reloaded
+        self._changes_indexed = False
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._docs = {}  # (collection, id) -> document
+        self._monitoring = {}  # (externalId, monitoringType) -> [id]
+        self._qos = {key: {} for key in QOS_KEYS}  # key -> value -> [id]
+
+    def load(self, db: Database):
+        with self._lock:
+            self._docs.clear()
+            self._monitoring.clear()
+            for index in self._qos.values():
+                index.clear()
+            for collection in (MONITORING_EVENT, QOS_MONITORING):
+                for doc in db[collection].find():
+                    self._add(collection, doc)
+            self._loaded = True
+            self._synced_at = time.time()
+
+    def _ensure_loaded(self, db: Database):
+        if not self._loaded:
+            self.load(db)
+        elif self.shared and time.time() - self._synced_at >= self.sync_interval:
+            try:
+                self._sync(db)
+            except Exception as ex:
+                logging.warning(
+                    "Failed to read the subscriptions changed by the other workers"
+                )
+                logging.warning(ex)
+
+    def _sync(self, db: Database):
+        now = time.time()
+        since = self._synced_at - CHANGES_OVERLAP
+        self._synced_at = now
+        changed = {}
+        for change in db[CHANGES].find({"at": {"$gte": since}}):
+            if change["_id"] in self._applied:
+                continue
+            self._applied[change["_id"]] = change["at"]
+            changed.setdefault(change["collection"], set()).add(change["id"])
+        for collection, ids in changed.items():
+            found = {
+                str(doc["_id"]): doc
+                for doc in db[collection].find(
+                    {"_id": {"$in": [ObjectId(uuId) for uuId in ids]}}
+                )
+            }
+            for uuId in ids:
+                if uuId in found:
+                    self._add(collection, found[uuId])
+                else:
+                    self._remove(collection, uuId)
+        self._applied = {id: at for id, at in self._applied.items() if at >= since}
+
+    def _log_change(self, db: Database, collection: str, uuId):
+        if not self.shared:
+            return
+        if not self._changes_indexed:
+            db[CHANGES].create_index("created", expireAfterSeconds=CHANGES_TTL)
+            self._changes_indexed = True
+        change = {
+            "collection": collection,
+            "id": str(uuId),
+            "at": time.time(),
+            "created": datetime.datetime.utcnow(),
+        }
+        db[CHANGES].insert_one(change)
+        with self._lock:
+            # Already up to date in this registry
+            self._applied[change["_id"]] = change["at"]
+
+    def _index_entries(self, collection: str, doc: dict):
+        if collection == MONITORING_EVENT:
+            yield self._monitoring, (doc.get("externalId"), doc.get("monitoringType"))
+        else:
+            for key in QOS_KEYS:
+                if doc.get(key) is not None:
+                    yield self._qos[key], doc.get(key)
+
+    def _add(self, collection: str, doc: dict):
+        uuId = str(doc.get("_id"))
+        self._remove(collection, uuId)
+        self._docs[(collection, uuId)] = doc
+        for index, key in self._index_entries(collection, doc):
+            index.setdefault(key, []).append(uuId)
+
+    def _remove(self, collection: str, uuId: str):
+        doc = self._docs.pop((collection, uuId), None)
+        if doc is None:
+            return
+        for index, key in self._index_entries(collection, doc):
+            ids = index.get(key, [])
+            if uuId in ids:
+                ids.remove(uuId)
+            if not ids:
+                index.pop(key, None)
+
+    def _first(self, collection: str, index: dict, key) -> Optional[dict]:
+        ids = index.get(key)
+        if not ids:
+            return None
+        # Callers update their copy and write it back with update()
+        return copy.deepcopy(self._docs[(collection, ids[0])])
+
+    # Lookups
+    def monitoring_event(
+        self, db: Database, externalId: str, monitoringType: str
+    ) -> Optional[dict]:
+        with self._lock:
+            self._ensure_loaded(db)
+            return self._first(
+                MONITORING_EVENT, self._monitoring, (externalId, monitoringType)
+            )
+
+    def qos_monitoring(self, db: Database, key: str, value) -> Optional[dict]:
+        with self._lock:
+            self._ensure_loaded(db)
+            return self._first(QOS_MONITORING, self._qos[key], value)
+
+    # Write-through
+    def refresh(self, db: Database, collection: str, uuId):
+        """Reload a single subscription from Mongo after it was created, updated or deleted"""
+        doc = crud_mongo.read(db, collection, "_id", ObjectId(uuId))
+        self._log_change(db, collection, uuId)
+        with self._lock:
+            if not self._loaded:
+                return
+            if doc is None:
+                self._remove(collection, str(uuId))
+            else:
+                self._add(collection, doc)
+
+    def update(self, db: Database, collection: str, uuId, json_data: dict):
+        result = crud_mongo.update(db, collection, uuId, json_data)
+        self._log_change(db, collection, uuId)
+        with self._lock:
+            if self._loaded:
+                self._add(collection, dict(json_data, _id=ObjectId(uuId)))
+        return result
+
+    def reserve_report(self, db: Database, collection: str, uuId) -> Optional[dict]:
+        """Take one of the reports left to the subscription (None when none is left, or it was deleted)"""
+        return self._count_reports(db, collection, uuId, -1, minimum=1)
+
+    def refund_report(self, db: Database, collection: str, uuId) -> Optional[dict]:
+        """A reserved report was not delivered, it is left to the subscription again"""
+        return self._count_reports(db, collection, uuId, 1)
+
+    def _count_reports(
+        self, db: Database, collection: str, uuId, value: int, minimum: int = None
+    ) -> Optional[dict]:
+        doc = crud_mongo.increment(
+            db, collection, uuId, "maximumNumberOfReports", value, minimum=minimum
+        )
+        if doc is None:
+            return None
+        self._log_change(db, collection, uuId)
+        with self._lock:
+            if self._loaded:
+                self._add(collection, doc)
+        return doc
+
+    def delete(self, db: Database, collection: str, uuId):
+        result = crud_mongo.delete_by_uuid(db, collection, uuId)
+        self._log_change(db, collection, uuId)
+        with self._lock:
+            self._remove(collection, str(uuId))
+        return result
+
+
+subscription_registry = SubscriptionRegistry(
+    shared=settings.UE_STATE_BACKEND == "mongo",
+    sync_interval=settings.UE_STATE_FLUSH_INTERVAL,
+)
@@ -1,5 +1,8 @@
-import time
-from threading import Timer
+import heapq
+import itertools
+import logging
+import threading
+from app.tools.clock import wall_clock
 
 class TimerError(Exception):
     """A custom exception used to report errors in use of Timer class"""
@@ -7,25 +10,27 @@ class TimerError(Exception):
 class SequencialTimer:
     def __init__(self,
         text="Elapsed time: {:0.4f} seconds",
-        logger=print
+        logger=print,
+        clock=wall_clock
     ):
         self._start_time = None
         self.text = text
         self.logger = logger
+        self.clock = clock
 
     def start(self):
         """Start a new timer"""
         if self._start_time is not None:
             raise TimerError(f"Timer is running. Use .stop() to stop it")
 
-        self._start_time = time.perf_counter()
+        self._start_time = self.clock.monotonic()
 
     def stop(self):
         """Stop the timer, and report the elapsed time"""
         if self._start_time is None:
             raise TimerError(f"Timer is not running. Use .start() to start it")
 
-        elapsed_time = time.perf_counter() - self._start_time
+        elapsed_time = self.clock.monotonic() - self._start_time
         # Reset the timer
         self._start_time = None 
         
@@ -39,7 +44,7 @@ class SequencialTimer:
         if self._start_time is None:
             raise TimerError(f"Timer is not running. Use .start() to start it")
 
-        elapsed_time = time.perf_counter() - self._start_time
+        elapsed_time = self.clock.monotonic() - self._start_time
 
         if self.logger:
             self.logger(self.text.format(elapsed_time))
@@ -47,9 +52,124 @@ class SequencialTimer:
         return elapsed_time
 
 
+class _Entry(object):
+    __slots__ = ("due", "interval", "function", "args", "kwargs", "cancelled")
+
+    def __init__(self, due, interval, function, args, kwargs):
+        self.due       = due
+        self.interval  = interval
+        self.function  = function
+        self.args      = args
+        self.kwargs    = kwargs
+        self.cancelled = False
+
+
+class TimerScheduler(object):
+    """The repeated timers of one clock, in a heap instead of a thread per period.
+
+    The timers are kept in a heap ordered by their next run: scheduling is
+    O(log n) and cancelling only marks the entry, which is dropped when it
+    reaches the top of the heap (or when cancelled entries are more than half
+    of the heap). A timer runs every ``interval`` seconds from when it was
+    scheduled, a late run does not shift the next ones. With a ``thread``,
+    the functions run on the scheduler thread, so they should only hand the
+    work over (as the callbacks queued with the notification dispatcher).
+
+    Without a ``thread``, nothing runs on its own: the timers follow a
+    SimulationClock and the simulation calls run_pending() on every step, so
+    they are due in simulated seconds, at any speed-up. Every simulation has
+    a clock of its own, hence a scheduler of its own.
+    """
+    def __init__(self, clock=wall_clock, thread=True):
+        self.clock      = clock
+        self.thread     = thread
+        self._heap      = []  # (due, sequence, _Entry)
+        self._sequence  = itertools.count()
+        self._cancelled = 0
+        self._cond      = threading.Condition()
+        self._thread    = None
+
+    def schedule(self, interval, function, *args, **kwargs):
+        entry = _Entry(self.clock.monotonic() + interval, interval, function, args, kwargs)
+        with self._cond:
+            self._push(entry)
+            if self._heap[0][2] is entry:
+                # Due before the one the thread is waiting for
+                self._cond.notify()
+            if self.thread and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="timers", daemon=True)
+                self._thread.start()
+        return entry
+
+    def cancel(self, entry):
+        with self._cond:
+            if entry.cancelled:
+                return
+            entry.cancelled = True
+            self._cancelled += 1
+            if self._cancelled > len(self._heap) // 2:
+                self._heap = [item for item in self._heap if not item[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap) - self._cancelled
+
+    def _push(self, entry):
+        heapq.heappush(self._heap, (entry.due, next(self._sequence), entry))
+
+    def _pop_due(self, now):
+        """The entries due by ``now``, rescheduled for their next run"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, entry = heapq.heappop(self._heap)
+            if entry.cancelled:
+                self._cancelled -= 1
+                continue
+            due.append(entry)
+            entry.due += entry.interval
+            if entry.due <= now:
+                # Missed runs are skipped, not run back to back
+                entry.due = now + entry.interval
+            self._push(entry)
+        return due
+
+    @staticmethod
+    def _call(due):
+        for entry in due:
+            if entry.cancelled:
+                continue
+            try:
+                entry.function(*entry.args, **entry.kwargs)
+            except Exception as ex:
+                logging.warning("Timer function failed")
+                logging.warning(ex)
+
+    def run_pending(self):
+        """Run the timers due by now on the calling thread"""
+        with self._cond:
+            due = self._pop_due(self.clock.monotonic())
+        self._call(due)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                now = self.clock.monotonic()
+                if self._heap[0][0] > now:
+                    self._cond.wait(self._heap[0][0] - now)
+                    continue
+                due = self._pop_due(now)
+            self._call(due)
+
+
 class RepeatedTimer(object):
-    def __init__(self, interval, function, *args, **kwargs):
-        self._timer     = None
+    """Runs ``function`` every ``interval`` seconds on a TimerScheduler"""
+    def __init__(self, interval, function, *args, scheduler, **kwargs):
+        self._entry     = None
+        self._scheduler = scheduler
         self.interval   = interval
         self.function   = function
         self.args       = args
@@ -57,17 +177,14 @@ class RepeatedTimer(object):
         self.is_running = False
         self.start()
 
-    def _run(self):
-        self.is_running = False
-        self.start()
-        self.function(*self.args, **self.kwargs)
-
     def start(self):
         if not self.is_running:
-            self._timer = Timer(self.interval, self._run)
-            self._timer.start()
+            self._entry = self._scheduler.schedule(
+                self.interval, self.function, *self.args, **self.kwargs
+            )
             self.is_running = True
 
     def stop(self):
-        self._timer.cancel()
-        self.is_running = False
\ No newline at end of file
+        if self._entry is not None:
+            self._scheduler.cancel(self._entry)
+        self.is_running = False
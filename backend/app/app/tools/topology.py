@@ -0,0 +1,89 @@
+import itertools
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.tools.cell_index import CellIndex
+
+_versions = itertools.count(1)
+
+
+class Topology(NamedTuple):
+    """Immutable snapshot of the cells and gNBs of one owner.
+
+    Cells and gNBs cannot change while UEs move, so the movement loops resolve
+    everything they need (serving cell, gNB hex id) from the snapshot instead
+    of the database. A new snapshot, with a new version, replaces the old one
+    whenever the gNB or Cell endpoints change the data of the owner.
+    """
+
+    owner_id: int
+    version: int
+    index: CellIndex  # the cells, with their spatial index
+    cells_by_id: Mapping[int, dict]
+    gnbs: Mapping[int, dict]  # by gNB primary key
+
+    @property
+    def cells(self):
+        return self.index.cells
+
+    def cell(self, id: Optional[int]) -> Optional[dict]:
+        return self.cells_by_id.get(id)
+
+    def serving_cell(self, lat: float, lon: float) -> Optional[dict]:
+        return self.index.serving_cell(lat, lon)
+
+    def gnb_hex(self, cell: Optional[dict]) -> Optional[str]:
+        gnb = self.gnbs.get(cell.get("gNB_id")) if cell else None
+        return gnb.get("gNB_id") if gnb else None
+
+
+# Dictionary holding the latest topology snapshot of each owner
+topologies = {}
+
+
+def rebuild_topology(
+    db: Session, owner_id: int, cells_changed: bool = True
+) -> Topology:
+    """Build a new snapshot; the cell index is kept when only gNBs changed"""
+    previous = topologies.get(owner_id)
+    if cells_changed or previous is None:
+        cells = crud.cell.get_multi_by_owner(
+            db=db, owner_id=owner_id, skip=0, limit=None
+        )
+        index = CellIndex(jsonable_encoder(cells))
+    else:
+        index = previous.index
+
+    gnbs = {
+        gnb.get("id"): gnb
+        for gnb in jsonable_encoder(
+            crud.gnb.get_multi_by_owner(db=db, owner_id=owner_id, skip=0, limit=None)
+        )
+    }
+    for cell in index.cells:
+        # Cells may point to a gNB of another user (e.g. created by a superuser)
+        if cell.get("gNB_id") is not None and cell.get("gNB_id") not in gnbs:
+            gnb = crud.gnb.get(db=db, id=cell.get("gNB_id"))
+            if gnb:
+                gnbs[gnb.id] = jsonable_encoder(gnb)
+
+    topology = Topology(
+        owner_id=owner_id,
+        version=next(_versions),
+        index=index,
+        cells_by_id=MappingProxyType({cell.get("id"): cell for cell in index.cells}),
+        gnbs=MappingProxyType(gnbs),
+    )
+    topologies[owner_id] = topology
+    return topology
+
+
+def get_topology(db: Session, owner_id: int) -> Topology:
+    topology = topologies.get(owner_id)
+    if topology is None:
+        topology = rebuild_topology(db, owner_id)
+    return topology
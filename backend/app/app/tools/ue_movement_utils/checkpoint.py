@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import bindparam, update
+
+from app import models
+from app.db.session import SessionLocal
+
+
+class Checkpointer:
+    """Writes the position of the simulated UEs back to the database.
+
+    The movement loops only store the position of a UE when they stop; the
+    checkpointer flushes the coordinates, cell and path index of every UE
+    moving in this worker every ``interval`` seconds, so that the database
+    (and everything reading it, e.g. the CAMARA location API) is at most one
+    interval behind and a restart resumes close to where the UEs were. Each
+    flush is one bulk UPDATE of the UEs that moved since the previous one.
+    """
+
+    def __init__(self, ues, interval: float, session_factory=SessionLocal):
+        self.ues = ues
+        self.interval = interval
+        self._session_factory = session_factory
+        self._flushed = {}  # supi -> last row written
+        self._lock = threading.Lock()  # one flush at a time
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="ue-checkpoint", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as ex:
+                logging.warning("Failed to checkpoint the UE positions")
+                logging.warning(ex)
+
+    def remove(self, supi: str):
+        """Take a stopping UE out of the checkpoints, its loop writes the final position.
+
+        Waits for a flush in progress, so it cannot overwrite that position
+        with an older one.
+        """
+        with self._lock:
+            self.ues.pop(supi)
+            self._flushed.pop(supi, None)
+
+    def pending(self) -> list:
+        """Rows of the simulated UEs that changed since the last flush"""
+        rows = []
+        for supi, live in self.ues.snapshot().items():
+            if not live.is_simulated:
+                continue
+            row = {
+                "_supi": supi,
+                "_latitude": live.latitude,
+                "_longitude": live.longitude,
+                "_Cell_id": live.Cell_id,
+                "_path_index": live.path_index,
+            }
+            if self._flushed.get(supi) != row:
+                rows.append(row)
+        return rows
+
+    def flush(self) -> int:
+        with self._lock:
+            rows = self.pending()
+            if not rows:
+                return 0
+            db = self._session_factory()
+            try:
+                db.execute(
+                    update(models.UE)
+                    .where(models.UE.supi == bindparam("_supi"))
+                    .values(
+                        latitude=bindparam("_latitude"),
+                        longitude=bindparam("_longitude"),
+                        Cell_id=bindparam("_Cell_id"),
+                        path_index=bindparam("_path_index"),
+                    ),
+                    rows,
+                )
+                db.commit()
+            finally:
+                db.close()
+            for row in rows:
+                self._flushed[row["_supi"]] = row
+            return len(rows)
@@ -1,26 +1,46 @@
+import atexit
 import logging
 
-import requests
 from fastapi.encoders import jsonable_encoder
 
 from app import crud, tools
-from app.crud import crud_mongo
-from app.tools import monitoring_callbacks
-
-# Dictionary holding threads that are running per user id.
+from app.core.config import settings
+from app.tools import monitoring_callbacks, radio
+from app.tools.notifications import subscription_ref
+from app.tools.subscription_registry import subscription_registry
+from app.tools.topology import get_topology
+
+from .checkpoint import Checkpointer
+from .live_ue import LiveUEMap
+from .state import create_state_store
+from .trace import TraceRecorder
+
+# Dictionary holding threads that are running per user id (in this worker).
 threads = {}
 
-# Dictionary holding UEs' information
-ues = {}
-
-# Dictionary holding UEs' distances to cells
-distances = {}
-
-# Dictionary holding UEs' path losses in reference to cells
-path_losses = {}
-
-# Dictionary holding UEs' path losses in reference to cells
-rsrps = {}
+# Dictionary holding UEs' information (LiveUE records), updated by the UEs moving in this worker
+ues = LiveUEMap()
+
+# Positions of the UEs moving in this worker, written back to the database periodically
+checkpointer = Checkpointer(ues, settings.SIMULATION_CHECKPOINT_INTERVAL)
+
+# State of the moving UEs as seen by every worker
+ue_state = create_state_store(
+    settings.UE_STATE_BACKEND, ues, lease=settings.UE_STATE_LEASE
+)
+
+# Per tick state of the moving UEs, recorded only when a trace directory is set
+trace_recorder = (
+    TraceRecorder(
+        settings.SIMULATION_TRACE_DIR,
+        max_bytes=settings.SIMULATION_TRACE_MAX_BYTES,
+        keep=settings.SIMULATION_TRACE_KEEP,
+    )
+    if settings.SIMULATION_TRACE_DIR
+    else None
+)
+if trace_recorder is not None:
+    atexit.register(trace_recorder.close)
 
 subscriptions = {
     "location_reporting": False,
@@ -30,8 +50,24 @@ subscriptions = {
 }
 
 
+# Metres per second of the named speeds, other values are numbers of m/s
+SPEEDS = {"STATIONARY": 0.0, "LOW": 1.0, "HIGH": 10.0}
+
+
+def speed_to_mps(speed) -> float:
+    if speed is None:
+        return 0.0
+    if speed in SPEEDS:
+        return SPEEDS[speed]
+    try:
+        return max(float(speed), 0.0)
+    except ValueError:
+        logging.warning(f"Unknown speed {speed}, the UE stays still")
+        return 0.0
+
+
 def get_cells(db, owner_id):
-    Cells = crud.cell.get_multi_by_owner(db=db, owner_id=owner_id, skip=0, limit=100)
+    Cells = crud.cell.get_multi_by_owner(db=db, owner_id=owner_id, skip=0, limit=None)
     return jsonable_encoder(Cells)
 
 
@@ -41,35 +77,55 @@ def get_points(db, path_id):
 
 
 def retrieve_ue_state(supi: str, user_id: int) -> bool:
-    try:
-        return threads[f"{supi}"][f"{user_id}"].is_alive()
-    except KeyError as ke:
-        print("Key Not Found in Threads Dictionary:", ke)
-        return False
+    return ue_state.is_running(f"{supi}", user_id)
 
 
 def retrieve_ues() -> dict:
-    return ues
+    return ue_state.all()
+
+
+def retrieve_ues_json() -> dict:
+    """The moving UEs as plain dicts, for the API responses"""
+    return ue_state.as_json()
 
 
 def retrieve_ue(supi: str) -> dict:
-    return ues.get(supi)
+    return ue_state.get(supi)
+
 
+def retrieve_ue_radio(db, supi: str) -> dict:
+    """Distances, path losses and RSRPs of every cell at the last published position, by cell id.
 
-def retrieve_ue_distances(supi: str) -> dict:
-    return distances.get(supi)
+    The simulations only evaluate the serving cell, the full reading is
+    computed on request.
+    """
+    state = ue_state.get(supi)
+    if not state:
+        return None
+    topology = get_topology(db, state["owner_id"])
+    matrices = radio.compute_radio(
+        [state["latitude"]], [state["longitude"]], topology.index.arrays
+    )
+    return matrices.reading(0).as_json()
 
 
-def retrieve_ue_path_losses(supi: str) -> dict:
-    return path_losses.get(supi)
+def retrieve_ue_distances(db, supi: str) -> dict:
+    reading = retrieve_ue_radio(db, supi)
+    return reading["distances"] if reading else None
 
 
-def retrieve_ue_rsrps(supi: str) -> dict:
-    return rsrps.get(supi)
+def retrieve_ue_path_losses(db, supi: str) -> dict:
+    reading = retrieve_ue_radio(db, supi)
+    return reading["path_losses"] if reading else None
+
+
+def retrieve_ue_rsrps(db, supi: str) -> dict:
+    reading = retrieve_ue_radio(db, supi)
+    return reading["rsrps"] if reading else None
 
 
 def monitoring_event_sub_validation(
-    sub: dict, is_superuser: bool, current_user_id: int, owner_id
+    sub: dict, is_superuser: bool, current_user_id: int, owner_id, now=None
 ) -> bool:
 
     if not is_superuser and (owner_id != current_user_id):
@@ -77,7 +133,7 @@ def monitoring_event_sub_validation(
         return False
     else:
         sub_validate_time = tools.check_expiration_time(
-            expire_time=sub.get("monitorExpireTime")
+            expire_time=sub.get("monitorExpireTime"), now=now
         )
         sub_validate_number_of_reports = tools.check_numberOfReports(
             sub.get("maximumNumberOfReports")
@@ -88,6 +144,65 @@ def monitoring_event_sub_validation(
             return False
 
 
+def drop_unreachable_subscription(active_subscriptions, key):
+    """on_error handler of the monitoring callbacks, sent in the background.
+
+    Failed callbacks are retried (see RetryQueue); the handler is only called
+    once the retries are given up and the subscription deleted, so that the
+    loop stops using it.
+    """
+
+    def on_error(ex):
+        logging.warning("Failed to send the callback request, subscription dropped")
+        logging.warning(ex)
+        active_subscriptions.update({key: False})
+
+    return on_error
+
+
+def send_monitoring_report(
+    db_mongo, sub: dict, callback, *args, on_response=None, on_error=None
+) -> bool:
+    """Queue a report of a monitoring event subscription with one of its monitoring_callbacks.
+
+    The report is counted against the maximumNumberOfReports of the
+    subscription when it is queued, as the callbacks are sent in the
+    background: reports waiting to be sent (or retried) cannot overshoot the
+    limit. The count is given back if the report is dropped, or dead-lettered
+    once its retries are given up. It is updated in Mongo and in the copy of
+    the loop. False when no report is left or it was dropped.
+    """
+    uuId = sub.get("_id")
+
+    def counted(doc):
+        if doc is not None:
+            sub.update({"maximumNumberOfReports": doc.get("maximumNumberOfReports")})
+
+    def refund():
+        counted(subscription_registry.refund_report(db_mongo, "MonitoringEvent", uuId))
+
+    def on_failure(ex):
+        refund()
+        if on_error is not None:
+            on_error(ex)
+
+    doc = subscription_registry.reserve_report(db_mongo, "MonitoringEvent", uuId)
+    if doc is None:
+        # Spent by the reports already queued (maybe by another worker)
+        sub.update({"maximumNumberOfReports": 0})
+        return False
+    counted(doc)
+    queued = callback(
+        *args,
+        on_response=on_response,
+        on_error=on_failure,
+        ref=subscription_ref("MonitoringEvent", sub),
+    )
+    if not queued:
+        refund()
+    return queued
+
+
 def validate_location_reporting_sub(
     active_subscriptions,
     current_user,
@@ -96,15 +211,14 @@ def validate_location_reporting_sub(
     UE,
     db_mongo,
     location_reporting_sub=None,
+    now=None,
+    live=None,
 ):
     if not location_reporting_sub and not active_subscriptions.get(
         "location_reporting"
     ):
-        location_reporting_sub = crud_mongo.read_by_multiple_pairs(
-            db_mongo,
-            "MonitoringEvent",
-            externalId=UE.external_identifier,
-            monitoringType="LOCATION_REPORTING",
+        location_reporting_sub = subscription_registry.monitoring_event(
+            db_mongo, UE.external_identifier, "LOCATION_REPORTING"
         )
         if location_reporting_sub:
             active_subscriptions.update({"location_reporting": True})
@@ -116,40 +230,22 @@ def validate_location_reporting_sub(
             is_superuser,
             current_user,
             location_reporting_sub.get("owner_id"),
+            now=now,
         )
         if sub_is_valid:
-            try:
-                monitoring_callbacks.location_callback(
-                    ues[f"{supi}"],
-                    location_reporting_sub.get("notificationDestination"),
-                    location_reporting_sub.get("link"),
-                )
-
-                location_reporting_sub.update(
-                    {
-                        "maximumNumberOfReports": location_reporting_sub.get(
-                            "maximumNumberOfReports"
-                        )
-                        - 1
-                    }
-                )
-                crud_mongo.update(
-                    db_mongo,
-                    "MonitoringEvent",
-                    location_reporting_sub.get("_id"),
-                    location_reporting_sub,
-                )
-            except requests.exceptions.ConnectionError as ex:
-                logging.warning(ex)
-                crud_mongo.delete_by_uuid(
-                    db_mongo,
-                    "MonitoringEvent",
-                    location_reporting_sub.get("_id"),
-                )
-                active_subscriptions.update({"location_reporting": False})
-                raise Exception("Failed to send the callback request")
+            send_monitoring_report(
+                db_mongo,
+                location_reporting_sub,
+                monitoring_callbacks.location_callback,
+                ues[f"{supi}"] if live is None else live,
+                location_reporting_sub.get("notificationDestination"),
+                location_reporting_sub.get("link"),
+                on_error=drop_unreachable_subscription(
+                    active_subscriptions, "location_reporting"
+                ),
+            )
         else:
-            crud_mongo.delete_by_uuid(
+            subscription_registry.delete(
                 db_mongo,
                 "MonitoringEvent",
                 location_reporting_sub.get("_id"),
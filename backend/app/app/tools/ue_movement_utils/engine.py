@@ -0,0 +1,228 @@
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+
+
+class TickStats:
+    """Health of the ticks: how late they start and how many do not fit their interval.
+
+    Counters are kept since the start of the engine, the lateness and
+    duration percentiles over the last ``window`` ticks.
+    """
+
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self._lateness = deque(maxlen=window)
+        self._durations = deque(maxlen=window)
+        self.ticks = 0
+        self.overruns = 0  # ticks that took longer than their interval
+        self.skipped = 0  # ticks not run because the previous one was still running
+        self.missed = 0  # deadlines that had already passed when scheduled
+
+    def tick(self, lateness: float, duration: float, interval: float):
+        with self._lock:
+            self.ticks += 1
+            self._lateness.append(lateness)
+            self._durations.append(duration)
+            if 0 < interval < duration:
+                self.overruns += 1
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def miss(self, count: int):
+        with self._lock:
+            self.missed += count
+
+    def lateness(self) -> list:
+        """Seconds each tick of the window started after its deadline"""
+        with self._lock:
+            return list(self._lateness)
+
+    @staticmethod
+    def _percentiles(values) -> dict:
+        if not values:
+            return {"p50": None, "p99": None, "max": None}
+        values = sorted(values)
+        return {
+            "p50": 1000 * values[(len(values) - 1) // 2],
+            "p99": 1000 * values[int(0.99 * (len(values) - 1))],
+            "max": 1000 * values[-1],
+        }
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            lateness, durations = list(self._lateness), list(self._durations)
+            counters = {
+                "ticks": self.ticks,
+                "overruns": self.overruns,
+                "skipped": self.skipped,
+                "missed": self.missed,
+            }
+        return dict(
+            counters,
+            lateness_ms=self._percentiles(lateness),
+            duration_ms=self._percentiles(durations),
+        )
+
+
+class SimulationEngine:
+    """Single scheduler that drives every moving UE.
+
+    Instead of one thread per UE, tasks are registered here and the scheduler
+    thread calls their ``tick()`` once per ``interval`` seconds. The ticks run
+    on a bounded worker pool, so the number of threads (and DB connections)
+    does not grow with the number of moving UEs. A task whose previous tick is
+    still running (e.g. blocked on a callback) is skipped for that round
+    instead of delaying everybody else.
+
+    Each task can be registered with its own interval (e.g. a simulation run
+    with a speed-up factor). A task with interval 0 runs as fast as possible:
+    it is queued again as soon as its previous tick has finished.
+
+    The deadlines are fixed: the next tick of a task is due one interval
+    after the previous deadline, not after the previous tick ran, so the
+    cadence does not drift with the work done on each tick. Deadlines that
+    already passed (the engine fell behind) are dropped instead of being run
+    in a burst. How late the ticks start, how long they take and how many
+    are skipped or missed is kept in ``stats``.
+
+    The first deadline of a task is aligned on a multiple of its interval, so
+    the tasks with the same interval are due together and ticked as one
+    round, whenever they were registered. Before a round is ticked, task
+    classes that define a ``prepare_round(tasks)`` static method get the
+    whole round at once, so that per-UE work can be batched (the radio state
+    of the moving UEs, see BackgroundTasks.prepare_round).
+    """
+
+    def __init__(self, interval: float = 1.0, workers: int = 32):
+        self.interval = interval
+        self.workers = workers
+        self._queue = []
+        self._counter = itertools.count()
+        self._busy = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pool = None
+        self.stats = TickStats()
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="ue-sim"
+            )
+            self._thread = threading.Thread(
+                target=self._run, name="ue-sim-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def register(self, task, interval: float = None):
+        """Schedule the first tick of ``task`` with the next round of its interval"""
+        if interval is None:
+            interval = self.interval
+        self.start()
+        now = time.monotonic()
+        deadline = math.ceil(now / interval) * interval if interval > 0 else now
+        with self._cond:
+            self._push(deadline, task, interval)
+            self._cond.notify()
+
+    def _push(self, deadline: float, task, interval: float):
+        heapq.heappush(self._queue, (deadline, next(self._counter), task, interval))
+
+    def running_tasks(self) -> int:
+        with self._cond:
+            return len(self._queue) + len(self._busy)
+
+    def metrics(self) -> dict:
+        return dict(
+            self.stats.as_dict(),
+            tasks=self.running_tasks(),
+            workers=self.workers,
+            interval=self.interval,
+        )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                deadline = self._queue[0][0]
+                now = time.monotonic()
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+
+                due = []
+                while self._queue and self._queue[0][0] <= now:
+                    deadline, _, task, interval = heapq.heappop(self._queue)
+                    due.append((task, interval, deadline))
+
+                round_tasks = []
+                for task, interval, deadline in due:
+                    if not task.is_alive():
+                        continue
+                    if task not in self._busy:
+                        self._busy.add(task)
+                        round_tasks.append((task, interval, deadline))
+                    else:
+                        self.stats.skip()
+                    if interval > 0:
+                        deadline = self._next_deadline(deadline, interval, now)
+                        self._push(deadline, task, interval)
+
+            if round_tasks:
+                self._pool.submit(self._dispatch, round_tasks)
+
+    def _next_deadline(self, deadline: float, interval: float, now: float) -> float:
+        deadline += interval
+        if deadline < now:
+            missed = int((now - deadline) // interval) + 1
+            self.stats.miss(missed)
+            deadline += missed * interval
+        return deadline
+
+    def _dispatch(self, tasks):
+        groups = {}
+        for task, _, _ in tasks:
+            groups.setdefault(type(task), []).append(task)
+
+        for task_class, group in groups.items():
+            prepare_round = getattr(task_class, "prepare_round", None)
+            if prepare_round is not None:
+                try:
+                    prepare_round(group)
+                except Exception as ex:
+                    logging.critical(ex)
+
+        for task, interval, deadline in tasks:
+            self._pool.submit(self._tick, task, interval, deadline)
+
+    def _tick(self, task, interval: float, deadline: float):
+        start = time.monotonic()
+        try:
+            task.tick()
+        except Exception as ex:
+            logging.critical(ex)
+        finally:
+            self.stats.tick(start - deadline, time.monotonic() - start, interval)
+            with self._cond:
+                self._busy.discard(task)
+                if interval <= 0 and task.is_alive():
+                    self._push(time.monotonic(), task, interval)
+                    self._cond.notify()
+
+
+engine = SimulationEngine(
+    interval=settings.SIMULATION_TICK_INTERVAL, workers=settings.SIMULATION_WORKERS
+)
@@ -0,0 +1,43 @@
+from enum import Enum
+from typing import Any, List, NamedTuple, Optional
+
+
+class EventType(str, Enum):
+    CELL_CHANGED = "CELL_CHANGED"
+    COVERAGE_LOST = "COVERAGE_LOST"
+    COVERAGE_REGAINED = "COVERAGE_REGAINED"
+    QOS_STATUS_CHANGED = "QOS_STATUS_CHANGED"
+
+
+class MovementEvent(NamedTuple):
+    """A change in the state of a UE between two ticks"""
+
+    type: EventType
+    supi: str
+    previous: Any = None  # cell dict or QoS status before the change
+    current: Any = None  # cell dict or QoS status after the change
+
+
+def cell_events(
+    supi: str, previous: Optional[dict], current: Optional[dict]
+) -> List[MovementEvent]:
+    """Compare the serving cell of a UE with the one of the previous tick"""
+    previous_id = previous.get("id") if previous else None
+    current_id = current.get("id") if current else None
+
+    if previous_id == current_id:
+        return []
+    if previous_id is None:
+        return [MovementEvent(EventType.COVERAGE_REGAINED, supi, previous, current)]
+    if current_id is None:
+        return [MovementEvent(EventType.COVERAGE_LOST, supi, previous, current)]
+    return [MovementEvent(EventType.CELL_CHANGED, supi, previous, current)]
+
+
+def qos_events(
+    supi: str, previous: Optional[str], current: Optional[str]
+) -> List[MovementEvent]:
+    """Compare the QoS status (QOS_GUARANTEED / QOS_NOT_GUARANTEED) of a UE with the previous one"""
+    if current is None or previous == current:
+        return []
+    return [MovementEvent(EventType.QOS_STATUS_CHANGED, supi, previous, current)]
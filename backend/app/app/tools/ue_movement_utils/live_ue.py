@@ -0,0 +1,130 @@
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Optional
+
+
+class LiveUE:
+    """State of a moving UE, updated in place on every tick.
+
+    Only what changes while the UE moves (position, serving cell / gNB) and
+    what the callbacks and the map need to identify it is kept, in slots
+    instead of a dict of every column of the UE. The record reads like the
+    dict it replaces (``ue["Cell_id"]``, ``ue.get("latitude")``) and is turned
+    into one with ``dict(ue)`` at the API boundaries.
+    """
+
+    __slots__ = (
+        "supi",
+        "name",
+        "external_identifier",
+        "ip_address_v4",
+        "ip_address_v6",
+        "mac_address",
+        "owner_id",
+        "path_id",
+        "path_index",
+        "is_simulated",
+        "speed",
+        "latitude",
+        "longitude",
+        "Cell_id",
+        "cell_id_hex",
+        "gnb_id_hex",
+    )
+
+    def __init__(self, **fields):
+        for key in self.__slots__:
+            setattr(self, key, fields.get(key))
+
+    @classmethod
+    def from_ue(cls, UE, cell: Optional[dict] = None, gnb_hex: str = None) -> "LiveUE":
+        live = cls(**{key: getattr(UE, key, None) for key in cls.__slots__})
+        live.attach(cell, gnb_hex)
+        return live
+
+    def move(self, latitude: float, longitude: float):
+        self.latitude = latitude
+        self.longitude = longitude
+
+    def attach(self, cell: Optional[dict], gnb_hex: str = None):
+        """Serve the UE from a cell, None when it is out of coverage"""
+        if cell is None:
+            self.Cell_id = None
+            self.cell_id_hex = None
+            self.gnb_id_hex = None
+        else:
+            self.Cell_id = cell.get("id")
+            self.cell_id_hex = cell.get("cell_id")
+            self.gnb_id_hex = gnb_hex
+
+    # Mapping interface, for the code written against the dict
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __repr__(self) -> str:
+        return f"LiveUE(supi={self.supi!r}, Cell_id={self.Cell_id!r})"
+
+
+class LiveUEMap(Mapping):
+    """The LiveUE records of the UEs moving in this worker, by supi.
+
+    Copy-on-write: adding or removing a UE swaps in a new dict (and bumps
+    ``version``) under the lock, the current one is never modified. Readers
+    take the reference with ``snapshot()``, without a lock or a copy, and get
+    a consistent view they can iterate while UEs start and stop. Writes only
+    happen when a UE starts or stops moving, the reads at every API call and
+    checkpoint. The records themselves are updated in place, so a snapshot
+    always shows the current position and cell of its UEs, and are turned
+    into dicts by the API with ``dict(ue)``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._map = MappingProxyType({})
+        self.version = 0
+
+    def snapshot(self) -> Mapping:
+        return self._map
+
+    def _swap(self, ues: dict):
+        self._map = MappingProxyType(ues)
+        self.version += 1
+
+    def __getitem__(self, supi: str) -> LiveUE:
+        return self._map[supi]
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def __setitem__(self, supi: str, live: LiveUE):
+        with self._lock:
+            if self._map.get(supi) is live:
+                return
+            ues = dict(self._map)
+            ues[supi] = live
+            self._swap(ues)
+
+    def pop(self, supi: str, default=None):
+        with self._lock:
+            if supi not in self._map:
+                return default
+            ues = dict(self._map)
+            live = ues.pop(supi)
+            self._swap(ues)
+            return live
+
+    def clear(self):
+        with self._lock:
+            self._swap({})
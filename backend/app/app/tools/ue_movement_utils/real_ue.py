@@ -3,13 +3,15 @@ import logging
 import os
 
 import pika
-from fastapi.encoders import jsonable_encoder
 
 from app import crud
 from app.db.session import SessionLocal, client
-from app.tools.distance import check_distance
+from app.tools.occupancy import cell_occupancy
+from app.tools.topology import get_topology
 
-from .common import get_cells, subscriptions, ues, validate_location_reporting_sub
+from .common import subscriptions, ue_state, ues, validate_location_reporting_sub
+from .events import cell_events
+from .live_ue import LiveUE
 
 logging.basicConfig(level=logging.INFO)
 
@@ -29,20 +31,28 @@ def callback(ch, method, properties, body):
                 db_mongo = client.fastapi
                 UE.longitude = lon
                 UE.latitude = lat
-                ues[f"{supi}"] = jsonable_encoder(UE)
-                ues[f"{supi}"].pop("id")
 
                 current_user = UE.owner
                 is_superuser = crud.user.is_superuser(current_user)
 
-                cells = get_cells(db=db, owner_id=current_user.id)
-                cell_now, distances_now = check_distance(lat, lon, cells)
+                topology = get_topology(db, current_user.id)
+                cell_now = topology.serving_cell(lat, lon)
+                detected = cell_events(supi, topology.cell(UE.Cell_id), cell_now)
 
-                if cell_now and cell_now["cell_id"] != UE.Cell_id:
-                    ues[f"{supi}"]["cell_id_hex"] = cell_now["cell_id"]
-                    ues[f"{supi}"]["gnb_id_hex"] = cell_now["gNB_id"]
-                    ues[f"{supi}"]["Cell_id"] = cell_now["id"]
+                # The record is updated in place, the map only changes for new UEs
+                live = ues.get(f"{supi}")
+                if live is None:
+                    ues[f"{supi}"] = live = LiveUE.from_ue(
+                        UE, cell_now, topology.gnb_hex(cell_now)
+                    )
+                else:
+                    live.move(lat, lon)
+                    live.attach(cell_now, topology.gnb_hex(cell_now))
+                cell_occupancy.attach(f"{supi}", live.Cell_id)
+                ue_state.publish(f"{supi}", ues[f"{supi}"])
 
+                # Location reports are only sent when the serving cell changes
+                if cell_now and detected:
                     try:
                         validate_location_reporting_sub(
                             active_subscriptions,
@@ -55,15 +65,10 @@ def callback(ch, method, properties, body):
                     except Exception as ex:
                         logging.warning(ex)
 
-                else:
-                    ues[f"{supi}"]["cell_id_hex"] = None
-                    ues[f"{supi}"]["gnb_id_hex"] = None
-                    ues[f"{supi}"]["Cell_id"] = None
-
                 crud.ue.update(
                     db=db,
                     db_obj=UE,
-                    obj_in=ues[f"{supi}"],
+                    obj_in=dict(ues[f"{supi}"]),
                 )
 
                 logging.info(
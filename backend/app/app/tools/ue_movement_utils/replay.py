@@ -0,0 +1,186 @@
+import heapq
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+
+from app import crud
+from app.db.session import client
+from app.tools import monitoring_callbacks, qos_callback
+from app.tools.subscription_registry import subscription_registry
+
+from .common import (
+    monitoring_event_sub_validation,
+    send_monitoring_report,
+    subscriptions,
+    validate_location_reporting_sub,
+)
+from .events import EventType
+from .trace import EVENT_BITS, QOS_STATUSES, Trace
+
+
+class TraceReplay:
+    """Feeds the events of a trace through the subscription callbacks again.
+
+    Nothing is recomputed: the positions, cells and QoS statuses are the
+    recorded ones, only the subscriptions (of the user replaying the trace)
+    are looked up, and validated, as they are now. The time between two events is the
+    recorded one divided by ``speedup`` (0 sends them back to back). Only the
+    UEs of the user are replayed, unless it is a superuser. Loss of
+    connectivity is reported maximumDetectionTime (trace time) after
+    COVERAGE_LOST, unless the UE regained coverage before.
+    """
+
+    def __init__(self, trace: Trace, current_user, speedup: float = 1.0):
+        self.trace = trace
+        self.current_user = current_user
+        self.is_superuser = crud.user.is_superuser(current_user)
+        self.speedup = speedup
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lost = {}  # supi -> time of COVERAGE_LOST
+        self._pending = []  # heap of (due time, supi, lost time)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name=f"replay-{self.trace.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _wait(self, previous: Optional[float], now: float):
+        if previous is not None and self.speedup > 0 and now > previous:
+            self._stop.wait((now - previous) / self.speedup)
+
+    def _run(self):
+        records = self.trace.records
+        db_mongo = client.fastapi
+        previous = None
+        try:
+            # Only the ticks on which something happened are read from the file
+            replayed = records["events"] != 0
+            if not self.is_superuser:
+                replayed &= np.isin(
+                    records["ue"], self.trace.ues_of(self.current_user.id)
+                )
+            for position in np.flatnonzero(replayed):
+                record = records[position]
+                now = float(record["time"])
+                self._wait(previous, now)
+                if self._stop.is_set():
+                    return
+                previous = now
+                self._send_due_losses(db_mongo, now)
+                self._emit(db_mongo, record, now)
+            if len(records):
+                self._send_due_losses(db_mongo, float(records["time"].max()))
+        except Exception as ex:
+            logging.critical(ex)
+
+    def _emit(self, db_mongo, record, now: float):
+        live = self.trace.live(record)
+        events = int(record["events"])
+        handlers = (
+            (EventType.COVERAGE_LOST, self._on_coverage_lost),
+            (EventType.COVERAGE_REGAINED, self._on_coverage_regained),
+            (EventType.CELL_CHANGED, self._report_location),
+            (EventType.QOS_STATUS_CHANGED, self._report_qos_status),
+        )
+        for event_type, handler in handlers:
+            if events & EVENT_BITS[event_type]:
+                try:
+                    handler(db_mongo, live, record, now)
+                    self.sent += 1
+                except Exception as ex:
+                    logging.warning(ex)
+
+    def _valid(self, sub: dict) -> bool:
+        return monitoring_event_sub_validation(
+            sub, self.is_superuser, self.current_user.id, sub.get("owner_id")
+        )
+
+    def _on_coverage_lost(self, db_mongo, live, record, now):
+        sub = subscription_registry.monitoring_event(
+            db_mongo, live.external_identifier, "LOSS_OF_CONNECTIVITY"
+        )
+        self._lost[live.supi] = now
+        if sub and self._valid(sub):
+            due = now + (sub.get("maximumDetectionTime") or 0)
+            heapq.heappush(self._pending, (due, live.supi, now, record))
+
+    def _send_due_losses(self, db_mongo, now: float):
+        while self._pending and self._pending[0][0] <= now:
+            due, supi, lost, record = heapq.heappop(self._pending)
+            if self._lost.get(supi) != lost:
+                # Coverage was regained (or lost again) in between
+                continue
+            live = self.trace.live(record)
+            sub = subscription_registry.monitoring_event(
+                db_mongo, live.external_identifier, "LOSS_OF_CONNECTIVITY"
+            )
+            if not sub or not self._valid(sub):
+                continue
+            if send_monitoring_report(
+                db_mongo,
+                sub,
+                monitoring_callbacks.loss_of_connectivity_callback,
+                live,
+                sub.get("notificationDestination"),
+                sub.get("link"),
+            ):
+                self.sent += 1
+
+    def _on_coverage_regained(self, db_mongo, live, record, now):
+        self._lost.pop(live.supi, None)
+        sub = subscription_registry.monitoring_event(
+            db_mongo, live.external_identifier, "UE_REACHABILITY"
+        )
+        if sub and self._valid(sub):
+            send_monitoring_report(
+                db_mongo,
+                sub,
+                monitoring_callbacks.ue_reachability_callback,
+                live,
+                sub.get("notificationDestination"),
+                sub.get("link"),
+                sub.get("reachabilityType"),
+            )
+        self._report_location(db_mongo, live, record, now)
+
+    def _report_location(self, db_mongo, live, record, now):
+        validate_location_reporting_sub(
+            subscriptions.copy(),
+            self.current_user.id,
+            self.is_superuser,
+            live.supi,
+            live,
+            db_mongo,
+            live=live,
+        )
+
+    def _report_qos_status(self, db_mongo, live, record, now):
+        qos = int(record["qos"])
+        if qos < 0:
+            return
+        sub = subscription_registry.qos_monitoring(
+            db_mongo, "ipv4Addr", live.ip_address_v4
+        )
+        if not sub:
+            return
+        if not self.is_superuser and sub.get("owner_id") != self.current_user.id:
+            logging.warning("Not enough permissions")
+            return
+        qos_callback.qos_notification_control(
+            sub, live.ip_address_v4, None, live, gbr_status=QOS_STATUSES[qos]
+        )
@@ -1,499 +1,538 @@
 import logging
 import threading
-import time
-
-import requests
-from fastapi.encoders import jsonable_encoder
 
 from app import crud
-from app.crud import crud_mongo
 from app.db.session import SessionLocal, client
+from app.core.config import settings
 from app.tools import monitoring_callbacks, qos_callback, timer
-from app.tools.distance import check_distance
-from app.tools.rsrp_calculation import check_path_loss, check_rsrp
+from app.tools.clock import SimulationClock
+from app.tools.occupancy import cell_occupancy
+from app.tools.path_timeline import get_timeline, locate_all
+from app.tools.topology import get_topology
+from app.tools.subscription_registry import subscription_registry
 
+from . import events
 from .common import *
+from .engine import engine
+from .live_ue import LiveUE
 
 
-class BackgroundTasks(threading.Thread):
-
-    def __init__(self, group=None, target=None, name=None, args=(), kwargs=None):
-        super().__init__(group=group, target=target, name=name)
-        self._args = args
-        self._kwargs = kwargs
-        self._stop_threads = False
-        self._db = SessionLocal()
-        return
+class BackgroundTasks:
+    """
+    ===================================================================
+                       2nd Approach for updating UEs position
+    ===================================================================
 
-    def run(self):
+    Summary: every tick --> keep increasing the travelled distance
 
-        current_user = self._args[0]
-        supi = self._args[1]
 
-        active_subscriptions = subscriptions.copy()
-        try:
-            db_mongo = client.fastapi
+        points [ 1 - 2 - 3 - 4 - 5 - 6 - 7 ... ] . . . . . . .
+                         ^ distance (metres along the path)
 
-            # Initiate UE - if exists
-            UE = crud.ue.get_supi(db=self._db, supi=supi)
-            if not UE:
-                logging.warning("UE not found")
-                threads.pop(f"{supi}")
-                return
-            if UE.owner_id != current_user.id:
-                logging.warning("Not enough permissions")
-                threads.pop(f"{supi}")
-                return
-            if not UE.is_simulated:
-                logging.warning("Trying to simulate a real UE")
-                threads.pop(f"{supi}")
-                return
+    distance: the path is indexed by the cumulative distance of its points
+             (see PathTimeline.distance); the position is found by binary
+             search and interpolated between the two surrounding points.
+             The distance is taken MOD the length of the path, letting the UE
+             moving in endless loops.
 
-            # Insert running UE in the dictionary
+    Tick:    the simulation engine ticks the UE once every
+             SIMULATION_TICK_INTERVAL sec (see engine.py, one scheduler drives
+             all the UEs). Each tick is a step of the run's SimulationClock;
+             with a speed-up the ticks come faster, the simulated time stays the same
 
-            ues[f"{supi}"] = jsonable_encoder(UE)
-            ues[f"{supi}"].pop("id")
+    Speed:   metres / sec, the UE moves speed * tick interval every tick
+             (see speed_to_mps: STATIONARY 0, LOW 1, HIGH 10 or a number).
+             It does not depend on how densely the path was sampled; a
+             shorter tick interval gives a finer event resolution
 
-            if UE.Cell_id is not None:
-                ues[f"{supi}"]["cell_id_hex"] = UE.Cell.cell_id
-                ues[f"{supi}"]["gnb_id_hex"] = UE.Cell.gNB.gNB_id
-            else:
-                ues[f"{supi}"]["cell_id_hex"] = None
-                ues[f"{supi}"]["gnb_id_hex"] = None
-
-            # Retrieve paths & points
-            path = crud.path.get(db=self._db, id=UE.path_id)
-            if not path:
-                logging.warning("Path not found")
-                threads.pop(f"{supi}")
-                return
-            if path.owner_id != current_user.id:
-                logging.warning("Not enough permissions")
-                threads.pop(f"{supi}")
-                return
+    Radio:   the distances, path losses and RSRPs of every cell are computed
+             for the whole round in one NumPy pass per cell topology
+             (prepare_round); the serving cell is taken from them and they
+             are published with the state of the UE for the test API
 
-            points = get_points(db=self._db, path_id=UE.path_id)
+    Events:  every tick the serving cell (and QoS status) is compared with the
+             previous one (see events.py); the subscriptions are only served
+             on CELL_CHANGED / COVERAGE_LOST / COVERAGE_REGAINED /
+             QOS_STATUS_CHANGED, so callbacks follow mobility, not ticks
 
-            cells = get_cells(db=self._db, owner_id=current_user.id)
+    Pros:    + the UE position is updated once every tick (not very aggressive)
+             + any speed, no points are skipped
+    Cons:    - updating once every tick limits the event resolution
 
-            is_superuser = crud.user.is_superuser(current_user)
+    -------------------------------------------------------------------
+    """
 
-            t = timer.SequencialTimer(logger=logging.critical)
-            rt = None
-            # global loss_of_connectivity_ack
-            loss_of_connectivity_ack = "FALSE"
-            """
-            ===================================================================
-                               2nd Approach for updating UEs position
-            ===================================================================
+    def __init__(
+        self, group=None, target=None, name=None, args=(), kwargs=None, speedup=None
+    ):
+        self._args = args
+        self._kwargs = kwargs
+        if speedup is None:
+            speedup = settings.SIMULATION_SPEEDUP
+        self.clock = SimulationClock(
+            speedup=speedup, step=settings.SIMULATION_TICK_INTERVAL
+        )
+        # Seconds the run stays claimed in the shared state without a tick
+        self.lease = max(settings.UE_STATE_LEASE, 3 * self.clock.interval)
+        self._stop_threads = False
+        self._stop_requested = False
+        self._started = False
+        self._ready = False
+        self._finished = threading.Event()
+        self._db = None
+        self._prepared = None  # position and serving cell located for the round
+        return
 
-            Summary: while(TRUE) --> keep increasing the moving index
+    @staticmethod
+    def prepare_round(tasks):
+        """Locate the UEs of the round on their timelines, the misses resolved in one batch per cell index"""
+        groups = {}
+        for task in tasks:
+            if task._ready and not (task._stop_threads or task._stop_requested):
+                groups.setdefault(task.topology.index, []).append(task)
+
+        for index, group in groups.items():
+            located = locate_all(
+                index,
+                [task.timeline for task in group],
+                [task.distance for task in group],
+            )
+            for task, fix in zip(group, located):
+                task._prepared = fix
+
+    def start(self):
+        self._started = True
+        checkpointer.start()
+        engine.register(self, interval=self.clock.interval)
 
+    def stop(self):
+        self._stop_threads = True
 
-                points [ 1 2 3 4 5 6 7 8 9 10 ... ] . . . . . . .
-                         ^ current index
-                         ^  moving index                ^ moving can also reach here
+    def join(self, timeout=None):
+        return self._finished.wait(timeout)
 
-            current: shows where the UE is
-            moving : starts within the range of len(points) and keeps increasing.
-                     When it goes out of these bounds, the MOD( len(points) ) prevents
-                     the "index out of range" exception. It also starts the iteration
-                     of points from the begining, letting the UE moving in endless loops.
+    def is_alive(self) -> bool:
+        return self._started and not self._finished.is_set()
 
-            Sleep:   in both LOW / HIGH speed cases, the thread sleeps for 1 sec
+    def tick(self):
+        try:
+            if not self._ready:
+                self._ready = self._setup()
+                if not self._ready:
+                    self._finish()
+                    return
+
+            # Stops asked by another worker come with the published state
+            if self._stop_threads or self._stop_requested:
+                self._teardown()
+                return
 
-            Speed:   LOW : (moving_position_index += 1)  no points are skipped, this means 1m/sec
-                     HIGH: (moving_position_index += 10) skips 10 points, thus...        ~10m/sec
+            self._step()
+            self.clock.advance()
+        except Exception as ex:
+            logging.critical(ex)
+            self._finish()
+        finally:
+            # Release the connection back to the pool between ticks
+            if self._db is not None:
+                self._db.close()
 
-            Pros:    + the UE position is updated once every sec (not very aggressive)
-                     + we can easily set speed this way (by skipping X points --> X m/sec)
-            Cons:    - skipping points and updating once every second decreases the event resolution
+    def _finish(self):
+        supi = f"{self._args[1]}"
+        threads.pop(supi, None)
+        ue_state.release(supi)
+        self._finished.set()
 
-            -------------------------------------------------------------------
-            """
+    def _setup(self) -> bool:
 
-            current_position_index = -1
+        self.current_user = self._args[0]
+        self.supi = supi = self._args[1]
+        current_user = self.current_user
 
-            # find the index of the point where the UE is located
-            for index, point in enumerate(points):
-                if (UE.latitude == point["latitude"]) and (
-                    UE.longitude == point["longitude"]
-                ):
-                    current_position_index = index
+        self._db = SessionLocal()
+        self.active_subscriptions = subscriptions.copy()
+        self.db_mongo = client.fastapi
+
+        # Initiate UE - if exists, loaded in the session of the loop
+        UE = crud.ue.get_supi(db=self._db, supi=supi)
+        if not UE:
+            logging.warning("UE not found")
+            return False
+        if UE.owner_id != current_user.id:
+            logging.warning("Not enough permissions")
+            return False
+        if not UE.is_simulated:
+            logging.warning("Trying to simulate a real UE")
+            return False
+
+        # Cells and gNBs are resolved from the snapshot for the whole run
+        self.topology = topology = get_topology(self._db, current_user.id)
+        cell = topology.cell(UE.Cell_id)
+
+        # Insert running UE in the dictionary
+        self.live = ues[f"{supi}"] = LiveUE.from_ue(UE, cell, topology.gnb_hex(cell))
+
+        # Retrieve paths & points
+        path = crud.path.get(db=self._db, id=UE.path_id)
+        if not path:
+            logging.warning("Path not found")
+            return False
+        if path.owner_id != current_user.id:
+            logging.warning("Not enough permissions")
+            return False
+
+        self.UE = UE
+        # Serving cell of every point of the path, shared with the other UEs on it
+        self.timeline = get_timeline(self._db, UE.path_id, current_user.id)
+        self.points = self.timeline.points
+        self.is_superuser = crud.user.is_superuser(current_user)
+
+        self.t = timer.SequencialTimer(logger=logging.critical, clock=self.clock)
+        # PERIODIC reports are due on the simulation clock of this run
+        self.timers = timer.TimerScheduler(self.clock, thread=False)
+        self.rt = None
+        self.loss_of_connectivity_ack = "FALSE"
+        self.loss_of_connectivity_sub = None
+        self.ue_reachability_sub = None
+        self.location_reporting_sub = None
+        self.qos_sub = None
+        self.qos_status = None
+
+        # Serving cell of the previous tick, the events are detected against it
+        self.cell = cell
+        if cell is None:
+            # Out of coverage from the start, loss of connectivity counts from now
+            self.t.start()
+        self._handlers = {
+            events.EventType.COVERAGE_LOST: [self._on_coverage_lost],
+            events.EventType.COVERAGE_REGAINED: [
+                self._on_coverage_regained,
+                self._report_location,
+            ],
+            events.EventType.CELL_CHANGED: [self._report_location],
+            events.EventType.QOS_STATUS_CHANGED: [self._report_qos_status],
+        }
+
+        self.speed = speed_to_mps(UE.speed)
+        # RSRP of the serving cell in the last tick
+        self.rsrp = float("nan")
+
+        # resume from the stored position and keep increasing the distance...
+        self.distance = self.timeline.resume(UE.latitude, UE.longitude, UE.path_index)
+        self._publish()
+        return True
+
+    def _step(self):
+
+        supi = self.supi
+        timeline = self.timeline
+
+        live = self.live
+
+        cell_now = None
+        # Normally computed for the whole round in prepare_round
+        prepared, self._prepared = self._prepared, None
+        try:
+            if prepared is None:
+                prepared = locate_all(self.topology.index, [timeline], [self.distance])[0]
+            (lat, lon, index, _), serving, self.rsrp = prepared
+            live.move(lat, lon)
+            live.path_index = index
 
-            # start iterating from this index and keep increasing the moving_position_index...
-            moving_position_index = current_position_index
+            if serving >= 0:
+                cell_now = self.topology.cells[serving]
 
-            while True:
+        except Exception as ex:
+            logging.warning("Failed to update coordinates")
+            logging.warning(ex)
+
+        self._lookup_subscriptions()
+
+        # Detect what changed since the previous tick, then update the state of the UE
+        detected = events.cell_events(supi, self.cell, cell_now)
+        self.cell = cell_now
+
+        # The record is only touched when the serving cell changed
+        if detected:
+            live.attach(cell_now, self.topology.gnb_hex(cell_now))
+        # A no-op unless the cell changed (or the counters were reloaded from the db)
+        cell_occupancy.attach(supi, live.Cell_id)
+        # Published before the QoS status, so the shared occupancy includes this tick
+        self._publish()
+
+        if cell_now is not None and self._qos_event_triggered():
+            status = qos_callback.qos_status(ue_state.occupancy(live.Cell_id))
+            detected += events.qos_events(supi, self.qos_status, status)
+            self.qos_status = status
+
+        # The subscriptions only react to the detected events
+        for event in detected:
+            for handler in self._handlers.get(event.type, ()):
                 try:
-                    # UE = crud.ue.update_coordinates(db=db, lat=points[current_position_index]["latitude"], long=points[current_position_index]["longitude"], db_obj=UE)
-                    # cell_now = check_distance(UE.latitude, UE.longitude, cells) #calculate the distance from all the cells
-                    ues[f"{supi}"]["latitude"] = points[current_position_index][
-                        "latitude"
-                    ]
-                    ues[f"{supi}"]["longitude"] = points[current_position_index][
-                        "longitude"
-                    ]
-                    cell_now, distances_now = check_distance(
-                        ues[f"{supi}"]["latitude"], ues[f"{supi}"]["longitude"], cells
-                    )  # calculate the distance from all the cells
-                    distances[f"{supi}"] = distances_now
-                    path_losses_now = check_path_loss(
-                        ues[f"{supi}"]["latitude"], ues[f"{supi}"]["longitude"], cells
-                    )
-                    path_losses[f"{supi}"] = path_losses_now
-                    rsrp_now = check_rsrp(
-                        ues[f"{supi}"]["latitude"], ues[f"{supi}"]["longitude"], cells
-                    )
-                    rsrps[f"{supi}"] = rsrp_now
-
+                    handler(event)
                 except Exception as ex:
-                    logging.warning("Failed to update coordinates")
                     logging.warning(ex)
 
-                # MonitoringEvent API - Loss of connectivity
-                if not active_subscriptions.get("loss_of_connectivity"):
-                    loss_of_connectivity_sub = crud_mongo.read_by_multiple_pairs(
-                        db_mongo,
-                        "MonitoringEvent",
-                        externalId=UE.external_identifier,
-                        monitoringType="LOSS_OF_CONNECTIVITY",
+        # After the handlers (coverage lost stops the PERIODIC QoS reports), so
+        # the reports carry the cell and occupancy of this tick
+        self.timers.run_pending()
+
+        # Loss of connectivity is reported once, maximumDetectionTime after COVERAGE_LOST
+        if cell_now is None:
+            self._check_loss_of_connectivity()
+
+        if trace_recorder is not None:
+            self._record(detected, cell_now)
+
+        self.distance += self.speed * self.clock.step
+
+    def _record(self, detected, cell_now):
+        rsrp = self.rsrp if cell_now is not None else float("nan")
+        trace_recorder.record(
+            self.clock.time(), self.live, rsrp, detected, qos_status=self.qos_status
+        )
+
+    def _publish(self):
+        # Share the state with the other workers, this also renews the lease of the run
+        self._stop_requested = ue_state.publish(
+            f"{self.supi}", self.live, lease=self.lease
+        )
+
+    def _lookup_subscriptions(self):
+        supi = self.supi
+        UE = self.UE
+        active_subscriptions = self.active_subscriptions
+        db_mongo = self.db_mongo
+
+        # MonitoringEvent API - Loss of connectivity
+        if not active_subscriptions.get("loss_of_connectivity"):
+            self.loss_of_connectivity_sub = subscription_registry.monitoring_event(
+                db_mongo, UE.external_identifier, "LOSS_OF_CONNECTIVITY"
+            )
+            if self.loss_of_connectivity_sub:
+                active_subscriptions.update({"loss_of_connectivity": True})
+
+        # As Session With QoS API - search for active subscription in db
+        if not active_subscriptions.get("as_session_with_qos"):
+            self.qos_sub = subscription_registry.qos_monitoring(
+                db_mongo, "ipv4Addr", UE.ip_address_v4
+            )
+            if self.qos_sub:
+                active_subscriptions.update({"as_session_with_qos": True})
+                reporting_freq = self.qos_sub["qosMonInfo"]["repFreqs"]
+                reporting_period = self.qos_sub["qosMonInfo"]["repPeriod"]
+                if "PERIODIC" in reporting_freq:
+                    self.rt = timer.RepeatedTimer(
+                        reporting_period,
+                        qos_callback.qos_notification_control,
+                        self.qos_sub,
+                        self.live.ip_address_v4,
+                        # resolved on every report, the occupancy is the current one
+                        ue_state.occupancy,
+                        self.live,
+                        scheduler=self.timers,
                     )
-                    if loss_of_connectivity_sub:
-                        active_subscriptions.update({"loss_of_connectivity": True})
-
-                # Validation of subscription
-                if (
-                    active_subscriptions.get("loss_of_connectivity")
-                    and loss_of_connectivity_ack == "FALSE"
-                ):
-                    sub_is_valid = monitoring_event_sub_validation(
-                        loss_of_connectivity_sub,
-                        is_superuser,
-                        current_user.id,
-                        loss_of_connectivity_sub.get("owner_id"),
-                    )
-                    if sub_is_valid:
-                        try:
-                            try:
-                                elapsed_time = t.status()
-                                if elapsed_time > loss_of_connectivity_sub.get(
-                                    "maximumDetectionTime"
-                                ):
-                                    response = monitoring_callbacks.loss_of_connectivity_callback(
-                                        ues[f"{supi}"],
-                                        loss_of_connectivity_sub.get(
-                                            "notificationDestination"
-                                        ),
-                                        loss_of_connectivity_sub.get("link"),
-                                    )
-
-                                    logging.critical(response.json())
-                                    # This ack is used to send one time the loss of connectivity callback
-                                    loss_of_connectivity_ack = response.json().get(
-                                        "ack"
-                                    )
-
-                                    loss_of_connectivity_sub.update(
-                                        {
-                                            "maximumNumberOfReports": loss_of_connectivity_sub.get(
-                                                "maximumNumberOfReports"
-                                            )
-                                            - 1
-                                        }
-                                    )
-                                    crud_mongo.update(
-                                        db_mongo,
-                                        "MonitoringEvent",
-                                        loss_of_connectivity_sub.get("_id"),
-                                        loss_of_connectivity_sub,
-                                    )
-                            except timer.TimerError as ex:
-                                # logging.critical(ex)
-                                pass
-                        except requests.exceptions.ConnectionError as ex:
-                            logging.warning("Failed to send the callback request")
-                            logging.warning(ex)
-                            crud_mongo.delete_by_uuid(
-                                db_mongo,
-                                "MonitoringEvent",
-                                loss_of_connectivity_sub.get("_id"),
-                            )
-                            active_subscriptions.update({"loss_of_connectivity": False})
-                            continue
-                    else:
-                        crud_mongo.delete_by_uuid(
-                            db_mongo,
-                            "MonitoringEvent",
-                            loss_of_connectivity_sub.get("_id"),
-                        )
-                        active_subscriptions.update({"loss_of_connectivity": False})
-                        logging.warning("Subscription has expired")
-                # MonitoringEvent API - Loss of connectivity
-
-                # As Session With QoS API - search for active subscription in db
-                if not active_subscriptions.get("as_session_with_qos"):
-                    qos_sub = crud_mongo.read(
-                        db_mongo, "QoSMonitoring", "ipv4Addr", UE.ip_address_v4
-                    )
-                    if qos_sub:
-                        active_subscriptions.update({"as_session_with_qos": True})
-                        reporting_freq = qos_sub["qosMonInfo"]["repFreqs"]
-                        reporting_period = qos_sub["qosMonInfo"]["repPeriod"]
-                        if "PERIODIC" in reporting_freq:
-                            rt = timer.RepeatedTimer(
-                                reporting_period,
-                                qos_callback.qos_notification_control,
-                                qos_sub,
-                                ues[f"{supi}"]["ip_address_v4"],
-                                ues.copy(),
-                                ues[f"{supi}"],
-                            )
-                            # qos_callback.qos_notification_control(qos_sub, ues[f"{supi}"]["ip_address_v4"], ues.copy(),  ues[f"{supi}"])
-
-                # If the document exists then validate the owner
-                if not is_superuser and (qos_sub["owner_id"] != current_user.id):
-                    logging.warning("Not enough permissions")
-                    active_subscriptions.update({"as_session_with_qos": False})
-                # As Session With QoS API - search for active subscription in db
-
-                if cell_now is not None:
-                    try:
-                        t.stop()
-                        loss_of_connectivity_ack = "FALSE"
-                        if rt is not None:
-                            rt.start()
-                    except timer.TimerError as ex:
-                        # logging.critical(ex)
-                        pass
-
-                    # Monitoring Event API - UE reachability
-                    # check if the ue was disconnected before
-                    if ues[f"{supi}"]["Cell_id"] is None:
-
-                        if not active_subscriptions.get("ue_reachability"):
-                            ue_reachability_sub = crud_mongo.read_by_multiple_pairs(
-                                db_mongo,
-                                "MonitoringEvent",
-                                externalId=UE.external_identifier,
-                                monitoringType="UE_REACHABILITY",
-                            )
-                            if ue_reachability_sub:
-                                active_subscriptions.update({"ue_reachability": True})
-
-                        # Validation of subscription
-
-                        if active_subscriptions.get("ue_reachability"):
-                            sub_is_valid = monitoring_event_sub_validation(
-                                ue_reachability_sub,
-                                is_superuser,
-                                current_user.id,
-                                ue_reachability_sub.get("owner_id"),
-                            )
-                            if sub_is_valid:
-                                try:
-                                    try:
-                                        monitoring_callbacks.ue_reachability_callback(
-                                            ues[f"{supi}"],
-                                            ue_reachability_sub.get(
-                                                "notificationDestination"
-                                            ),
-                                            ue_reachability_sub.get("link"),
-                                            ue_reachability_sub.get("reachabilityType"),
-                                        )
-                                        ue_reachability_sub.update(
-                                            {
-                                                "maximumNumberOfReports": ue_reachability_sub.get(
-                                                    "maximumNumberOfReports"
-                                                )
-                                                - 1
-                                            }
-                                        )
-                                        crud_mongo.update(
-                                            db_mongo,
-                                            "MonitoringEvent",
-                                            ue_reachability_sub.get("_id"),
-                                            ue_reachability_sub,
-                                        )
-                                    except timer.TimerError as ex:
-                                        # logging.critical(ex)
-                                        pass
-                                except requests.exceptions.ConnectionError as ex:
-                                    logging.warning(
-                                        "Failed to send the callback request"
-                                    )
-                                    logging.warning(ex)
-                                    crud_mongo.delete_by_uuid(
-                                        db_mongo,
-                                        "MonitoringEvent",
-                                        ue_reachability_sub.get("_id"),
-                                    )
-                                    active_subscriptions.update(
-                                        {"ue_reachability": False}
-                                    )
-                                    continue
-                            else:
-                                crud_mongo.delete_by_uuid(
-                                    db_mongo,
-                                    "MonitoringEvent",
-                                    ue_reachability_sub.get("_id"),
-                                )
-                                active_subscriptions.update({"ue_reachability": False})
-                                logging.warning("Subscription has expired")
-                    # Monitoring Event API - UE reachability
-
-                    logging.warning(
-                        f"UE({UE.supi}) with ipv4 {UE.ip_address_v4} connected to Cell {cell_now.get('id')}, {cell_now.get('description')}"
-                    )
-
-                    ues[f"{supi}"]["Cell_id"] = cell_now.get("id")
-                    ues[f"{supi}"]["cell_id_hex"] = cell_now.get("cell_id")
-                    gnb = crud.gnb.get(db=self._db, id=cell_now.get("gNB_id"))
-                    ues[f"{supi}"]["gnb_id_hex"] = gnb.gNB_id
-
-                    # Monitoring Event API - Location Reporting
-                    # Retrieve the subscription of the UE by external Id | This could be outside while true but then the user cannot subscribe when the loop runs
-                    # Monitoring Event API - Location Reporting
-                    try:
-
-                        if not active_subscriptions.get("location_reporting"):
-                            location_reporting_sub = crud_mongo.read_by_multiple_pairs(
-                                db_mongo,
-                                "MonitoringEvent",
-                                externalId=UE.external_identifier,
-                                monitoringType="LOCATION_REPORTING",
-                            )
-                            if location_reporting_sub:
-                                active_subscriptions.update(
-                                    {"location_reporting": True}
-                                )
-                        validate_location_reporting_sub(
-                            active_subscriptions,
-                            current_user,
-                            is_superuser,
-                            supi,
-                            UE,
-                            db_mongo,
-                            location_reporting_sub,
-                        )
-                    except Exception as ex:
-                        logging.warning(ex)
-                        continue
-
-                    # As Session With QoS API - if EVENT_TRIGGER then send callback
-                    if active_subscriptions.get("as_session_with_qos"):
-                        reporting_freq = qos_sub["qosMonInfo"]["repFreqs"]
-                        if "EVENT_TRIGGERED" in reporting_freq:
-                            qos_callback.qos_notification_control(
-                                qos_sub,
-                                ues[f"{supi}"]["ip_address_v4"],
-                                ues.copy(),
-                                ues[f"{supi}"],
-                            )
-                    # As Session With QoS API - if EVENT_TRIGGER then send callback
-
-                else:
-                    # crud.ue.update(db=db, db_obj=UE, obj_in={"Cell_id" : None})
-                    try:
-                        t.start()
-                        if rt is not None:
-                            rt.stop()
-                    except timer.TimerError as ex:
-                        logging.critical(ex)
-
-                    ues[f"{supi}"]["Cell_id"] = None
-                    ues[f"{supi}"]["cell_id_hex"] = None
-                    ues[f"{supi}"]["gnb_id_hex"] = None
-
-                # logging.info(f'User: {current_user.id} | UE: {supi} | Current location: latitude ={UE.latitude} | longitude = {UE.longitude} | Speed: {UE.speed}' )
-
-                if UE.speed == "LOW":
-                    # don't skip any points, keep default speed 1m /sec
-                    moving_position_index += 1
-                elif UE.speed == "HIGH":
-                    # skip 10 points --> 10m / sec
-                    moving_position_index += 10
-
-                time.sleep(1)
-
-                current_position_index = moving_position_index % (len(points))
-
-                if self._stop_threads:
-                    logging.critical("Terminating thread...")
-                    crud.ue.update_coordinates(
-                        db=self._db,
-                        lat=ues[f"{supi}"]["latitude"],
-                        long=ues[f"{supi}"]["longitude"],
-                        db_obj=UE,
-                    )
-                    crud.ue.update(
-                        db=self._db,
-                        db_obj=UE,
-                        obj_in={"Cell_id": ues[f"{supi}"]["Cell_id"]},
-                    )
-                    ues.pop(f"{supi}")
-                    self._db.close()
-                    if rt is not None:
-                        rt.stop()
-                    break
-
-            # End of 2nd Approach for updating UEs position
-
-            """
-            ===================================================================
-                             1st Approach for updating UEs position
-            ===================================================================
-
-            Summary: while(TRUE) --> keep iterating the points list again and again
-
-
-                points [ 1 2 3 4 5 6 7 8 9 10 ... ] . . . . . . .
-                               ^ point
-                           ^ flag
-
-            flag:    it is used once to find the current UE position and then is
-                     set to False
-
-            Sleep/
-            Speed:   LOW : sleeps   1 sec and goes to the next point  (1m/sec)
-                     HIGH: sleeps 0.1 sec and goes to the next point (10m/sec)
-
-            Pros:    + the UEs goes over every point and never skips any
-            Cons:    - updating the UE position every 0.1 sec is a more aggressive approach
-
-            -------------------------------------------------------------------
-            """
-
-            # flag = True
-
-            # while True:
-            #     for point in points:
-
-            #         #Iteration to find the last known coordinates of the UE
-            #         #Then the movements begins from the last known position (geo coordinates)
-            #         if ((UE.latitude != point["latitude"]) or (UE.longitude != point["longitude"])) and flag == True:
-            #             continue
-            #         elif (UE.latitude == point["latitude"]) and (UE.longitude == point["longitude"]) and flag == True:
-            #             flag = False
-            #             continue
-
-            #         #-----------------------Code goes here-------------------------#
-
-            #         if UE.speed == 'LOW':
-            #             time.sleep(1)
-            #         elif UE.speed == 'HIGH':
-            #             time.sleep(0.1)
-
-            #         if self._stop_threads:
-            #             print("Stop moving...")
-            #             break
-
-            #     if self._stop_threads:
-            #             print("Terminating thread...")
-            #             break
-
-        except Exception as ex:
+                    if self.cell is None:
+                        self.rt.stop()
+
+        # If the document exists then validate the owner
+        if (
+            active_subscriptions.get("as_session_with_qos")
+            and not self.is_superuser
+            and (self.qos_sub["owner_id"] != self.current_user.id)
+        ):
+            logging.warning("Not enough permissions")
+            active_subscriptions.update({"as_session_with_qos": False})
+
+    def _qos_event_triggered(self) -> bool:
+        return bool(
+            self.active_subscriptions.get("as_session_with_qos")
+            and "EVENT_TRIGGERED" in self.qos_sub["qosMonInfo"]["repFreqs"]
+        )
+
+    def _on_coverage_lost(self, event):
+        logging.warning(f"UE({self.supi}) lost connection to Cell {event.previous.get('id')}")
+        try:
+            self.t.start()
+        except timer.TimerError as ex:
             logging.critical(ex)
+        if self.rt is not None:
+            self.rt.stop()
+        self.qos_status = None
 
-    def stop(self):
-        self._stop_threads = True
+    def _on_coverage_regained(self, event):
+        try:
+            self.t.stop()
+        except timer.TimerError as ex:
+            # logging.critical(ex)
+            pass
+        self.loss_of_connectivity_ack = "FALSE"
+        if self.rt is not None:
+            self.rt.start()
+
+        # Monitoring Event API - UE reachability
+        active_subscriptions = self.active_subscriptions
+        db_mongo = self.db_mongo
+        if not active_subscriptions.get("ue_reachability"):
+            self.ue_reachability_sub = subscription_registry.monitoring_event(
+                db_mongo, self.UE.external_identifier, "UE_REACHABILITY"
+            )
+            if self.ue_reachability_sub:
+                active_subscriptions.update({"ue_reachability": True})
+        ue_reachability_sub = self.ue_reachability_sub
+
+        # Validation of subscription
+        if active_subscriptions.get("ue_reachability"):
+            sub_is_valid = monitoring_event_sub_validation(
+                ue_reachability_sub,
+                self.is_superuser,
+                self.current_user.id,
+                ue_reachability_sub.get("owner_id"),
+                now=self.clock.localtime(),
+            )
+            if sub_is_valid:
+                send_monitoring_report(
+                    db_mongo,
+                    ue_reachability_sub,
+                    monitoring_callbacks.ue_reachability_callback,
+                    self.live,
+                    ue_reachability_sub.get("notificationDestination"),
+                    ue_reachability_sub.get("link"),
+                    ue_reachability_sub.get("reachabilityType"),
+                    on_error=drop_unreachable_subscription(
+                        active_subscriptions, "ue_reachability"
+                    ),
+                )
+            else:
+                subscription_registry.delete(
+                    db_mongo,
+                    "MonitoringEvent",
+                    ue_reachability_sub.get("_id"),
+                )
+                active_subscriptions.update({"ue_reachability": False})
+                logging.warning("Subscription has expired")
+        # Monitoring Event API - UE reachability
+
+    def _report_location(self, event):
+        cell_now = event.current
+        logging.warning(
+            f"UE({self.UE.supi}) with ipv4 {self.UE.ip_address_v4} connected to Cell {cell_now.get('id')}, {cell_now.get('description')}"
+        )
+
+        # Monitoring Event API - Location Reporting
+        # Retrieve the subscription of the UE by external Id | This could be outside the tick but then the user cannot subscribe while the UE moves
+        if not self.active_subscriptions.get("location_reporting"):
+            self.location_reporting_sub = subscription_registry.monitoring_event(
+                self.db_mongo, self.UE.external_identifier, "LOCATION_REPORTING"
+            )
+            if self.location_reporting_sub:
+                self.active_subscriptions.update({"location_reporting": True})
+        validate_location_reporting_sub(
+            self.active_subscriptions,
+            self.current_user,
+            self.is_superuser,
+            self.supi,
+            self.UE,
+            self.db_mongo,
+            self.location_reporting_sub,
+            now=self.clock.localtime(),
+        )
+
+    def _report_qos_status(self, event):
+        # As Session With QoS API - EVENT_TRIGGERED reports are sent when the status changes
+        qos_callback.qos_notification_control(
+            self.qos_sub,
+            self.live.ip_address_v4,
+            ue_state.occupancy,
+            self.live,
+            gbr_status=event.current,
+        )
+
+    def _check_loss_of_connectivity(self):
+        active_subscriptions = self.active_subscriptions
+        db_mongo = self.db_mongo
+        loss_of_connectivity_sub = self.loss_of_connectivity_sub
+
+        # Validation of subscription
+        if not (
+            active_subscriptions.get("loss_of_connectivity")
+            and self.loss_of_connectivity_ack == "FALSE"
+        ):
+            return
+
+        sub_is_valid = monitoring_event_sub_validation(
+            loss_of_connectivity_sub,
+            self.is_superuser,
+            self.current_user.id,
+            loss_of_connectivity_sub.get("owner_id"),
+            now=self.clock.localtime(),
+        )
+        if sub_is_valid:
+            try:
+                elapsed_time = self.t.status()
+            except timer.TimerError as ex:
+                # logging.critical(ex)
+                return
+            if elapsed_time > loss_of_connectivity_sub.get("maximumDetectionTime"):
+                queued = send_monitoring_report(
+                    db_mongo,
+                    loss_of_connectivity_sub,
+                    monitoring_callbacks.loss_of_connectivity_callback,
+                    self.live,
+                    loss_of_connectivity_sub.get("notificationDestination"),
+                    loss_of_connectivity_sub.get("link"),
+                    on_response=self._on_loss_of_connectivity_ack,
+                    on_error=self._on_loss_of_connectivity_error(
+                        drop_unreachable_subscription(
+                            active_subscriptions, "loss_of_connectivity"
+                        )
+                    ),
+                )
+                if not queued:
+                    return
+                # Not sent again while the NetApp has not answered
+                self.loss_of_connectivity_ack = "PENDING"
+        else:
+            subscription_registry.delete(
+                db_mongo,
+                "MonitoringEvent",
+                loss_of_connectivity_sub.get("_id"),
+            )
+            active_subscriptions.update({"loss_of_connectivity": False})
+            logging.warning("Subscription has expired")
+
+    def _on_loss_of_connectivity_ack(self, response):
+        logging.critical(response.json())
+        # This ack is used to send one time the loss of connectivity callback,
+        # unless the UE regained coverage while it was sent
+        if self.loss_of_connectivity_ack == "PENDING":
+            self.loss_of_connectivity_ack = response.json().get("ack")
+
+    def _on_loss_of_connectivity_error(self, drop_subscription):
+        def on_error(ex):
+            if self.loss_of_connectivity_ack == "PENDING":
+                self.loss_of_connectivity_ack = "FALSE"
+            drop_subscription(ex)
+
+        return on_error
+
+    def _teardown(self):
+        supi = self.supi
+        logging.critical("Terminating UE movement...")
+        checkpointer.remove(f"{supi}")
+        crud.ue.update_coordinates(
+            db=self._db,
+            lat=self.live.latitude,
+            long=self.live.longitude,
+            db_obj=self.UE,
+            path_index=self.live.path_index,
+        )
+        crud.ue.update(
+            db=self._db,
+            db_obj=self.UE,
+            obj_in={"Cell_id": self.live.Cell_id},
+        )
+        ue_state.remove(f"{supi}")
+        if self.rt is not None:
+            self.rt.stop()
+        self._finish()
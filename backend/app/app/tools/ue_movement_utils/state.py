@@ -0,0 +1,280 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Mapping, Optional
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.tools.occupancy import cell_occupancy
+
+from .live_ue import LiveUEMap
+
+
+class InProcessUEStateStore:
+    """State of the moving UEs, kept in the dictionaries of this process.
+
+    Only the worker that runs a simulation can see it; use it with a single
+    uvicorn / gunicorn worker.
+    """
+
+    shared = False
+
+    def __init__(self, ues: LiveUEMap):
+        self._ues = ues
+        self._owners = {}  # supi -> user id of the running simulation
+        self._lock = threading.Lock()
+
+    def claim(self, supi: str, user_id: int, lease: float = None) -> bool:
+        """Mark the simulation of a UE as running, False if it already is"""
+        with self._lock:
+            if supi in self._owners:
+                return False
+            self._owners[supi] = user_id
+            return True
+
+    def release(self, supi: str):
+        with self._lock:
+            self._owners.pop(supi, None)
+
+    def is_running(self, supi: str, user_id: int) -> bool:
+        return self._owners.get(supi) == user_id
+
+    def running(self, user_id: int) -> List[str]:
+        """The supis of the UEs the user is moving"""
+        with self._lock:
+            return [supi for supi, owner in self._owners.items() if owner == user_id]
+
+    def stop(self, supi: str, user_id: int, timeout: float = None) -> bool:
+        # The simulations of this process are stopped through their task
+        return False
+
+    def publish(self, supi: str, state: dict, lease: float = None) -> bool:
+        """Share the state of a UE, returns True when its simulation has to stop"""
+        self._ues[supi] = state
+        return False
+
+    def remove(self, supi: str):
+        self._ues.pop(supi, None)
+        self.release(supi)
+
+    def get(self, supi: str) -> Optional[dict]:
+        return self._ues.get(supi)
+
+    def all(self) -> Mapping:
+        """Snapshot of the moving UEs, the records are shared with the simulations"""
+        return self._ues.snapshot()
+
+    def as_json(self) -> dict:
+        return {supi: dict(state) for supi, state in self.all().items()}
+
+    def occupancy(self, cell_id: Optional[int]) -> int:
+        """Number of UEs (moving or not) served by a cell"""
+        return cell_occupancy.count(cell_id)
+
+    def occupancies(self) -> Dict[int, int]:
+        return cell_occupancy.counts()
+
+
+class MongoUEStateStore:
+    """State of the moving UEs, shared by all the workers through Mongo.
+
+    Every UE has one document: the last state published by the worker that
+    moves it, the user that runs the simulation and a lease. A stop request
+    of another worker is written to the document and the owner stops on its
+    next tick.
+
+    The states are not written on every tick: publish() keeps the last state
+    of every UE of this worker and a background thread writes them all every
+    ``flush_interval`` seconds with one bulk write, then reads the stop
+    requests of these UEs with one query. The lease is renewed by these
+    writes, so the simulation of a worker that died is seen as stopped once
+    it expires. The other workers see the states (and a simulation its stop
+    request) at most ``flush_interval`` seconds late.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        collection: Collection,
+        lease: float = 30.0,
+        poll_interval: float = 0.1,
+        flush_interval: float = 0.5,
+    ):
+        self._collection = collection
+        self._lease = lease
+        self._poll_interval = poll_interval
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # supi -> update of the last state, not written yet
+        self._published = set()  # supis moved by this worker
+        self._stops = set()  # the ones another worker asked to stop
+        self._thread = None
+
+    def claim(self, supi: str, user_id: int, lease: float = None) -> bool:
+        now = time.time()
+        if lease is None:
+            lease = self._lease
+        claim = {"owner": user_id, "stop": False, "expires": now + lease}
+        with self._lock:
+            self._stops.discard(supi)
+        try:
+            self._collection.insert_one(dict(claim, _id=supi, state=None))
+            return True
+        except DuplicateKeyError:
+            result = self._collection.update_one(
+                {
+                    "_id": supi,
+                    "$or": [{"owner": None}, {"expires": {"$lt": now}}],
+                },
+                {"$set": claim},
+            )
+            return result.modified_count == 1
+
+    def _forget(self, supi: str):
+        with self._lock:
+            self._pending.pop(supi, None)
+            self._published.discard(supi)
+            self._stops.discard(supi)
+
+    def release(self, supi: str):
+        with self._flush_lock:
+            self._forget(supi)
+            self._collection.update_one(
+                {"_id": supi},
+                {"$set": {"owner": None, "stop": False}, "$unset": {"state": ""}},
+            )
+
+    def is_running(self, supi: str, user_id: int) -> bool:
+        doc = self._collection.find_one(
+            {"_id": supi, "owner": user_id, "expires": {"$gte": time.time()}},
+            {"_id": 1},
+        )
+        return doc is not None
+
+    def running(self, user_id: int) -> List[str]:
+        return [
+            doc["_id"]
+            for doc in self._collection.find(
+                {"owner": user_id, "expires": {"$gte": time.time()}}, {"_id": 1}
+            )
+        ]
+
+    def stop(self, supi: str, user_id: int, timeout: float = None) -> bool:
+        """Ask the worker that runs the simulation to stop it and wait until it does (timeout 0 does not wait)"""
+        if not self.is_running(supi, user_id):
+            return False
+        self._collection.update_one(
+            {"_id": supi, "owner": user_id}, {"$set": {"stop": True}}
+        )
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_running(supi, user_id):
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(self._poll_interval)
+        return True
+
+    def publish(self, supi: str, state: dict, lease: float = None) -> bool:
+        update = {"state": dict(state)}
+        if lease is not None:
+            update["expires"] = time.time() + lease
+        with self._lock:
+            self._pending[supi] = update
+            self._published.add(supi)
+            stop = supi in self._stops
+        self._start()
+        return stop
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="ue-state", daemon=True
+            )
+            self._thread.start()
+
+    def flush(self):
+        """Write the states published since the last flush and read back the stop requests"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                published = list(self._published)
+            if pending:
+                self._collection.bulk_write(
+                    [
+                        UpdateOne({"_id": supi}, {"$set": update}, upsert=True)
+                        for supi, update in pending.items()
+                    ],
+                    ordered=False,
+                )
+            stops = set()
+            if published:
+                stops = {
+                    doc["_id"]
+                    for doc in self._collection.find(
+                        {"_id": {"$in": published}, "stop": True}, {"_id": 1}
+                    )
+                }
+            with self._lock:
+                self._stops = stops & self._published
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as ex:
+                logging.warning("Failed to share the state of the moving UEs")
+                logging.warning(ex)
+
+    def remove(self, supi: str):
+        with self._flush_lock:
+            self._forget(supi)
+            self._collection.delete_one({"_id": supi})
+
+    @staticmethod
+    def _live():
+        # The UEs of a worker that crashed are left behind once their lease
+        # expires; the real UEs are published without one
+        return {"$or": [{"expires": {"$gte": time.time()}}, {"expires": None}]}
+
+    def get(self, supi: str) -> Optional[dict]:
+        doc = self._collection.find_one(dict(self._live(), _id=supi), {"state": 1})
+        return doc.get("state") if doc else None
+
+    def all(self) -> dict:
+        return {
+            doc["_id"]: doc["state"]
+            for doc in self._collection.find(
+                dict(self._live(), state={"$ne": None}), {"state": 1}
+            )
+        }
+
+    def as_json(self) -> dict:
+        return self.all()
+
+    def occupancy(self, cell_id: Optional[int]) -> int:
+        """Number of UEs (moving or not) served by a cell, counted by every worker"""
+        return cell_occupancy.count(cell_id)
+
+    def occupancies(self) -> Dict[int, int]:
+        return cell_occupancy.counts()
+
+
+def create_state_store(backend: str, ues: LiveUEMap, lease: float = 30.0):
+    if backend == "memory":
+        return InProcessUEStateStore(ues)
+    if backend == "mongo":
+        from app.db.session import client
+
+        return MongoUEStateStore(
+            client.fastapi["UEState"],
+            lease=lease,
+            flush_interval=settings.UE_STATE_FLUSH_INTERVAL,
+        )
+    raise ValueError(f"Unknown UE state backend: {backend}")
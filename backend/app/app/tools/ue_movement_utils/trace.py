@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+from .events import EventType
+from .live_ue import LiveUE
+
+# One record per UE per tick, little endian and packed
+TRACE_DTYPE = np.dtype(
+    [
+        ("time", "<f8"),  # simulated time of the tick (epoch seconds)
+        ("ue", "<u4"),  # index in the supis of the sidecar
+        ("latitude", "<f8"),
+        ("longitude", "<f8"),
+        ("cell", "<i4"),  # Cell primary key, -1 when out of coverage
+        ("rsrp", "<f4"),  # RSRP of the serving cell, NaN when out of coverage
+        ("events", "u1"),  # EVENT_BITS of the events detected on the tick
+        ("qos", "i1"),  # QOS_STATUSES index, -1 when unknown
+    ]
+)
+
+EVENT_BITS = {
+    EventType.CELL_CHANGED: 1,
+    EventType.COVERAGE_LOST: 2,
+    EventType.COVERAGE_REGAINED: 4,
+    EventType.QOS_STATUS_CHANGED: 8,
+}
+QOS_STATUSES = ("QOS_GUARANTEED", "QOS_NOT_GUARANTEED")
+
+# The UE fields kept in the sidecar, the records only refer to the UE by index
+UE_FIELDS = ("supi", "external_identifier", "ip_address_v4", "owner_id")
+
+
+class TraceRecorder:
+    """Appends the state of the moving UEs to a binary trace, one record per tick.
+
+    The trace is a ``.trace`` file of TRACE_DTYPE records, that can be
+    memory-mapped as is, and a ``.json`` sidecar with the UEs (the records
+    hold their index) and the cells they were served by. A recorder writes the
+    traces of its process in ``directory``, the first one opened on the first
+    record. Once a trace reaches ``max_bytes`` it is closed and the next
+    records go to a new one; only the last ``keep`` traces of the recorder
+    are kept (0 keeps them all).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 0, keep: int = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.name = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._part = 0
+        self._names = []  # traces written by this recorder, the oldest first
+        self._ues = {}  # supi -> index
+        self._meta = None
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._part += 1
+        self.name = f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._part}"
+        self._file = open(os.path.join(self.directory, f"{self.name}.trace"), "ab")
+        self._size = 0
+        self._ues = {}
+        self._meta = {"dtype": TRACE_DTYPE.descr, "ues": [], "cells": {}}
+        self._names.append(self.name)
+        while self.keep and len(self._names) > self.keep:
+            self._remove(self._names.pop(0))
+
+    def _remove(self, name: str):
+        for extension in (".trace", ".json"):
+            try:
+                os.remove(os.path.join(self.directory, f"{name}{extension}"))
+            except OSError as ex:
+                logging.warning(f"Failed to remove the trace {name}: {ex}")
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_meta(self):
+        path = os.path.join(self.directory, f"{self.name}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self._meta, f)
+        os.replace(f"{path}.tmp", path)
+
+    def record(
+        self,
+        time: float,
+        live: LiveUE,
+        rsrp: float,
+        detected: Iterable = (),
+        qos_status: Optional[str] = None,
+    ):
+        events = 0
+        for event in detected:
+            events |= EVENT_BITS[event.type]
+
+        with self._lock:
+            if self._file is not None and self.max_bytes:
+                if self._size + TRACE_DTYPE.itemsize > self.max_bytes:
+                    self._close()
+            if self._file is None:
+                self._open()
+
+            changed = False
+            ue = self._ues.get(live.supi)
+            if ue is None:
+                ue = self._ues[live.supi] = len(self._meta["ues"])
+                self._meta["ues"].append({key: live.get(key) for key in UE_FIELDS})
+                changed = True
+            cell = -1 if live.Cell_id is None else live.Cell_id
+            if cell >= 0 and f"{cell}" not in self._meta["cells"]:
+                self._meta["cells"][f"{cell}"] = {
+                    "id": cell,
+                    "cell_id": live.cell_id_hex,
+                    "gnb_id_hex": live.gnb_id_hex,
+                }
+                changed = True
+            if changed:
+                self._file.flush()
+                self._write_meta()
+
+            record = np.array(
+                [
+                    (
+                        time,
+                        ue,
+                        live.latitude,
+                        live.longitude,
+                        cell,
+                        rsrp,
+                        events,
+                        QOS_STATUSES.index(qos_status) if qos_status else -1,
+                    )
+                ],
+                dtype=TRACE_DTYPE,
+            )
+            self._file.write(record.tobytes())
+            self._size += TRACE_DTYPE.itemsize
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        """Close the current trace, the next record opens a new one"""
+        with self._lock:
+            self._close()
+
+
+class Trace(NamedTuple):
+    name: str
+    records: np.ndarray  # memory-mapped TRACE_DTYPE records
+    ues: List[dict]
+    cells: dict  # by Cell primary key (as a string)
+
+    def ues_of(self, owner_id: int) -> List[int]:
+        """Indexes (the ``ue`` of the records) of the UEs of one user"""
+        return [
+            index for index, ue in enumerate(self.ues) if ue.get("owner_id") == owner_id
+        ]
+
+    def live(self, record) -> LiveUE:
+        """The state of the UE of a record, as the simulator had it"""
+        live = LiveUE(**self.ues[int(record["ue"])], is_simulated=True)
+        live.move(float(record["latitude"]), float(record["longitude"]))
+        cell = self.cells.get(f"{int(record['cell'])}")
+        live.attach(cell, cell.get("gnb_id_hex") if cell else None)
+        return live
+
+
+def list_traces(directory: str, owner_id: Optional[int] = None) -> List[str]:
+    """The traces in a directory, of every user (None) or the ones holding UEs of owner_id"""
+    if not directory or not os.path.isdir(directory):
+        return []
+    names = sorted(
+        name[: -len(".trace")]
+        for name in os.listdir(directory)
+        if name.endswith(".trace")
+        and os.path.exists(os.path.join(directory, f"{name[:-len('.trace')]}.json"))
+    )
+    if owner_id is None:
+        return names
+    return [name for name in names if owner_id in trace_owners(directory, name)]
+
+
+def trace_owners(directory: str, name: str) -> set:
+    """The users whose UEs are recorded in a trace, read from its sidecar"""
+    with open(os.path.join(directory, f"{os.path.basename(name)}.json")) as f:
+        return {ue.get("owner_id") for ue in json.load(f)["ues"]}
+
+
+def open_trace(directory: str, name: str) -> Trace:
+    """Memory-map a trace, without loading its records"""
+    name = os.path.basename(name)
+    with open(os.path.join(directory, f"{name}.json")) as f:
+        meta = json.load(f)
+    path = os.path.join(directory, f"{name}.trace")
+    # A record cut short by a crash is ignored
+    count = os.path.getsize(path) // TRACE_DTYPE.itemsize
+    if count:
+        records = np.memmap(path, dtype=TRACE_DTYPE, mode="r", shape=(count,))
+    else:
+        records = np.zeros(0, dtype=TRACE_DTYPE)
+    return Trace(name, records, meta["ues"], meta["cells"])